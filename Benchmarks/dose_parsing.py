@@ -0,0 +1,212 @@
+"""
+Benchmarks/dose_parsing.py
+
+Бенчмарк, сравнивающий построчный разбор строк дозировки (`df.apply` по строкам,
+как было раньше) с векторизованным `ExtractDoseAndTime` на синтетических данных
+PubChem, и проверяющий, что результаты совпадают.
+
+Построчный вариант воспроизведен здесь без логирования предупреждений, чтобы
+сравнивать только сам разбор.
+
+Запуск (из корня репозитория):
+    python -m Benchmarks.dose_parsing [doses_amount]
+"""
+
+import random
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from PubChem_download_toxicity.functions import ExtractDoseAndTime
+from Utils.verbose_logger import v_logger
+
+
+# допустимые единицы измерения (как в SaveToxicityUnitSpecification).
+valid_units_kg: list[str] = [
+  "gm/kg",
+  "g/kg",
+  "mg/kg",
+  "ug/kg",
+  "ng/kg",
+  "mL/kg",
+  "uL/kg",
+  "nL/kg",
+]
+valid_units_m3: list[str] = [
+  "gm/m3",
+  "g/m3",
+  "mg/m3",
+  "ug/m3",
+  "ng/m3",
+  "mL/m3",
+  "uL/m3",
+  "nL/m3",
+  "ppm",
+  "ppb",
+  "pph",
+]
+
+
+def RowWiseExtractDoseAndTime(df: pd.DataFrame, valid_units: list[str]) -> pd.DataFrame:
+  """
+  Построчный разбор строк дозировки (прежняя реализация ExtractDoseAndTime).
+
+  Args:
+      df (pd.DataFrame): таблица с колонками "dose" и "mw".
+      valid_units (list[str]): список допустимых единиц измерения дозы.
+
+  Returns:
+      pd.DataFrame: таблица с колонками "dose", "dose_units", "time_period".
+  """
+
+  df = df.copy()
+
+  def ExtractDose(
+    dose_str: str, mw: float
+  ) -> tuple[float | None, str | None, str | None]:
+    if " " not in dose_str or len(dose_str.split(" ")) != len(["amount", "unit"]):
+      return None, None, None
+
+    dose_amount_str, dose_and_time = dose_str.split(" ")
+
+    try:
+      num_dose = float(dose_amount_str)
+
+    except ValueError:
+      return None, None, None
+
+    match dose_str.count("/"):
+      case 1:
+        if dose_and_time.startswith("p"):
+          dose_unit, time_per = dose_and_time.split("/")
+        else:
+          dose_unit, time_per = dose_and_time, None
+
+      case 2:
+        dose_unit = "/".join(dose_and_time.split("/")[:-1])
+        time_per = dose_and_time.split("/")[-1]
+
+      case _:
+        return None, None, None
+
+    if dose_unit not in valid_units:
+      return None, None, None
+
+    unit_prefix, unit_suffix = dose_unit, "m3"
+
+    if dose_unit.count("/") > 0:
+      unit_prefix, unit_suffix = dose_unit.split("/")
+
+      if unit_suffix not in ("kg", "m3"):
+        return None, None, None
+
+    conversions: dict[str, float] = {
+      "mg": 1,
+      "gm": 1000,
+      "g": 1000,
+      "ng": 0.000001,
+      "ug": 0.001,
+      "ml": 1000,
+      "nl": 0.001,
+      "ul": 1,
+      "ppm": 24.45 / mw,
+      "ppb": 0.001 * 24.45 / mw,
+      "pph": 1 / 60 * 24.45 / mw,
+    }
+
+    if unit_prefix.lower() not in conversions:
+      return None, None, None
+
+    return num_dose * conversions[unit_prefix.lower()], "mg/" + unit_suffix, time_per
+
+  df[["numeric_dose", "dose_units", "time_period"]] = df.apply(
+    lambda row: pd.Series(ExtractDose(row["dose"], row["mw"])), axis=1
+  )
+
+  return df.drop(columns=["dose"]).rename(columns={"numeric_dose": "dose"})
+
+
+def SyntheticDoses(amount: int, seed: int = 0) -> pd.DataFrame:
+  """
+  Создает таблицу со строками дозировки, похожими на данные PubChem
+  (включая неподдерживаемые и некорректные значения).
+
+  Args:
+      amount (int): количество строк.
+      seed (int, optional): зерно генератора случайных чисел. Defaults to 0.
+
+  Returns:
+      pd.DataFrame: таблица с колонками "dose" и "mw".
+  """
+
+  generator = random.Random(seed)
+
+  amounts: list[str] = ["1", "2.5", "10", "300", "0.07", "1e3", "bad"]
+  units: list[str] = [
+    *valid_units_kg,
+    *valid_units_m3,
+    "mg/kg/7D",
+    "ng/m3/2H",
+    "ppm/2H",
+    "pph/10M",
+    "mg/kg/4W-I",
+    "xx/kg",
+    "mg/xx",
+    "mg",
+  ]
+
+  return pd.DataFrame(
+    {
+      "dose": [
+        f"{generator.choice(amounts)} {generator.choice(units)}" for _ in range(amount)
+      ],
+      "mw": [generator.choice([46.07, 180.16, 250.5, np.nan]) for _ in range(amount)],
+    }
+  )
+
+
+def RunBenchmark(amount: int = 1_000_000):
+  """
+  Сравнивает построчный и векторизованный разбор строк дозировки.
+
+  Args:
+      amount (int, optional): количество строк дозировки. Defaults to 1_000_000.
+  """
+
+  v_logger.UpdateFormat("Benchmark", "fg #ffffff")
+
+  data = SyntheticDoses(amount)
+
+  timings: list[tuple[str, float, float]] = []
+
+  for unit_str, valid_units in (("kg", valid_units_kg), ("m3", valid_units_m3)):
+    start_time = time.perf_counter()
+    row_wise = RowWiseExtractDoseAndTime(data, valid_units)
+    row_wise_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    vectorized = ExtractDoseAndTime(data, valid_units)
+    vectorized_time = time.perf_counter() - start_time
+
+    # сравниваем результаты так же, как они сохраняются в CSV.
+    row_wise["dose"] = pd.to_numeric(row_wise["dose"], errors="coerce")
+    if row_wise.to_csv(sep=";", index=False) != vectorized.to_csv(sep=";", index=False):
+      raise ValueError(f"RunBenchmark: results differ for '{unit_str}'")
+
+    timings.append((unit_str, row_wise_time, vectorized_time))
+
+  # таблицу печатаем после замеров, чтобы ее не разрывали предупреждения разбора.
+  print(f"dose strings: {amount}")
+  print(f"{'units':<8}{'row-wise, s':>14}{'vectorized, s':>16}{'speedup':>10}")
+
+  for unit_str, row_wise_time, vectorized_time in timings:
+    print(
+      f"{unit_str:<8}{row_wise_time:>14.2f}{vectorized_time:>16.2f}"
+      f"{row_wise_time / vectorized_time:>9.1f}x"
+    )
+
+
+if __name__ == "__main__":
+  RunBenchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,127 @@
+"""
+Benchmarks/http_session.py
+
+Бенчмарк, сравнивающий задержку одиночных запросов через `requests.get`
+(новое соединение на каждый запрос) и через общую сессию с пулом keep-alive
+соединений (`Utils.http_session`).
+
+В роли PubChem выступает локальный HTTP-сервер, поэтому экономия здесь - это
+только TCP-рукопожатие; на реальном PubChem к нему добавляется TLS.
+
+Запуск (из корня репозитория):
+    python -m Benchmarks.http_session [requests_amount]
+"""
+
+import statistics
+import sys
+import threading
+import time
+from collections.abc import Callable
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from Utils.http_session import CreateSession, session_config
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+  """
+  Обработчик локального сервера: отвечает небольшим телом фиксированного размера,
+  поддерживает keep-alive (HTTP/1.1 + Content-Length).
+  """
+
+  protocol_version = "HTTP/1.1"
+  # как и настоящие серверы, не ждем ACK перед отправкой тела ответа.
+  disable_nagle_algorithm = True
+
+  body: bytes = b"MolecularWeight\n180.16\n" * 8
+
+  def do_GET(self):
+    self.send_response(200)
+    self.send_header("Content-Type", "text/plain")
+    self.send_header("Content-Length", str(len(self.body)))
+    self.end_headers()
+    self.wfile.write(self.body)
+
+  def log_message(self, format, *args):
+    # не засоряем вывод бенчмарка логами сервера.
+    return
+
+
+def MeasureLatencies(get: Callable[[str], requests.Response], url: str, amount: int):
+  """
+  Измеряет задержку каждого из `amount` последовательных GET-запросов.
+
+  Args:
+      get (Callable[[str], requests.Response]): функция, отправляющая запрос.
+      url (str): URL запроса.
+      amount (int): количество запросов.
+
+  Returns:
+      list[float]: задержки запросов (в миллисекундах).
+  """
+
+  latencies: list[float] = []
+
+  for _ in range(amount):
+    start_time = time.perf_counter()
+
+    response = get(url)
+    response.raise_for_status()
+    _ = response.content
+
+    latencies.append((time.perf_counter() - start_time) * 1000)
+
+  return latencies
+
+
+def RunBenchmark(amount: int = 2000):
+  """
+  Запускает локальный сервер и сравнивает `requests.get` с пулом соединений.
+
+  Args:
+      amount (int, optional): количество запросов в каждом замере. Defaults to 2000.
+  """
+
+  server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+  threading.Thread(target=server.serve_forever, daemon=True).start()
+
+  url = f"http://127.0.0.1:{server.server_address[1]}/rest/pug/compound/cid/2244"
+
+  session = CreateSession()
+
+  try:
+    # прогреваем оба варианта, чтобы не учитывать импорты и первое соединение.
+    MeasureLatencies(requests.get, url, 10)
+    MeasureLatencies(session.get, url, 10)
+
+    bare = MeasureLatencies(
+      lambda u: requests.get(u, timeout=session_config["timeout"]), url, amount
+    )
+    pooled = MeasureLatencies(
+      lambda u: session.get(u, timeout=session_config["timeout"]), url, amount
+    )
+
+  finally:
+    session.close()
+    server.shutdown()
+
+  print(f"requests: {amount} per variant, stand-in server: {url}")
+  print(f"{'variant':<18}{'mean, ms':>10}{'median, ms':>12}{'p95, ms':>10}")
+
+  for name, latencies in (("requests.get", bare), ("pooled session", pooled)):
+    p95 = statistics.quantiles(latencies, n=20)[-1]
+    print(
+      f"{name:<18}{statistics.mean(latencies):>10.3f}"
+      f"{statistics.median(latencies):>12.3f}{p95:>10.3f}"
+    )
+
+  saved = statistics.mean(bare) - statistics.mean(pooled)
+  print(
+    f"saved per request: {saved:.3f} ms "
+    f"({saved / statistics.mean(bare) * 100:.1f}% of requests.get latency)"
+  )
+
+
+if __name__ == "__main__":
+  RunBenchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -0,0 +1,153 @@
+"""
+Benchmarks/median_dedup.py
+
+Бенчмарк, сравнивающий прежний `MedianDedupedDF` (фильтрация всей таблицы для
+каждого идентификатора) с реализацией на группировках на синтетических данных
+об активностях разного размера, и проверяющий, что результаты совпадают.
+
+Запуск (из корня репозитория):
+    python -m Benchmarks.median_dedup [rows_amount ...]
+"""
+
+import random
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from Utils.dataframe_funcs import CollapsedValue, MedianDedupedDF
+
+
+def FilteringMedianDedupedDF(
+  df: pd.DataFrame, id_column_name: str, median_column_name: str
+) -> pd.DataFrame:
+  """
+  Прежняя реализация MedianDedupedDF: для каждого идентификатора фильтрует всю
+  таблицу и сворачивает значения остальных колонок.
+
+  Args:
+      df (pd.DataFrame): исходный DataFrame.
+      id_column_name (str): имя колонки, содержащей идентификаторы.
+      median_column_name (str): имя колонки, в которой нужно посчитать медианы.
+
+  Returns:
+      pd.DataFrame: DataFrame с удаленными дубликатами.
+  """
+
+  df = df.copy()
+  df.loc[:, median_column_name] = df[median_column_name].astype(float)
+
+  median_and_id_data: dict = {}
+
+  for name in df[id_column_name].unique():
+    name_subset_df: pd.DataFrame = df.loc[df[id_column_name] == name]
+
+    name_values_dict: dict = {
+      median_column_name: name_subset_df[median_column_name].median()
+    }
+
+    for col in name_subset_df.columns:
+      if col not in (median_column_name, id_column_name):
+        name_values_dict[col] = CollapsedValue(name_subset_df[col].tolist())
+
+    median_and_id_data[name] = name_values_dict
+
+  new_df = pd.DataFrame.from_dict(median_and_id_data, orient="index").reset_index()
+
+  return new_df.rename(columns={"index": id_column_name})
+
+
+def SyntheticActivities(amount: int, seed: int = 0) -> pd.DataFrame:
+  """
+  Создает таблицу активностей, похожую на данные ChEMBL: примерно 0.6 * amount
+  уникальных молекул, строковые колонки с пропусками и повторами, числовые
+  колонки с нулями.
+
+  Args:
+      amount (int): количество строк.
+      seed (int, optional): зерно генератора случайных чисел. Defaults to 0.
+
+  Returns:
+      pd.DataFrame: таблица активностей.
+  """
+
+  generator = random.Random(seed)
+
+  molecules_amount: int = max(1, int(amount * 0.6))
+
+  def Choices(values: list) -> list:
+    return [generator.choice(values) for _ in range(amount)]
+
+  return pd.DataFrame(
+    {
+      "molecule_chembl_id": [
+        f"CHEMBL{generator.randrange(molecules_amount)}" for _ in range(amount)
+      ],
+      "standard_value": [generator.lognormvariate(5, 2) for _ in range(amount)],
+      "document_chembl_id": [f"CHEMBL{generator.randrange(500)}" for _ in range(amount)],
+      "standard_relation": Choices(["=", "=", "=", "<", ">"]),
+      "standard_units": Choices(["nM"]),
+      "activity_comment": Choices([None, None, None, "", "active", "inactive"]),
+      "assay_variant_mutation": Choices([None, None, "V600E"]),
+      "mw": Choices([180.16, 250.5, 0.0, np.nan]),
+      "heavy_atoms": Choices([12, 25, 0]),
+    }
+  )
+
+
+def NormalizedFrame(df: pd.DataFrame) -> pd.DataFrame:
+  """
+  Приводит таблицу к виду, не зависящему от порядка элементов в списках (в
+  прежней реализации он определялся порядком обхода множества).
+
+  Args:
+      df (pd.DataFrame): таблица.
+
+  Returns:
+      pd.DataFrame: таблица со строковыми представлениями значений.
+  """
+
+  def Normalized(value: object) -> str:
+    if isinstance(value, list):
+      return str(sorted(map(str, value)))
+
+    return "nan" if value is None or pd.isna(value) else str(value)
+
+  return df.astype(object).map(Normalized)
+
+
+def RunBenchmark(amounts: list[int]):
+  """
+  Сравнивает прежнюю и новую реализации MedianDedupedDF.
+
+  Args:
+      amounts (list[int]): размеры таблиц (количество строк).
+  """
+
+  print(f"{'rows':>8}{'ids':>8}{'filtering, s':>15}{'groupby, s':>13}{'speedup':>10}")
+
+  for amount in amounts:
+    data = SyntheticActivities(amount)
+
+    start_time = time.perf_counter()
+    filtering = FilteringMedianDedupedDF(data, "molecule_chembl_id", "standard_value")
+    filtering_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    groupby = MedianDedupedDF(data, "molecule_chembl_id", "standard_value")
+    groupby_time = time.perf_counter() - start_time
+
+    if not filtering.dtypes.equals(groupby.dtypes) or not NormalizedFrame(
+      filtering
+    ).equals(NormalizedFrame(groupby)):
+      raise ValueError(f"RunBenchmark: results differ for {amount} rows")
+
+    print(
+      f"{amount:>8}{len(groupby):>8}{filtering_time:>15.2f}{groupby_time:>13.2f}"
+      f"{filtering_time / groupby_time:>9.1f}x"
+    )
+
+
+if __name__ == "__main__":
+  RunBenchmark([int(amount) for amount in sys.argv[1:]] or [1_000, 5_000, 20_000])
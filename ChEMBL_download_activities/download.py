@@ -6,26 +6,32 @@ ChEMBL_download_activities/download.py
 а также для сохранения молекулярных файлов (molfiles) в формате SDF.
 """
 
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
 from ChEMBL_download_activities.functions import *
 from ChEMBL_download_compounds.functions import SaveChEMBLMolfilesToSDFByIdList
 from Configurations.config import Config, config
 from Utils.decorators import IgnoreWarnings, ReTry
-from Utils.files_funcs import IsFileInFolder, os
+from Utils.files_funcs import IsFileInFolder, ReadDataFrame, SaveDataFrame, os
+from Utils.run_state import run_state
 from Utils.verbose_logger import LogMode, v_logger
 
 
-@IgnoreWarnings
-@ReTry(attempts_amount=1)
-def DownloadTargetChEMBLActivities(targets_data: pd.DataFrame):
+def DownloadTargetActivities(target_id: str) -> tuple[int, int] | None:
   """
-  Скачивает информацию об активностях (IC50 и Ki), связанных с заданными мишенями,
-  из базы данных ChEMBL и сохраняет их в CSV-файлы.
+  Скачивает активности (IC50 и Ki) одной мишени, сохраняет их в файлы (в формате
+  `storage_format`) и, при необходимости, соответствующие molfiles в SDF.
 
-  Также, при необходимости, скачивает соответствующие molfiles в формате SDF.
+  Может выполняться в потоке пула: таблицу мишеней не изменяет, а возвращает
+  количество активностей.
 
   Args:
-      targets_data (pd.DataFrame): DataFrame, содержащий информацию о мишенях,
-                                   включая 'target_chembl_id'.
+      target_id (str): идентификатор мишени из базы ChEMBL.
+
+  Returns:
+      tuple[int, int] | None: количество активностей IC50 и Ki после очистки
+                              (None, если активности мишени уже скачаны).
   """
 
   # конфигурация для скачивания активностей.
@@ -33,161 +39,227 @@ def DownloadTargetChEMBLActivities(targets_data: pd.DataFrame):
   # конфигурация для скачивания соединений.
   compounds_config: Config = config["ChEMBL_download_compounds"]
 
-  v_logger.UpdateFormat(
-    activities_config["logger_label"], activities_config["logger_color"]
-  )
+  file_name_ic50: str = f"{target_id}_IC50_activities"
+  file_name_ki: str = f"{target_id}_Ki_activities"
+
+  # нужно ли пропускать скачивание, если активности мишени уже скачаны
+  # (результаты прежних запусков - по наличию файлов).
+  if config["skip_downloaded"] and run_state.IsCompleted(
+    "ChEMBL_download_activities/targets",
+    target_id,
+    lambda: all(
+      IsFileInFolder(
+        f"{file_name}.{activities_config['storage_format']}",
+        activities_config["results_folder_name"],
+      )
+      for file_name in (file_name_ic50, file_name_ki)
+    ),
+  ):
+    v_logger.info(
+      f"Activities connected with target {target_id} is already downloaded, skip.",
+      LogMode.VERBOSELY,
+    )
+    v_logger.info("-", LogMode.VERBOSELY)
 
-  v_logger.info("Start download activities connected with targets...")
-  v_logger.info("-", LogMode.VERBOSELY)
+    return None
 
-  # итерируемся по идентификаторам мишеней.
-  for target_id in targets_data["target_chembl_id"]:
-    file_name_ic50: str = f"{target_id}_IC50_activities"
-    file_name_ki: str = f"{target_id}_Ki_activities"
+  v_logger.info(
+    f"Downloading activities connected with {target_id}...", LogMode.VERBOSELY
+  )
 
-    # нужно ли пропускать скачивание, если файлы уже существуют.
-    if (
-      config["skip_downloaded"]
-      and IsFileInFolder(
-        f"{file_name_ic50}.csv", activities_config["results_folder_name"]
-      )
-      and IsFileInFolder(f"{file_name_ki}.csv", activities_config["results_folder_name"])
-    ):
-      v_logger.info(
-        f"Activities connected with target {target_id} is already downloaded, skip.",
-        LogMode.VERBOSELY,
-      )
-      v_logger.info("-", LogMode.VERBOSELY)
+  # активности мишени, подходящие под фильтры (IC50 и Ki - одним запросом).
+  activities = pd.DataFrame(QuerySetTargetActivities(target_id))  # type: ignore
 
-      continue  # переходим к следующей мишени.
+  # у пустого ответа ChEMBL нет и колонок.
+  if activities.empty:
+    activities = pd.DataFrame(columns=["standard_type"])
 
-    v_logger.info(
-      f"Downloading activities connected with {target_id}...", LogMode.VERBOSELY
-    )
+  # активности IC50 для мишени.
+  activities_ic50: pd.DataFrame = activities[activities["standard_type"] == "IC50"]
+  # активности Ki для мишени.
+  activities_ki: pd.DataFrame = activities[activities["standard_type"] == "Ki"]
 
-    # активности IC50 для мишени.
-    activities_ic50: QuerySet = QuerySetActivitiesByIC50(target_id)
-    # активности Ki для мишени.
-    activities_ki: QuerySet = QuerySetActivitiesByKi(target_id)
+  v_logger.info(
+    f"Amount: IC50: {len(activities_ic50)}; Ki: {len(activities_ki)}.",
+    LogMode.VERBOSELY,
+  )
+  v_logger.success(
+    f"Downloading activities connected with {target_id}!", LogMode.VERBOSELY
+  )
+  v_logger.info("Collecting activities to pandas.DataFrame...", LogMode.VERBOSELY)
 
-    v_logger.info(
-      "Amount: IC50: "
-      f"{len(activities_ic50)};"  # type: ignore
-      " Ki: "
-      f"{len(activities_ki)}.",  # type: ignore
-      LogMode.VERBOSELY,
-    )
-    v_logger.success(
-      f"Downloading activities connected with {target_id}!", LogMode.VERBOSELY
-    )
-    v_logger.info("Collecting activities to pandas.DataFrame...", LogMode.VERBOSELY)
+  # очищаем DataFrame с активностями IC50.
+  data_frame_ic50 = CleanedTargetActivitiesDF(
+    activities_ic50,
+    target_id=target_id,
+    activities_type="IC50",
+  )
 
-    # очищаем DataFrame с активностями IC50.
-    data_frame_ic50 = CleanedTargetActivitiesDF(
-      pd.DataFrame(activities_ic50),  # type: ignore
-      target_id=target_id,
-      activities_type="IC50",
-    )
+  # очищаем DataFrame с активностями Ki.
+  data_frame_ki = CleanedTargetActivitiesDF(
+    activities_ki,
+    target_id=target_id,
+    activities_type="Ki",
+  )
 
-    # очищаем DataFrame с активностями Ki.
-    data_frame_ki = CleanedTargetActivitiesDF(
-      pd.DataFrame(activities_ki),  # type: ignore
-      target_id=target_id,
-      activities_type="Ki",
-    )
+  v_logger.success("Collecting activities to pandas.DataFrame!", LogMode.VERBOSELY)
+  v_logger.info(
+    f"Amount: IC50: {len(data_frame_ic50)}; Ki: {len(data_frame_ki)}.",
+    LogMode.VERBOSELY,
+  )
+  v_logger.info(
+    f"Collecting activities to .{activities_config['storage_format']} file in "
+    f"'{activities_config['results_folder_name']}'...",
+    LogMode.VERBOSELY,
+  )
 
-    v_logger.success("Collecting activities to pandas.DataFrame!", LogMode.VERBOSELY)
-    v_logger.info(
-      "Recording new values 'IC50', 'Ki' in targets DataFrame...", LogMode.VERBOSELY
-    )
+  # сохраняем DataFrame с активностями IC50.
+  full_file_name_ic50: str = SaveDataFrame(
+    data_frame_ic50,
+    f"{activities_config['results_folder_name']}/{file_name_ic50}",
+    activities_config["storage_format"],
+  )
+  # сохраняем DataFrame с активностями Ki.
+  full_file_name_ki: str = SaveDataFrame(
+    data_frame_ki,
+    f"{activities_config['results_folder_name']}/{file_name_ki}",
+    activities_config["storage_format"],
+  )
 
-    # записываем количество активностей IC50 и Ki в DataFrame с данными о мишенях.
-    targets_data.loc[targets_data["target_chembl_id"] == target_id, "IC50_new"] = len(
-      data_frame_ic50
-    )
+  v_logger.success(
+    f"Collecting activities to .{activities_config['storage_format']} file in "
+    f"'{activities_config['results_folder_name']}'!",
+    LogMode.VERBOSELY,
+  )
 
-    targets_data.loc[targets_data["target_chembl_id"] == target_id, "Ki_new"] = len(
-      data_frame_ki
-    )
+  # формат логгера общий для всех потоков, поэтому при параллельной обработке
+  # мишеней (`targets_workers` больше 1) он не меняется: сообщения о molfiles
+  # выводятся с заголовком активностей, установленным в основном потоке.
+  switch_format: bool = activities_config["targets_workers"] <= 1
+
+  # включена опция скачивания molfiles.
+  if activities_config["download_compounds_sdf"]:
+    # обновляем формат логгера.
+    if switch_format:
+      v_logger.UpdateFormat(
+        compounds_config["logger_label"], compounds_config["logger_color"]
+      )
 
     v_logger.info(
-      f"Amount: IC50: {len(data_frame_ic50)}; Ki: {len(data_frame_ki)}.",
-      LogMode.VERBOSELY,
-    )
-    v_logger.success(
-      "Recording new values 'IC50', 'Ki' in targets DataFrame!", LogMode.VERBOSELY
-    )
-    v_logger.info(
-      "Collecting activities to .csv file in "
-      f"'{activities_config['results_folder_name']}'...",
+      f"Start download molfiles connected with {target_id} to .sdf...",
       LogMode.VERBOSELY,
     )
 
-    # полное имя файла для IC50.
-    full_file_name_ic50: str = (
-      f"{activities_config['results_folder_name']}/{file_name_ic50}.csv"
-    )
-    # полное имя файла для Ki.
-    full_file_name_ki: str = (
-      f"{activities_config['results_folder_name']}/{file_name_ki}.csv"
+    # создаем директорию для molfiles, если она не существует.
+    os.makedirs(compounds_config["molfiles_folder_name"], exist_ok=True)
+
+    v_logger.info("Saving connected with IC50 molfiles...", LogMode.VERBOSELY)
+
+    # сохраняем molfiles, связанные с активностями IC50 в SDF.
+    SaveChEMBLMolfilesToSDFByIdList(
+      data_frame_ic50["molecule_chembl_id"].tolist(),
+      f"{compounds_config['molfiles_folder_name']}/{file_name_ic50}_molfiles",
+      extra_data=data_frame_ic50,
     )
 
-    # сохраняем DataFrame с активностями IC50 в CSV.
-    data_frame_ic50.to_csv(full_file_name_ic50, sep=";", index=False)
-    # сохраняем DataFrame с активностями Ki в CSV.
-    data_frame_ki.to_csv(full_file_name_ki, sep=";", index=False)
+    v_logger.success("Saving connected with IC50 molfiles!", LogMode.VERBOSELY)
+    v_logger.info("Saving connected with Ki molfiles...", LogMode.VERBOSELY)
+
+    # сохраняем molfiles, связанные с активностями Ki в SDF.
+    SaveChEMBLMolfilesToSDFByIdList(
+      data_frame_ki["molecule_chembl_id"].tolist(),
+      f"{compounds_config['molfiles_folder_name']}/{file_name_ki}_molfiles",
+      extra_data=data_frame_ki,
+    )
 
+    v_logger.success("Saving connected with Ki molfiles!", LogMode.VERBOSELY)
     v_logger.success(
-      "Collecting activities to .csv file in "
-      f"'{activities_config['results_folder_name']}'!",
-      LogMode.VERBOSELY,
+      f"End download molfiles connected with {target_id} to .sdf!", LogMode.VERBOSELY
     )
 
-    # включена опция скачивания molfiles.
-    if activities_config["download_compounds_sdf"]:
-      # обновляем формат логгера.
+    # восстанавливаем формат логгера.
+    if switch_format:
       v_logger.UpdateFormat(
-        compounds_config["logger_label"], compounds_config["logger_color"]
+        activities_config["logger_label"], activities_config["logger_color"]
       )
 
-      v_logger.info(
-        f"Start download molfiles connected with {target_id} to .sdf...",
-        LogMode.VERBOSELY,
-      )
+  # отмечаем активности мишени скачанными (после записи всех файлов).
+  run_state.MarkCompleted(
+    "ChEMBL_download_activities/targets",
+    target_id,
+    [full_file_name_ic50, full_file_name_ki],
+  )
 
-      # создаем директорию для molfiles, если она не существует.
-      os.makedirs(compounds_config["molfiles_folder_name"], exist_ok=True)
+  v_logger.info("-", LogMode.VERBOSELY)
 
-      v_logger.info("Saving connected with IC50 molfiles...", LogMode.VERBOSELY)
+  return len(data_frame_ic50), len(data_frame_ki)
 
-      # сохраняем molfiles, связанные с активностями IC50 в SDF.
-      SaveChEMBLMolfilesToSDFByIdList(
-        data_frame_ic50["molecule_chembl_id"].tolist(),
-        f"{compounds_config['molfiles_folder_name']}/{file_name_ic50}_molfiles",
-        extra_data=data_frame_ic50,
-      )
 
-      v_logger.success("Saving connected with IC50 molfiles!", LogMode.VERBOSELY)
-      v_logger.info("Saving connected with Ki molfiles...", LogMode.VERBOSELY)
+@IgnoreWarnings
+@ReTry(attempts_amount=1)
+def DownloadTargetChEMBLActivities(targets_data: pd.DataFrame):
+  """
+  Скачивает информацию об активностях (IC50 и Ki), связанных с заданными мишенями,
+  из базы данных ChEMBL и сохраняет их в файлы (в формате `storage_format`).
 
-      # сохраняем molfiles, связанные с активностями Ki в SDF.
-      SaveChEMBLMolfilesToSDFByIdList(
-        data_frame_ki["molecule_chembl_id"].tolist(),
-        f"{compounds_config['molfiles_folder_name']}/{file_name_ki}_molfiles",
-        extra_data=data_frame_ki,
-      )
+  Также, при необходимости, скачивает соответствующие molfiles в формате SDF.
 
-      v_logger.success("Saving connected with Ki molfiles!", LogMode.VERBOSELY)
-      v_logger.success(
-        f"End download molfiles connected with {target_id} to .sdf!", LogMode.VERBOSELY
-      )
+  Мишени обрабатываются функцией DownloadTargetActivities: при `targets_workers`
+  больше 1 - одновременно в пуле потоков (запросы всех потоков проходят через
+  общий ограничитель `chembl_limiter`), иначе - последовательно. Количество
+  активностей записывается в таблицу мишеней в основном потоке, в порядке мишеней.
 
-      # восстанавливаем формат логгера.
-      v_logger.UpdateFormat(
-        activities_config["logger_label"], activities_config["logger_color"]
+  Args:
+      targets_data (pd.DataFrame): DataFrame, содержащий информацию о мишенях,
+                                   включая 'target_chembl_id'.
+  """
+
+  # конфигурация для скачивания активностей.
+  activities_config: Config = config["ChEMBL_download_activities"]
+
+  v_logger.UpdateFormat(
+    activities_config["logger_label"], activities_config["logger_color"]
+  )
+
+  v_logger.info("Start download activities connected with targets...")
+  v_logger.info("-", LogMode.VERBOSELY)
+
+  # идентификаторы мишеней (повторяющиеся скачиваем один раз).
+  target_ids: list[str] = list(dict.fromkeys(targets_data["target_chembl_id"]))
+
+  with (
+    ThreadPoolExecutor(max_workers=activities_config["targets_workers"])
+    if activities_config["targets_workers"] > 1
+    else nullcontext()
+  ) as executor:
+    # executor.map, как и map, возвращает результаты в порядке мишеней.
+    activities_amounts = (
+      executor.map(DownloadTargetActivities, target_ids)
+      if executor is not None
+      else map(DownloadTargetActivities, target_ids)
+    )
+
+    # итерируемся по идентификаторам мишеней.
+    for target_id, amounts in zip(target_ids, activities_amounts, strict=True):
+      # активности мишени уже скачаны.
+      if amounts is None:
+        continue
+
+      v_logger.info(
+        f"Recording new values 'IC50', 'Ki' for {target_id} in targets DataFrame...",
+        LogMode.VERBOSELY,
       )
 
-    v_logger.info("-", LogMode.VERBOSELY)
+      # записываем количество активностей IC50 и Ki в DataFrame с данными о мишенях.
+      target_rows: pd.Series = targets_data["target_chembl_id"] == target_id
+
+      targets_data.loc[target_rows, "IC50_new"] = amounts[0]
+      targets_data.loc[target_rows, "Ki_new"] = amounts[1]
+
+      v_logger.success(
+        f"Recording new values 'IC50', 'Ki' for {target_id} in targets DataFrame!",
+        LogMode.VERBOSELY,
+      )
 
   v_logger.success("End download activities connected with targets!")
 
@@ -197,9 +269,9 @@ def DownloadTargetChEMBLActivities(targets_data: pd.DataFrame):
 def GetCellLineChEMBLActivitiesFromCSV(cell_lines_data: pd.DataFrame):
   """
   "Скачивает" (получает) информацию об активностях (IC50 и GI50), связанных с
-  заданными клеточными линиями, из CSV-файлов, расположенных в директории,
-  указанной в конфигурации.  Также, при необходимости, скачивает
-  соответствующие molfiles в формате SDF.
+  заданными клеточными линиями, из CSV-файлов (или Parquet-файлов с теми же
+  именами), расположенных в директории, указанной в конфигурации.  Также,
+  при необходимости, скачивает соответствующие molfiles в формате SDF.
 
   Важно:
       В данном случае "скачивание" подразумевает чтение данных из локальных
@@ -233,15 +305,18 @@ def GetCellLineChEMBLActivitiesFromCSV(cell_lines_data: pd.DataFrame):
     file_name_ic50: str = f"{cell_id}_IC50_activities"
     file_name_gi50: str = f"{cell_id}_GI50_activities"
 
-    # нужно ли пропускать загрузку, если файлы уже существуют.
-    if (
-      config["skip_downloaded"]
-      and IsFileInFolder(
-        f"{file_name_ic50}.csv", activities_config["results_folder_name"]
-      )
-      and IsFileInFolder(
-        f"{file_name_gi50}.csv", activities_config["results_folder_name"]
-      )
+    # нужно ли пропускать загрузку, если активности клеточной линии уже получены
+    # (результаты прежних запусков - по наличию файлов).
+    if config["skip_downloaded"] and run_state.IsCompleted(
+      "ChEMBL_download_activities/cell_lines",
+      cell_id,
+      lambda: all(
+        IsFileInFolder(
+          f"{file_name}.{activities_config['storage_format']}",
+          activities_config["results_folder_name"],
+        )
+        for file_name in (file_name_ic50, file_name_gi50)  # noqa: B023
+      ),
     ):
       v_logger.info(
         f"Activities connected with target {cell_id} is already gotten, skip",
@@ -253,17 +328,13 @@ def GetCellLineChEMBLActivitiesFromCSV(cell_lines_data: pd.DataFrame):
 
     v_logger.info(f"Getting activities connected with {cell_id}...", LogMode.VERBOSELY)
 
-    # читаем данные об активностях IC50 и GI50 из CSV-файлов.
-    data_frame_ic50 = pd.read_csv(
-      f"{cell_lines_config['raw_csv_folder_name']}/{file_name_ic50}.csv",
-      sep=config["csv_separator"],
-      low_memory=False,
+    # читаем данные об активностях IC50 и GI50 (из .csv или .parquet файлов).
+    data_frame_ic50 = ReadDataFrame(
+      f"{cell_lines_config['raw_csv_folder_name']}/{file_name_ic50}"
     )
 
-    data_frame_gi50 = pd.read_csv(
-      f"{cell_lines_config['raw_csv_folder_name']}/{file_name_gi50}.csv",
-      sep=config["csv_separator"],
-      low_memory=False,
+    data_frame_gi50 = ReadDataFrame(
+      f"{cell_lines_config['raw_csv_folder_name']}/{file_name_gi50}"
     )
 
     v_logger.info(
@@ -305,27 +376,26 @@ def GetCellLineChEMBLActivitiesFromCSV(cell_lines_data: pd.DataFrame):
       "Recording new values 'IC50', 'GI50' in targets DataFrame!", LogMode.VERBOSELY
     )
     v_logger.info(
-      f"Collecting activities to .csv file in '"
+      f"Collecting activities to .{activities_config['storage_format']} file in '"
       f"{activities_config['results_folder_name']}'...",
       LogMode.VERBOSELY,
     )
 
-    # формируем полное имя файла для IC50.
-    full_file_name_ic50: str = (
-      f"{activities_config['results_folder_name']}/{file_name_ic50}.csv"
+    # сохраняем DataFrame с активностями IC50.
+    full_file_name_ic50: str = SaveDataFrame(
+      data_frame_ic50,
+      f"{activities_config['results_folder_name']}/{file_name_ic50}",
+      activities_config["storage_format"],
     )
-    # формируем полное имя файла для GI50.
-    full_file_name_gi50: str = (
-      f"{activities_config['results_folder_name']}/{file_name_gi50}.csv"
+    # сохраняем DataFrame с активностями GI50.
+    full_file_name_gi50: str = SaveDataFrame(
+      data_frame_gi50,
+      f"{activities_config['results_folder_name']}/{file_name_gi50}",
+      activities_config["storage_format"],
     )
 
-    # сохраняем DataFrame с активностями IC50 в CSV.
-    data_frame_ic50.to_csv(full_file_name_ic50, sep=";", index=False)
-    # сохраняем DataFrame с активностями GI50 в CSV.
-    data_frame_gi50.to_csv(full_file_name_gi50, sep=";", index=False)
-
     v_logger.success(
-      f"Collecting activities to .csv file in "
+      f"Collecting activities to .{activities_config['storage_format']} file in "
       f"'{activities_config['results_folder_name']}'!",
       LogMode.VERBOSELY,
     )
@@ -373,6 +443,13 @@ def GetCellLineChEMBLActivitiesFromCSV(cell_lines_data: pd.DataFrame):
         activities_config["logger_label"], activities_config["logger_color"]
       )
 
+    # отмечаем активности клеточной линии полученными (после записи всех файлов).
+    run_state.MarkCompleted(
+      "ChEMBL_download_activities/cell_lines",
+      cell_id,
+      [full_file_name_ic50, full_file_name_gi50],
+    )
+
     v_logger.info("-", LogMode.VERBOSELY)
 
   v_logger.success("End getting activities connected with cell_lines!")
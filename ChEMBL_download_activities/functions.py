@@ -6,15 +6,95 @@ ChEMBL_download_activities/functions.py
 клеточных линий.
 """
 
+from functools import cache
+
+import requests
 from chembl_webresource_client.new_client import new_client
 from chembl_webresource_client.query_set import QuerySet
+from chembl_webresource_client.settings import Settings
 
 from Configurations.config import Config, config
 from Utils.dataframe_funcs import MedianDedupedDF, pd
 from Utils.decorators import ReTry
+from Utils.http_session import RateLimitedHTTPAdapter, http_session, session_config
+from Utils.rate_limiter import TokenBucket
+from Utils.sqlite_cache import SQLiteCache
 from Utils.verbose_logger import LogMode, v_logger
 
 
+# колонки очищенной таблицы активностей мишени (в логическом порядке).
+target_activities_columns: list[str] = [
+  "molecule_chembl_id",
+  "parent_molecule_chembl_id",
+  "canonical_smiles",
+  "document_chembl_id",
+  "standard_relation",
+  "standard_value",
+  "standard_units",
+  "assay_chembl_id",
+  "assay_description",
+  "assay_type",
+  "assay_variant_accession",
+  "assay_variant_mutation",
+  "action_type",
+  "activity_comment",
+  "data_validity_comment",
+  "data_validity_description",
+  "bao_endpoint",
+  "bao_format",
+  "bao_label",
+]
+
+# конфигурация ограничителя частоты запросов к ChEMBL.
+chembl_rate_limit_config: Config = config["ChEMBL_download_activities"]["rate_limit"]
+
+# MEANS: общий для всех потоков ограничитель частоты запросов к ChEMBL.
+chembl_limiter = TokenBucket(
+  chembl_rate_limit_config["requests_per_second"], chembl_rate_limit_config["burst"]
+)
+
+# конфигурация кэша количества активностей.
+counts_cache_config: Config = config["ChEMBL_download_activities"]["counts_cache"]
+
+# MEANS: персистентный кэш количества активностей мишеней (по релизам ChEMBL).
+counts_cache: SQLiteCache | None = (
+  SQLiteCache.FromConfig(counts_cache_config) if counts_cache_config["enabled"] else None
+)
+
+
+def RateLimitedQuerySet(query_set: QuerySet) -> QuerySet:
+  """
+  Направляет запросы QuerySet к ChEMBL через общий ограничитель `chembl_limiter`.
+
+  У каждого QuerySet своя сессия, а filter/only создают новый QuerySet (с новой
+  сессией), поэтому ограничитель подключается к уже полностью построенному
+  QuerySet. Ответы из кэша клиента ChEMBL бюджет запросов не расходуют.
+
+  Args:
+      query_set (QuerySet): QuerySet клиента ChEMBL.
+
+  Returns:
+      QuerySet: тот же QuerySet.
+  """
+
+  session = query_set.query.session  # type: ignore
+  chembl_url: str = Settings.Instance().NEW_CLIENT_URL
+
+  session.mount(
+    chembl_url,
+    RateLimitedHTTPAdapter(
+      chembl_limiter,
+      pool_connections=session_config["pool_connections"],
+      pool_maxsize=session_config["pool_maxsize"],
+      pool_block=session_config["pool_block"],
+      # повторы запросов оставляем такими же, как у клиента ChEMBL.
+      max_retries=session.get_adapter(chembl_url).max_retries,
+    ),
+  )
+
+  return query_set
+
+
 @ReTry()
 def QuerySetActivitiesByIC50(target_id: str) -> QuerySet:
   """
@@ -35,9 +115,11 @@ def QuerySetActivitiesByIC50(target_id: str) -> QuerySet:
                  (благодаря декоратору ReTry).
   """
 
-  return new_client.activity.filter(  # type: ignore
-    target_chembl_id=target_id
-  ).filter(standard_type="IC50")
+  return RateLimitedQuerySet(
+    new_client.activity.filter(  # type: ignore
+      target_chembl_id=target_id
+    ).filter(standard_type="IC50")
+  )
 
 
 @ReTry()
@@ -59,9 +141,112 @@ def QuerySetActivitiesByKi(target_id: str) -> QuerySet:
                  (благодаря декоратору ReTry).
   """
 
-  return new_client.activity.filter(  # type: ignore
-    target_chembl_id=target_id
-  ).filter(standard_type="Ki")
+  return RateLimitedQuerySet(
+    new_client.activity.filter(  # type: ignore
+      target_chembl_id=target_id
+    ).filter(standard_type="Ki")
+  )
+
+
+@ReTry()
+def QuerySetTargetActivities(target_id: str) -> QuerySet:
+  """
+  Возвращает QuerySet активностей для указанной цели (target_id), отфильтрованных
+  на стороне ChEMBL по `filtering.targets` из файла с конфигурациями (типы
+  активности, отношения, единицы, организмы и типы анализа).
+
+  Активности всех типов (IC50 и Ki) скачиваются одним запросом и разделяются по
+  "standard_type" локально; строки, которые CleanedTargetActivitiesDF все равно
+  отбросил бы, не скачиваются.
+
+  Args:
+      target_id (str): Идентификатор цели из базы ChEMBL.
+
+  Returns:
+      QuerySet: QuerySet, содержащий активности цели, подходящие под фильтры.
+  """
+
+  # конфигурация для фильтрации активностей (мишеней).
+  filtering_config: Config = config["ChEMBL_download_activities"]["filtering"]["targets"]
+
+  return RateLimitedQuerySet(
+    new_client.activity.filter(  # type: ignore
+      target_chembl_id=target_id,
+      standard_type__in=filtering_config["standard_type"],
+      standard_relation__in=filtering_config["standard_relation"],
+      standard_units__in=filtering_config["standard_units"],
+      target_organism__in=filtering_config["target_organism"],
+      assay_type__in=filtering_config["assay_type"],
+    )
+  )
+
+
+@cache
+def ChEMBLRelease() -> str | None:
+  """
+  Возвращает версию базы данных ChEMBL (например, "ChEMBL_35"), к которой
+  обращается клиент. Запрашивается один раз за запуск.
+
+  Returns:
+      str | None: версия базы данных или None, если ее не удалось получить.
+  """
+
+  try:
+    response = http_session.get(
+      f"{Settings.Instance().NEW_CLIENT_URL}/status.json", timeout=60
+    )
+    response.raise_for_status()
+
+    return response.json()["chembl_db_version"]
+
+  except (requests.RequestException, ValueError, KeyError) as exception:
+    v_logger.warning(f"Could not get ChEMBL release: {exception}.")
+
+    return None
+
+
+def CountTargetActivities(target_id: str, activities_type: str) -> int:
+  """
+  Подсчитывает количество активностей указанного типа для цели (target_id).
+
+  Количество берется из `page_meta.total_count` страницы из одной записи, сами
+  активности не скачиваются. Результат сохраняется в кэше `counts_cache` для
+  текущего релиза ChEMBL, поэтому при повторных запусках (до выхода нового
+  релиза) запросы не выполняются.
+
+  Args:
+      target_id (str): Идентификатор цели из базы ChEMBL.
+      activities_type (str): Тип активности ("IC50" или "Ki").
+
+  Returns:
+      int: Количество активностей указанного типа для цели.
+  """
+
+  release: str | None = ChEMBLRelease() if counts_cache is not None else None
+  cache_key: str = f"{release}/{target_id}/{activities_type}"
+
+  if counts_cache is not None and release is not None:
+    cached_count: bytes | None = counts_cache.Get(cache_key)
+
+    if cached_count is not None:
+      return int(cached_count)
+
+  query_set: QuerySet = (
+    QuerySetActivitiesByIC50(target_id)
+    if activities_type == "IC50"
+    else QuerySetActivitiesByKi(target_id)
+  )
+
+  # количество приходит в page_meta любой страницы, поэтому запрашиваем
+  # страницу из одной записи.
+  query_set.query.limit = 1  # type: ignore
+
+  count: int = len(query_set)  # type: ignore
+
+  if counts_cache is not None and release is not None:
+    counts_cache.Set(cache_key, str(count).encode())
+
+  return count
 
 
 def CountTargetActivitiesByIC50(target_id: str) -> int:
@@ -75,7 +260,7 @@ def CountTargetActivitiesByIC50(target_id: str) -> int:
       int: Количество активностей типа IC50 для указанной цели.
   """
 
-  return len(QuerySetActivitiesByIC50(target_id))  # type: ignore
+  return CountTargetActivities(target_id, "IC50")
 
 
 def CountTargetActivitiesByKi(target_id: str) -> int:
@@ -89,7 +274,7 @@ def CountTargetActivitiesByKi(target_id: str) -> int:
       int: Количество активностей типа Ki для указанной цели.
   """
 
-  return len(QuerySetActivitiesByKi(target_id))  # type: ignore
+  return CountTargetActivities(target_id, "Ki")
 
 
 def CountCellLineActivitiesByFile(file_name: str) -> int:
@@ -146,6 +331,14 @@ def CleanedTargetActivitiesDF(
     f"Start cleaning {activities_type} activities DataFrame from {target_id}...",
     LogMode.VERBOSELY,
   )
+
+  # активностей нет (у пустого ответа ChEMBL нет и колонок).
+  if data.empty:
+    v_logger.info(f"No {activities_type} activities from {target_id}.", LogMode.VERBOSELY)
+    v_logger.info("-", LogMode.VERBOSELY)
+
+    return pd.DataFrame(columns=target_activities_columns)
+
   v_logger.info("Deleting useless columns...", LogMode.VERBOSELY)
 
   data = data.drop(
@@ -205,29 +398,7 @@ def CleanedTargetActivitiesDF(
   v_logger.success("Calculating median for 'standard value'!", LogMode.VERBOSELY)
   v_logger.info("Reindexing columns in logical order...", LogMode.VERBOSELY)
 
-  data = data.reindex(
-    columns=[
-      "molecule_chembl_id",
-      "parent_molecule_chembl_id",
-      "canonical_smiles",
-      "document_chembl_id",
-      "standard_relation",
-      "standard_value",
-      "standard_units",
-      "assay_chembl_id",
-      "assay_description",
-      "assay_type",
-      "assay_variant_accession",
-      "assay_variant_mutation",
-      "action_type",
-      "activity_comment",
-      "data_validity_comment",
-      "data_validity_description",
-      "bao_endpoint",
-      "bao_format",
-      "bao_label",
-    ]
-  )
+  data = data.reindex(columns=target_activities_columns)
 
   v_logger.success("Reindexing columns in logical order!", LogMode.VERBOSELY)
   v_logger.success(
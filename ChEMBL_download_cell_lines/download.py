@@ -9,6 +9,7 @@ from ChEMBL_download_cell_lines.functions import *
 from Configurations.config import Config, config
 from Utils.decorators import IgnoreWarnings
 from Utils.files_funcs import IsFileInFolder, os
+from Utils.run_state import run_state
 from Utils.verbose_logger import LogMode
 
 
@@ -41,10 +42,15 @@ def DownloadChEMBLCellLines():
   if config["testing_flag"]:
     cell_lines_config["id_list"] = ["CHEMBL4295386", "CHEMBL3307781"]
 
-  # если не нужно пропускать скачанные или файл не существует.
-  if not config["skip_downloaded"] or not IsFileInFolder(
-    f"{cell_lines_config['results_file_name']}.csv",
-    f"{cell_lines_config['results_folder_name']}",
+  # если не нужно пропускать скачанные или клеточные линии еще не скачаны
+  # (результаты прежних запусков - по наличию файла).
+  if not config["skip_downloaded"] or not run_state.IsCompleted(
+    "ChEMBL_download_cell_lines",
+    cell_lines_config["results_file_name"],
+    lambda: IsFileInFolder(
+      f"{cell_lines_config['results_file_name']}.{cell_lines_config['storage_format']}",
+      cell_lines_config["results_folder_name"],
+    ),
   ):
     # если нужно скачивать все, очищаем список id (скачаются все).
     if cell_lines_config["download_all"]:
@@ -15,7 +15,8 @@ from ChEMBL_download_activities.download import GetCellLineChEMBLActivitiesFromC
 from ChEMBL_download_activities.functions import CountCellLineActivitiesByFile
 from Configurations.config import Config, config
 from Utils.decorators import ReTry
-from Utils.files_funcs import IsFolderEmpty, os, pd
+from Utils.files_funcs import IsFolderEmpty, SaveDataFrame, os, pd
+from Utils.run_state import run_state
 from Utils.verbose_logger import LogMode, v_logger
 
 
@@ -158,7 +159,7 @@ def DownloadCellLinesFromIdList():
   """
   Скачивает данные о клеточных линиях из ChEMBL по списку идентификаторов,
   добавляет информацию об активностях IC50 и GI50, проводит первичный анализ
-  и сохраняет результаты в CSV-файл.
+  и сохраняет результаты в файл (CSV или Parquet).
   """
 
   # получаем конфигурацию для клеточных линий.
@@ -188,22 +189,26 @@ def DownloadCellLinesFromIdList():
 
   v_logger.success("Collecting cell_lines to pandas.DataFrame!", LogMode.VERBOSELY)
   v_logger.info(
-    f"Collecting cell_lines to .csv file in "
+    f"Collecting cell_lines to .{cell_lines_config['storage_format']} file in "
     f"'{cell_lines_config['results_folder_name']}'...",
     LogMode.VERBOSELY,
   )
 
-  # формируем имя файла для сохранения.
-  file_name: str = (
+  # сохраняем DataFrame в файл.
+  file_name: str = SaveDataFrame(
+    data_frame,
     f"{cell_lines_config['results_folder_name']}/"
-    f"{cell_lines_config['results_file_name']}.csv"
+    f"{cell_lines_config['results_file_name']}",
+    cell_lines_config["storage_format"],
   )
 
-  # сохраняем DataFrame в CSV-файл.
-  data_frame.to_csv(file_name, sep=";", index=False)
+  # отмечаем клеточные линии скачанными (только после полной записи файла).
+  run_state.MarkCompleted(
+    "ChEMBL_download_cell_lines", cell_lines_config["results_file_name"], [file_name]
+  )
 
   v_logger.success(
-    f"Collecting cell_lines to .csv file in "
+    f"Collecting cell_lines to .{cell_lines_config['storage_format']} file in "
     f"'{cell_lines_config['results_folder_name']}'!",
     LogMode.VERBOSELY,
   )
@@ -8,7 +8,13 @@ ChEMBL и их объединение.
 from ChEMBL_download_compounds.functions import *
 from Configurations.config import Config, config
 from Utils.decorators import IgnoreWarnings
-from Utils.files_funcs import CombineCSVInFolder, DeleteFilesInFolder, IsFileInFolder, os
+from Utils.files_funcs import (
+  CombineCSVInFolder,
+  DeleteFilesInFolder,
+  IsFileInFolder,
+  os,
+)
+from Utils.run_state import run_state
 from Utils.verbose_logger import LogMode, v_logger
 
 
@@ -50,16 +56,23 @@ def DownloadChEMBLCompounds():
     less_limit = mw_range[0]
     greater_limit = mw_range[1]
 
-    # если не нужно пропускать скачанные или файл не существует.
-    if not config["skip_downloaded"] or not IsFileInFolder(
-      f"range_{less_limit}_{greater_limit}_mw_mols.csv",
-      f"{compounds_config['results_folder_name']}",
+    # если не нужно пропускать скачанные или диапазон еще не скачан
+    # (результаты прежних запусков - по наличию файла).
+    if not config["skip_downloaded"] or not run_state.IsCompleted(
+      "ChEMBL_download_compounds",
+      f"range_{less_limit}_{greater_limit}",
+      lambda: IsFileInFolder(
+        f"range_{less_limit}_{greater_limit}_mw_mols."  # noqa: B023
+        f"{compounds_config['storage_format']}",
+        compounds_config["results_folder_name"],
+      ),
     ):
       # скачиваем соединения для текущего диапазона.
       DownloadCompoundsByMWRange(
         less_limit,
         greater_limit,
         results_folder_name=compounds_config["results_folder_name"],
+        storage_format=compounds_config["storage_format"],
       )
 
     # если файл уже скачан, пропускаем.
@@ -74,9 +87,11 @@ def DownloadChEMBLCompounds():
 
   # если нужно объединять файлы.
   if compounds_config["need_combining"]:
-    # объединяем CSV файлы в папке.
+    # объединяем файлы в папке.
     CombineCSVInFolder(
-      compounds_config["results_folder_name"], compounds_config["combined_file_name"]
+      compounds_config["results_folder_name"],
+      compounds_config["combined_file_name"],
+      compounds_config["storage_format"],
     )
 
   # если нужно удалять файлы после объединения и объединение включено.
@@ -88,7 +103,7 @@ def DownloadChEMBLCompounds():
     # удаляем файлы, кроме объединенного.
     DeleteFilesInFolder(
       compounds_config["results_folder_name"],
-      [f"{compounds_config['combined_file_name']}.csv"],
+      [f"{compounds_config['combined_file_name']}.{compounds_config['storage_format']}"],
     )
 
     v_logger.success(
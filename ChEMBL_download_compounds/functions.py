@@ -9,8 +9,11 @@ molfiles в SDF формат.
 from chembl_webresource_client.new_client import new_client
 from chembl_webresource_client.query_set import QuerySet
 
+from ChEMBL_download_activities.functions import RateLimitedQuerySet
 from Utils.decorators import ReTry
-from Utils.files_funcs import SaveMolfilesToSDF, pd
+from Utils.files_funcs import SaveDataFrame, SaveMolfilesToSDF, pd
+from Utils.molfile_store import molfile_store
+from Utils.run_state import run_state
 from Utils.verbose_logger import LogMode, v_logger
 
 
@@ -206,16 +209,21 @@ def ExpandedFromDictionariesCompoundsDF(data: pd.DataFrame) -> pd.DataFrame:
 
 @ReTry(attempts_amount=1)
 def DownloadCompoundsByMWRange(
-  less_limit: int, greater_limit: int, results_folder_name: str
+  less_limit: int,
+  greater_limit: int,
+  results_folder_name: str,
+  storage_format: str = "csv",
 ):
   """
   Возвращает молекулы в диапазоне молекулярной массы [less_limit;
-  greater_limit) из базы ChEMBL, сохраняя их в .csv файл.
+  greater_limit) из базы ChEMBL, сохраняя их в файл.
 
   Args:
       less_limit (int): нижняя граница.
       greater_limit (int): верхняя граница.
       results_folder_name (str): имя папки для закачки.
+      storage_format (str, optional): формат файла ("csv" или "parquet").
+                                      Defaults to "csv".
   """
 
   v_logger.info(
@@ -242,17 +250,25 @@ def DownloadCompoundsByMWRange(
 
   v_logger.success("Collecting molecules to pandas.DataFrame!", LogMode.VERBOSELY)
   v_logger.info(
-    f"Collecting molecules to .csv file in '{results_folder_name}'...", LogMode.VERBOSELY
+    f"Collecting molecules to .{storage_format} file in '{results_folder_name}'...",
+    LogMode.VERBOSELY,
   )
 
-  # формируем имя файла для сохранения.
-  file_name: str = f"{results_folder_name}/range_{less_limit}_{greater_limit}_mw_mols.csv"
+  # сохраняем DataFrame в файл.
+  file_name: str = SaveDataFrame(
+    data_frame,
+    f"{results_folder_name}/range_{less_limit}_{greater_limit}_mw_mols",
+    storage_format,
+  )
 
-  # сохраняем DataFrame в .csv файл.
-  data_frame.to_csv(file_name, sep=";", index=False)
+  # отмечаем диапазон скачанным (только после полной записи файла).
+  run_state.MarkCompleted(
+    "ChEMBL_download_compounds", f"range_{less_limit}_{greater_limit}", [file_name]
+  )
 
   v_logger.success(
-    f"Collecting molecules to .csv file in '{results_folder_name}'!", LogMode.VERBOSELY
+    f"Collecting molecules to .{storage_format} file in '{results_folder_name}'!",
+    LogMode.VERBOSELY,
   )
 
 
@@ -281,7 +297,8 @@ def SaveChEMBLMolfilesToSDFByIdList(
   def DataFrameMolfilesFromIdList(molecule_chembl_id_list: list[str]) -> pd.DataFrame:
     """
     Возвращает pd.DataFrame из molfile по каждой молекуле из списка
-    molecule_chembl_id.
+    molecule_chembl_id. Molfile, уже сохраненные в хранилище `molfile_store`,
+    повторно из ChEMBL не запрашиваются.
 
     Args:
         molecule_chembl_id_list (list[str]): список id.
@@ -291,22 +308,60 @@ def SaveChEMBLMolfilesToSDFByIdList(
                       соотв. molfile.
     """
 
-    # фильтруем молекулы по списку id.
-    qs_data: QuerySet = new_client.molecule.filter(  # type: ignore
-      molecule_chembl_id__in=molecule_chembl_id_list
-    ).only(["molecule_chembl_id", "molecule_structures"])
+    unique_ids: list[str] = list(dict.fromkeys(molecule_chembl_id_list))
 
-    data = pd.DataFrame(qs_data)  # type: ignore
+    # molfile, которые уже были скачаны ранее.
+    molfiles: dict[str, str | None] = {
+      key.removeprefix("chembl:"): molfile
+      for key, molfile in (
+        molfile_store.GetMany([f"chembl:{i}" for i in unique_ids])
+        if molfile_store is not None
+        else {}
+      ).items()
+    }
 
-    # извлекаем molfile из структуры молекулы.
-    data["molfile"] = data["molecule_structures"].apply(
-      lambda x: x["molfile"] if isinstance(x, dict) else None
-    )
+    missing_ids: list[str] = [i for i in unique_ids if i not in molfiles]
 
-    # удаляем столбец molecule_structures.
-    data = data.drop(["molecule_structures"], axis=1)
+    v_logger.info(
+      f"Found {len(unique_ids) - len(missing_ids)}/{len(unique_ids)} stored molfiles.",
+      LogMode.VERBOSELY,
+    )
 
-    return data
+    if missing_ids:
+      # фильтруем молекулы по списку id.
+      qs_data: QuerySet = RateLimitedQuerySet(
+        new_client.molecule.filter(  # type: ignore
+          molecule_chembl_id__in=missing_ids
+        ).only(["molecule_chembl_id", "molecule_structures"])
+      )
+
+      # извлекаем molfile из структуры молекулы.
+      downloaded: dict[str, str | None] = {
+        molecule["molecule_chembl_id"]: (
+          molecule["molecule_structures"]["molfile"]
+          if isinstance(molecule["molecule_structures"], dict)
+          else None
+        )
+        for molecule in qs_data  # type: ignore
+      }
+
+      if molfile_store is not None:
+        molfile_store.SetMany(
+          {
+            f"chembl:{i}": molfile
+            for i, molfile in downloaded.items()
+            if molfile is not None
+          }
+        )
+
+      molfiles.update(downloaded)
+
+    return pd.DataFrame(
+      {
+        "molecule_chembl_id": [i for i in unique_ids if i in molfiles],
+        "molfile": [molfiles[i] for i in unique_ids if i in molfiles],
+      }
+    )
 
   v_logger.info("Collecting molfiles to pandas.DataFrame...", LogMode.VERBOSELY)
 
@@ -9,6 +9,7 @@ from ChEMBL_download_targets.functions import *
 from Configurations.config import Config, config
 from Utils.decorators import IgnoreWarnings
 from Utils.files_funcs import IsFileInFolder, os
+from Utils.run_state import run_state
 from Utils.verbose_logger import LogMode
 
 
@@ -39,9 +40,15 @@ def DownloadChEMBLTargets():
   if config["testing_flag"]:
     targets_config["id_list"] = ["CHEMBL1951", "CHEMBL2034"]
 
-  # если файлы не скачаны или их нет в папке.
-  if not config["skip_downloaded"] or not IsFileInFolder(
-    targets_config["results_file_name"], targets_config["results_folder_name"]
+  # если не нужно пропускать скачанные или мишени еще не скачаны
+  # (результаты прежних запусков - по наличию файла).
+  if not config["skip_downloaded"] or not run_state.IsCompleted(
+    "ChEMBL_download_targets",
+    targets_config["results_file_name"],
+    lambda: IsFileInFolder(
+      f"{targets_config['results_file_name']}.{targets_config['storage_format']}",
+      targets_config["results_folder_name"],
+    ),
   ):
     # если скачиваем все мишени, очищаем список id.
     if targets_config["download_all"]:
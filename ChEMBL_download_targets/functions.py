@@ -3,7 +3,7 @@ ChEMBL_download_targets/functions.py
 
 Этот модуль содержит функции для загрузки данных о целевых белках (targets)
 из базы данных ChEMBL, расширения словарей в DataFrame, добавления
-информации об активностях и сохранения результатов в CSV-файл.
+информации об активностях и сохранения результатов в файл (CSV или Parquet).
 """
 
 from chembl_webresource_client.new_client import new_client
@@ -16,7 +16,8 @@ from ChEMBL_download_activities.functions import (
 )
 from Configurations.config import Config, config
 from Utils.decorators import ReTry
-from Utils.files_funcs import pd
+from Utils.files_funcs import SaveDataFrame, pd
+from Utils.run_state import run_state
 from Utils.verbose_logger import LogMode, v_logger
 
 
@@ -212,7 +213,7 @@ def DownloadTargetsFromIdList():
   """
   Скачивает данные о целевых белках (targets) из ChEMBL по списку
   идентификаторов, добавляет информацию об активностях IC50 и Ki, проводит
-  первичный анализ и сохраняет результаты в CSV-файл.
+  первичный анализ и сохраняет результаты в файл (CSV или Parquet).
   """
 
   # получаем конфигурацию для скачивания целей.
@@ -242,19 +243,25 @@ def DownloadTargetsFromIdList():
 
   v_logger.success("Collecting targets to pandas.DataFrame!", LogMode.VERBOSELY)
   v_logger.info(
-    f"Collecting targets to .csv file in '{targets_config['results_folder_name']}'...",
+    f"Collecting targets to .{targets_config['storage_format']} file in "
+    f"'{targets_config['results_folder_name']}'...",
     LogMode.VERBOSELY,
   )
 
-  # формируем имя файла.
-  file_name: str = (
-    f"{targets_config['results_folder_name']}/{targets_config['results_file_name']}.csv"
+  # сохраняем DataFrame в файл.
+  file_name: str = SaveDataFrame(
+    data_frame,
+    f"{targets_config['results_folder_name']}/{targets_config['results_file_name']}",
+    targets_config["storage_format"],
   )
 
-  # сохраняем DataFrame в CSV-файл.
-  data_frame.to_csv(file_name, sep=";", index=False)
+  # отмечаем мишени скачанными (только после полной записи файла).
+  run_state.MarkCompleted(
+    "ChEMBL_download_targets", targets_config["results_file_name"], [file_name]
+  )
 
   v_logger.success(
-    f"Collecting targets to .csv file in '{targets_config['results_folder_name']}'!",
+    f"Collecting targets to .{targets_config['storage_format']} file in "
+    f"'{targets_config['results_folder_name']}'!",
     LogMode.VERBOSELY,
   )
@@ -2,90 +2,324 @@
 PubChem_download_toxicity/characteristics.py
 
 Этот модуль содержит функции для фильтрации данных о токсичности соединений
-из PubChem по характеристикам и сохранения их в CSV и SDF файлы.
+из PubChem по характеристикам и сохранения их в CSV (или Parquet) и SDF файлы.
 """
 
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+
 from PubChem_download_toxicity.functions import *
+from Utils.chunk_size_controller import ChunkSizeController
 from Utils.dataframe_funcs import MedianDedupedDF
+from Utils.decorators import retry_config
+from Utils.files_funcs import IsFileInFolder, ReadDataFrame, SaveDataFrame
+from Utils.molfile_store import molfile_store
+from Utils.run_state import run_state
+
+
+def ReadMolfilesFromSDFResponse(response: requests.Response) -> dict[str, str]:
+  """
+  Разбирает SDF из ответа PubChem по мере его получения (потоком), не собирая
+  весь ответ в одну строку.
 
+  Args:
+      response (requests.Response): ответ на запрос SDF (stream=True).
 
-def GetMolfilesFromCIDs(
-  cids: list[str], sleep_time: float | None = toxicity_config["sleep_time"]
-) -> list[str]:
+  Returns:
+      dict[str, str]: словарь CID -> molfile (первая строка записи SDF
+                      из PubChem - это CID соединения).
+  """
+
+  if response.encoding is None:
+    response.encoding = "utf-8"
+
+  molfiles: dict[str, str] = {}
+  record_lines: list[str] = []
+
+  for line in response.iter_lines(decode_unicode=True):
+    if line != "$$$$":
+      record_lines.append(line)
+      continue
+
+    # пустая строка перед "$$$$" к molfile не относится.
+    if record_lines and not record_lines[-1]:
+      record_lines.pop()
+
+    if record_lines:
+      molfiles[record_lines[0].strip()] = "\n" + "\n".join(record_lines[1:])
+
+    record_lines = []
+
+  return molfiles
+
+
+def GetMolfilesFromCIDs(cids: list[str]) -> list[str | None]:
   """
   Возвращает список molfile-строк для заданного списка CID.
-  Соединяет CID в строку, разделяет ее на более короткие подстроки, чтобы избежать
-  ограничений на длину URL при запросе к PubChem, и получает molfile для каждого CID.
+
+  Molfile, уже сохраненные в хранилище `molfile_store`, повторно не скачиваются.
+  Остальные запрашиваются POST-запросами (список CID - в теле запроса) пачками
+  в несколько потоков; размер пачки подстраивается под время ответа PubChem
+  (при медленных ответах и тайм-аутах уменьшается). Ответы разбираются потоком.
+
+  Пачка, на которую PubChem ответил ошибкой клиента (например, 400 из-за одного
+  неизвестного CID), делится пополам, пока ошибочный CID не останется один.
+  При временных ошибках (тайм-аут, 5xx, 429) пачка тоже повторяется по половинам,
+  а одиночный CID - целиком с растущей паузой; он считается недоступным после
+  `attempts_amount` неудачных попыток (см. ReTry).
 
   Args:
       cids (list[str]): список CID соединений.
-      sleep_time (float | None, optional): время ожидания перед повторной попыткой
-      в секундах. Defaults to toxicity_config["sleep_time"].
 
   Returns:
-      list[str]: список molfile-строк.
+      list[str | None]: список molfile-строк в порядке `cids`
+                        (None, если molfile получить не удалось).
   """
 
-  cids_str = ",".join(str(cid) for cid in cids).replace(" ", "")
+  store_keys: list[str] = [f"cid:{NormalizedCID(cid)}" for cid in cids]
 
-  def SplitLongStringWithCommas(s: str, max_separated_len: int = 2000) -> list[str]:
-    """
-    Разбивает длинную строку, содержащую CID, разделенные запятыми,
-    на список более коротких строк.
+  # molfile, которые уже были скачаны ранее.
+  molfiles: dict[str, str] = (
+    molfile_store.GetMany(store_keys) if molfile_store is not None else {}
+  )
 
-    Это необходимо для избежания ограничений на длину URL при запросе к PubChem.
-    Разбивает так, чтобы длина каждой подстроки не превышала max_separated_len символов.
+  # CID, которые нужно скачать, и пачки, которые нужно повторить
+  # (с количеством неудачных попыток для одиночных CID).
+  pending_cids: deque[str] = deque(
+    dict.fromkeys(key.removeprefix("cid:") for key in store_keys if key not in molfiles)
+  )
+  retry_chunks: deque[tuple[list[str], int]] = deque()
 
-    Args:
-        s (str): строка, содержащая CID, разделенные запятыми.
+  v_logger.info(
+    f"Found {len(molfiles)}/{len(molfiles) + len(pending_cids)} stored molfiles.",
+    LogMode.VERBOSELY,
+  )
+
+  fetch_config: Config = toxicity_config["molfiles_fetch"]
+  chunk_size = ChunkSizeController.FromConfig(fetch_config)
+  lock = threading.Lock()
+
+  # ошибки клиента, кроме тайм-аута запроса и превышения частоты запросов.
+  client_error_codes: set[int] = set(range(400, 500)) - {408, 429}
+
+  def NextChunk() -> tuple[list[str], int]:
+    """
+    Забирает следующую пачку CID (сначала - пачки для повтора).
 
     Returns:
-        list[str]: список строк, содержащих CID, разделенные запятыми.
+        tuple[list[str], int]: пачка CID (пустая, если скачивать больше нечего)
+                               и количество неудачных попыток ее скачать.
+    """
+
+    with lock:
+      if retry_chunks:
+        return retry_chunks.popleft()
+
+      return [
+        pending_cids.popleft() for _ in range(min(chunk_size.size, len(pending_cids)))
+      ], 0
+
+  def RetryChunk(cids_chunk: list[str], failures: int = 0):
     """
+    Ставит пачку в очередь на повтор (пачку из нескольких CID - по половинам).
 
-    if len(s) <= max_separated_len:
-      return [s]
+    Args:
+        cids_chunk (list[str]): пачка CID.
+        failures (int, optional): количество неудачных попыток скачать одиночный
+                                  CID. Defaults to 0.
+    """
 
-    chunks = []
-    curr_chunk = ""
-    for cid in s.split(","):
-      if len(curr_chunk) + len(f"{cid},") <= max_separated_len:
-        curr_chunk += f"{cid},"
+    with lock:
+      if len(cids_chunk) > 1:
+        retry_chunks.append((cids_chunk[: len(cids_chunk) // 2], 0))
+        retry_chunks.append((cids_chunk[len(cids_chunk) // 2 :], 0))
 
       else:
-        chunks.append(curr_chunk.rstrip(","))
-        curr_chunk = f"{cid},"
-
-    if curr_chunk not in chunks:
-      chunks.append(curr_chunk.rstrip(","))
-    return chunks
-
-  # получаем molfile для каждой подстроки CID.
-  molfiles_str: str = ""
-  for cids_str_shorter in SplitLongStringWithCommas(cids_str):
-    molfiles_str += GetResponse(
-      "https://pubchem.ncbi.nlm.nih.gov/rest/pug/compound/CID/"
-      f"{cids_str_shorter}/record/SDF?record_type=2d",
-      True,
-      sleep_time,
-    ).text
-
-  # разделяем строку с molfile на отдельные molfile и очищаем их.
-  return [
-    f"\n{molfile.split('\n', 1)[1]}" for molfile in molfiles_str.split("\n\n$$$$\n")[:-1]
-  ]
+        retry_chunks.append((cids_chunk, failures))
+
+  def DownloadChunks():
+    """
+    Скачивает пачки CID, пока они не закончатся.
+    """
+
+    while (next_chunk := NextChunk())[0]:
+      cids_chunk, failures = next_chunk
+      start_time = time.time()
+
+      try:
+        response = http_session.post(
+          "https://pubchem.ncbi.nlm.nih.gov/rest/pug/compound/cid/record/SDF"
+          "?record_type=2d",
+          data={"cid": ",".join(cids_chunk)},
+          stream=True,
+          timeout=fetch_config["timeout"],
+        )
+
+        AdjustRateByThrottling(response)
+
+        # ошибка клиента (например, неизвестный CID): повторять пачку целиком
+        # бессмысленно, ищем ошибочный CID делением пачки пополам.
+        if response.status_code in client_error_codes:
+          if len(cids_chunk) > 1:
+            RetryChunk(cids_chunk)
+
+          continue
+
+        response.raise_for_status()
+
+        downloaded: dict[str, str] = {
+          f"cid:{cid}": molfile
+          for cid, molfile in ReadMolfilesFromSDFResponse(response).items()
+        }
+
+      except requests.RequestException as exception:
+        v_logger.warning(
+          f"Could not retrieve molfiles for {len(cids_chunk)} cids: {exception}.",
+          LogMode.VERBOSELY,
+        )
+
+        chunk_size.OnFailure()
+
+        # временная ошибка: повторяем пачку по половинам, а одиночный CID -
+        # после паузы, которая растет с каждой неудачей.
+        if len(cids_chunk) > 1:
+          RetryChunk(cids_chunk)
+
+        elif failures + 1 < retry_config["attempts_amount"]:
+          time.sleep(retry_config["sleep_time"] * 2**failures)
+          RetryChunk(cids_chunk, failures + 1)
+
+        continue
+
+      chunk_size.OnSuccess(time.time() - start_time)
+
+      if molfile_store is not None:
+        molfile_store.SetMany(downloaded)
+
+      with lock:
+        molfiles.update(downloaded)
+
+  if pending_cids:
+    with ThreadPoolExecutor(max_workers=fetch_config["workers"]) as executor:
+      # list - чтобы пробросить исключения из потоков.
+      list(executor.map(lambda _: DownloadChunks(), range(fetch_config["workers"])))
+
+  missing_cids: list[str] = DedupedList(
+    [key.removeprefix("cid:") for key in store_keys if key not in molfiles]
+  )
+
+  if missing_cids:
+    v_logger.warning(
+      f"Could not retrieve molfiles for {len(missing_cids)} cids: "
+      f"{', '.join(sorted(missing_cids)[:10])}"
+      f"{', ...' if len(missing_cids) > 10 else ''}."  # noqa: PLR2004
+    )
 
+  return [molfiles.get(key) for key in store_keys]
 
-def FilterDownloadedToxicityByCharacteristics(
+
+def SaveCharacteristicsGroup(
+  unit_type: str, file_suffix: str, group_df: pd.DataFrame, molfiles_by_cid: dict
+):
+  """
+  Сохраняет выборку одной комбинации характеристик: устраняет дубликаты по CID,
+  считает pLD, записывает файл `storage_format` и SDF и отмечает выборку
+  сохраненной. Может выполняться в процессе пула, поэтому все данные выборки
+  получает аргументами.
+
+  Args:
+      unit_type (str): тип единиц измерения ("kg" или "m3").
+      file_suffix (str): значения характеристик через "_" (окончание имен файлов).
+      group_df (pd.DataFrame): строки комбинации характеристик.
+      molfiles_by_cid (dict): CID -> molfile (None, если получить не удалось)
+                              для соединений выборки.
+  """
+
+  v_logger.info("-", LogMode.VERBOSELY)  # noqa: PLE1205
+
+  # путь к папке для хранения результатов фильтрации.
+  charact_folder_name: str = (
+    f"{toxicity_config['results_folder_name']}/"
+    f"{filtering_config['characteristics_subfolder_name']}"
+  )
+
+  filtered_file_name: str = (
+    f"{charact_folder_name}/{unit_type}/"
+    f"{toxicity_config['results_file_name']}_{file_suffix}"
+  )
+
+  # устраняем дубликаты по CID, усредняя значения дозы.
+  charact_df: pd.DataFrame = MedianDedupedDF(group_df, "cid", "dose")
+
+  charact_df["pLD"] = -np.log10((charact_df["dose"] / charact_df["mw"]) / 1_000_000)
+
+  os.makedirs(f"{charact_folder_name}/{unit_type}", exist_ok=True)
+
+  # сохраняем отфильтрованный DataFrame (CSV выборок - через запятую).
+  filtered_table_name: str = SaveDataFrame(
+    charact_df, filtered_file_name, toxicity_config["storage_format"], ","
+  )
+  sdf_file_names: list[str] = []
+
+  # если необходимо сохранить структуру соединений в формате SDF.
+  if toxicity_config["download_compounds_sdf"]:
+    v_logger.info(f"Saving {unit_type} characteristics to .sdf...", LogMode.VERBOSELY)
+
+    # molfile выборки берем из уже скачанных.
+    cids: list[str] = list(charact_df["cid"])
+    molfiles_df = pd.DataFrame(
+      {"cid": cids, "molfile": [molfiles_by_cid.get(cid) for cid in cids]}
+    )
+
+    sdf_file_names = SaveMolfilesToSDF(
+      # соединения без molfile не сохраняем.
+      data=molfiles_df[molfiles_df["molfile"].notna()],
+      file_name=filtered_file_name,
+      molecule_id_column_name="cid",
+      extra_data=charact_df,
+      indexing_lists=True,
+    )
+
+    v_logger.success(f"Saving {unit_type} characteristics to .sdf!", LogMode.VERBOSELY)
+
+  # отмечаем выборку сохраненной (после записи всех файлов).
+  run_state.MarkCompleted(
+    "PubChem_download_toxicity/characteristics",
+    f"{unit_type}/{file_suffix}",
+    [filtered_table_name, *sdf_file_names],
+  )
+
+  # логируем успешное сохранение данных.
+  v_logger.success(f"Saved {file_suffix}, len: {len(charact_df)}!", LogMode.VERBOSELY)
+  v_logger.info("~", LogMode.VERBOSELY)  # noqa: PLE1205
+
+
+def InitCharacteristicsWorker():
+  """
+  Подготавливает процесс пула, сохраняющий выборки по характеристикам.
+  """
+
+  v_logger.UpdateFormat(toxicity_config["logger_label"], toxicity_config["logger_color"])
+
+
+def FilterDownloadedToxicityByCharacteristics(  # noqa: PLR0913
   unit_type: str,
   charact_1: str,
   charact_2: str,
   charact_3: str,
   charact_4: str | None = None,
-) -> None:
+  *,
+  executor: ProcessPoolExecutor | None = None,
+) -> list[Future]:
   """
-  Фильтрует данные о токсичности из CSV-файла по заданным характеристикам,
-  загружает molfile для каждого соединения и сохраняет результаты в CSV и SDF файлы.
+  Фильтрует данные о токсичности из объединенного файла (.csv или .parquet)
+  по заданным характеристикам, загружает molfile для каждого соединения и
+  сохраняет результаты в файлы `storage_format` и SDF.
+
+  Выборки сохраняются функцией SaveCharacteristicsGroup: в процессах `executor`
+  (не более 2 * `characteristics_workers` выборок в очереди пула) или, если
+  пул не задан, последовательно.
 
   Args:
       unit_type (str): тип единиц измерения (например, "kg" или "m3").
@@ -94,6 +328,13 @@ def FilterDownloadedToxicityByCharacteristics(
       charact_3 (str): название третьей характеристики для фильтрации.
       charact_4 (str | None): название четвёртой (опциональной) характеристики
                               для фильтрации. Defaults to None.
+      executor (ProcessPoolExecutor | None, optional): пул процессов для
+                                                       сохранения выборок.
+                                                       Defaults to None.
+
+  Returns:
+      list[Future]: выборки, которые еще сохраняются в процессах `executor`
+                    (их результат нужно дождаться).
   """
 
   v_logger.info(f"Filtering by characteristics for {unit_type}...")
@@ -108,20 +349,20 @@ def FilterDownloadedToxicityByCharacteristics(
   unit_type_df: pd.DataFrame
 
   try:
-    # читаем объединённый CSV-файл,
+    # читаем объединённый файл,
     # содержащий данные по токсичности для заданного unit_type.
-    unit_type_df = pd.read_csv(
+    unit_type_df = ReadDataFrame(
       f"{toxicity_config['results_folder_name']}/"
-      f"{toxicity_config['combined_file_name']}_{unit_type}.csv",
-      sep=config["csv_separator"],
-      low_memory=False,
+      f"{toxicity_config['combined_file_name']}_{unit_type}",
+      toxicity_config["storage_format"],
     )
 
   except pd.errors.EmptyDataError:
-    v_logger.warning(
-      f"{unit_type} .csv file is empty, skip filtering by characteristics."
-    )
-    return
+    unit_type_df = pd.DataFrame()
+
+  if unit_type_df.empty:
+    v_logger.warning(f"{unit_type} file is empty, skip filtering by characteristics.")
+    return []
 
   # если одна из характеристик - период времени,
   # заменяем отсутствующие значения на "no_exact_time".
@@ -132,106 +373,127 @@ def FilterDownloadedToxicityByCharacteristics(
     if charact == "time_period":
       unit_type_df[charact] = unit_type_df[charact].replace(np.nan, "no_exact_time")
 
-  # уникальные значения для каждой из характеристик.
-  unique_charact_1 = unit_type_df[charact_1].unique()
-  unique_charact_2 = unit_type_df[charact_2].unique()
-  unique_charact_3 = unit_type_df[charact_3].unique()
-
-  # если charact_4 передан, получаем уникальные значения,
-  # иначе используем список из одного None.
-  unique_charact_4 = unit_type_df[charact_4].unique() if charact_4 else [None]
+  characts: list[str] = [charact_1, charact_2, charact_3]
+  if charact_4:
+    characts.append(charact_4)
 
-  v_logger.info(f"Unique {charact_1}s: {unique_charact_1}.", LogMode.VERBOSELY)
-  v_logger.info(f"Unique {charact_2}s: {unique_charact_2}.", LogMode.VERBOSELY)
-  v_logger.info(f"Unique {charact_3}s: {unique_charact_3}.", LogMode.VERBOSELY)
+  for charact in characts:
+    v_logger.info(
+      f"Unique {charact}s: {unit_type_df[charact].unique()}.", LogMode.VERBOSELY
+    )
 
-  if charact_4:
-    v_logger.info(f"Unique {charact_4}s: {unique_charact_4}.", LogMode.VERBOSELY)
+  # количество различных CID в каждой комбинации характеристик (столько строк
+  # останется после MedianDedupedDF). Комбинации с пропусками в характеристиках
+  # не учитываются, так как пропуск не равен ни одному значению.
+  cid_counts: pd.Series = unit_type_df.drop_duplicates([*characts, "cid"]).value_counts(
+    characts
+  )
 
-  # итерация по всем возможным комбинациям характеристик.
-  for u_charact_1 in unique_charact_1:
-    v_logger.info("-", LogMode.VERBOSELY)  # noqa: PLE1205
-    v_logger.info(f"Current {charact_1}: {u_charact_1}.", LogMode.VERBOSELY)
+  # оставляем только комбинации, в которых достаточно соединений,
+  # в порядке первого появления значений каждой характеристики.
+  charact_orders: list[dict] = [
+    {value: order for order, value in enumerate(unit_type_df[charact].unique())}
+    for charact in characts
+  ]
+  combinations: list[tuple] = sorted(
+    cid_counts[cid_counts >= filtering_config["occurrence_characteristics_number"]].index,
+    key=lambda combination: [
+      charact_order[value]
+      for charact_order, value in zip(charact_orders, combination, strict=True)
+    ],
+  )
 
-    for u_charact_2 in unique_charact_2:
-      v_logger.info(f"Current {charact_2}: {u_charact_2}.", LogMode.VERBOSELY)
+  v_logger.info(
+    f"Found {len(combinations)}/{len(cid_counts)} combinations with at least "
+    f"{filtering_config['occurrence_characteristics_number']} compounds.",
+    LogMode.VERBOSELY,
+  )
 
-      # фильтрация по первой и второй характеристикам.
-      df_lvl2: pd.DataFrame = unit_type_df[
-        (unit_type_df[charact_1] == u_charact_1)
-        & (unit_type_df[charact_2] == u_charact_2)
+  # строки всех комбинаций характеристик (группировка - один раз).
+  charact_groups = unit_type_df.groupby(characts, sort=False)
+
+  # комбинации, выборки которых еще не сохранены.
+  pending_combinations: list[tuple] = []
+
+  for combination in combinations:
+    file_suffix: str = "_".join(str(value) for value in combination)
+
+    # результаты прежних запусков - по наличию файла выборки.
+    if config["skip_downloaded"] and run_state.IsCompleted(
+      "PubChem_download_toxicity/characteristics",
+      f"{unit_type}/{file_suffix}",
+      lambda: IsFileInFolder(
+        f"{toxicity_config['results_file_name']}_{file_suffix}."  # noqa: B023
+        f"{toxicity_config['storage_format']}",
+        f"{toxicity_config['results_folder_name']}/"
+        f"{filtering_config['characteristics_subfolder_name']}/{unit_type}",
+      ),
+    ):
+      v_logger.info(f"{file_suffix} is already downloaded, skip.", LogMode.VERBOSELY)
+
+      continue
+
+    pending_combinations.append(combination)
+
+  # molfile скачиваем один раз для всех CID всех выборок (одно соединение
+  # обычно входит в несколько выборок), а SDF выборок собираем из них.
+  molfiles_by_cid: dict = {}
+
+  if toxicity_config["download_compounds_sdf"] and pending_combinations:
+    # у строк без CID нет структуры, их не запрашиваем.
+    union_cids: list = list(
+      unit_type_df["cid"]
+      .iloc[
+        np.concatenate(
+          [charact_groups.indices[combination] for combination in pending_combinations]
+        )
       ]
+      .dropna()
+      .unique()
+    )
 
-      for u_charact_3 in unique_charact_3:
-        # дополнительная фильтрация по третьей характеристике.
-        df_lvl3: pd.DataFrame = df_lvl2[df_lvl2[charact_3] == u_charact_3]
-
-        for u_charact_4 in unique_charact_4:
-          # финальная фильтрация по четвёртой характеристике, если она указана.
-          df_lvl4: pd.DataFrame = (
-            df_lvl3 if charact_4 is None else df_lvl3[df_lvl3[charact_4] == u_charact_4]
-          )
-
-          if df_lvl4.empty:
-            continue
-
-          # устраняем дубликаты по CID, усредняя значения дозы.
-          df_lvl4 = MedianDedupedDF(df_lvl4, "cid", "dose")
-
-          # если таблица непустая и содержит достаточно записей — продолжаем.
-          if (
-            len(df_lvl4) >= filtering_config["occurrence_characteristics_number"]
-            and not df_lvl4.empty
-          ):
-            df_lvl4["pLD"] = -np.log10((df_lvl4["dose"] / df_lvl4["mw"]) / 1_000_000)
-
-            os.makedirs(f"{charact_folder_name}/{unit_type}", exist_ok=True)
-
-            file_suffix = f"{u_charact_1}_{u_charact_2}_{u_charact_3}"
-            if charact_4:
-              file_suffix += f"_{u_charact_4}"
-
-            filtered_file_name = (
-              f"{charact_folder_name}/{unit_type}/"
-              f"{toxicity_config['results_file_name']}_{file_suffix}"
-            )
-
-            if os.path.exists(f"{filtered_file_name}.csv") and config["skip_downloaded"]:
-              v_logger.info(
-                f"{file_suffix} is already downloaded, skip.", LogMode.VERBOSELY
-              )
-              v_logger.info("~", LogMode.VERBOSELY)  # noqa: PLE1205
-
-              continue
-
-            # сохраняем отфильтрованный DataFrame в CSV.
-            df_lvl4.to_csv(f"{filtered_file_name}.csv", index=False)
-
-            # если необходимо сохранить структуру соединений в формате SDF.
-            if toxicity_config["download_compounds_sdf"]:
-              v_logger.info(
-                f"Saving {unit_type} characteristics to .sdf...", LogMode.VERBOSELY
-              )
-
-              # получаем список CID'ов и скачиваем molfile.
-              cids: list[str] = list(df_lvl4["cid"])
-              SaveMolfilesToSDF(
-                data=pd.DataFrame({"cid": cids, "molfile": GetMolfilesFromCIDs(cids)}),
-                file_name=filtered_file_name,
-                molecule_id_column_name="cid",
-                extra_data=df_lvl4,
-                indexing_lists=True,
-              )
-
-              v_logger.success(
-                f"Saving {unit_type} characteristics to .sdf!", LogMode.VERBOSELY
-              )
-
-            # логируем успешное сохранение данных.
-            v_logger.success(
-              f"Saved {file_suffix}, len: {len(df_lvl4)}!", LogMode.VERBOSELY
-            )
-            v_logger.info("~", LogMode.VERBOSELY)  # noqa: PLE1205
+    v_logger.info(
+      f"Downloading molfiles for {len(union_cids)} unique CIDs of "
+      f"{len(pending_combinations)} combinations...",
+      LogMode.VERBOSELY,
+    )
+
+    molfiles_by_cid = dict(zip(union_cids, GetMolfilesFromCIDs(union_cids), strict=True))
+
+    v_logger.success(
+      f"Downloading molfiles for {len(union_cids)} unique CIDs!", LogMode.VERBOSELY
+    )
+
+  # выборки, которые еще записываются в процессах пула.
+  pending_futures: set[Future] = set()
+
+  for combination in pending_combinations:
+    group_df: pd.DataFrame = charact_groups.get_group(combination)
+    group_molfiles: dict = {
+      cid: molfiles_by_cid.get(cid) for cid in group_df["cid"].dropna().unique()
+    }
+    file_suffix = "_".join(str(value) for value in combination)
+
+    if executor is None:
+      SaveCharacteristicsGroup(unit_type, file_suffix, group_df, group_molfiles)
+      continue
+
+    # ограничиваем количество переданных в пул выборок (каждая - копия строк
+    # группы в очереди пула).
+    if len(pending_futures) >= 2 * filtering_config["characteristics_workers"]:
+      done_futures, pending_futures = wait(pending_futures, return_when=FIRST_COMPLETED)
+
+      # result - чтобы пробросить исключения из процессов.
+      for future in done_futures:
+        future.result()
+
+    pending_futures.add(
+      executor.submit(
+        SaveCharacteristicsGroup, unit_type, file_suffix, group_df, group_molfiles
+      )
+    )
 
   # логируем завершение процесса фильтрации.
   v_logger.success(f"Filtering by characteristics for {unit_type}!")
+
+  return list(pending_futures)
@@ -5,9 +5,16 @@ PubChem_download_toxicity/download.py
 данных PubChem и их обработку.
 """
 
+import json
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from io import StringIO
+from multiprocessing.sharedctypes import SynchronizedArray
+
 from Configurations.config import config
 from PubChem_download_toxicity.characteristics import (
   FilterDownloadedToxicityByCharacteristics,
+  InitCharacteristicsWorker,
 )
 from PubChem_download_toxicity.functions import *
 from Utils.files_funcs import (
@@ -15,11 +22,259 @@ from Utils.files_funcs import (
   DeleteFilesInFolder,
   IsFileInFolder,
   MoveFileToFolder,
+  SaveDataFrame,
   os,
 )
+from Utils.frame_journal import FrameJournal
+from Utils.run_state import run_state
 from Utils.verbose_logger import LogMode, v_logger
 
 
+def SavePageJournal(journal: FrameJournal, unit_type: str, file_name: str):
+  """
+  Собирает данные о токсичности из журнала страницы в один файл
+  (в формате `storage_format`).
+
+  Соединения упорядочиваются по SID (как ранее файлы соединений в папке
+  страницы), для повторяющихся SID учитывается первый кадр.
+
+  Args:
+      journal (FrameJournal): журнал страницы.
+      unit_type (str): тип единиц измерения ("kg" или "m3").
+      file_name (str): путь к файлу (без расширения).
+  """
+
+  # CSV-тексты соединений: имя соединения -> текст.
+  compound_csv_texts: dict[str, str] = {}
+
+  for frame in journal.frames.values():
+    compound_name = f"compound_{frame['id']}_toxicity.csv"
+
+    if unit_type in frame["parts"] and compound_name not in compound_csv_texts:
+      compound_csv_texts[compound_name] = frame["parts"][unit_type]
+
+  if not compound_csv_texts:
+    v_logger.info(f"No '{unit_type}' data in page journal, skip.", LogMode.VERBOSELY)
+    return
+
+  # кадры собираем списком и объединяем один раз (столбцы соединений могут
+  # различаться, pd.concat выравнивает их по именам).
+  combined_df = pd.concat(
+    [
+      pd.read_csv(
+        StringIO(compound_csv_texts[compound_name]),
+        sep=config["csv_separator"],
+        low_memory=False,
+      )
+      for compound_name in sorted(compound_csv_texts)
+    ],
+    ignore_index=True,
+  )
+
+  SaveDataFrame(combined_df, file_name, toxicity_config["storage_format"])
+
+
+def SavePageMeta(meta_path: str, page_meta: dict):
+  """
+  Атомарно сохраняет сведения о ходе скачивания страницы в JSON-файл.
+
+  Args:
+      meta_path (str): путь к JSON-файлу.
+      page_meta (dict): сведения о странице.
+  """
+
+  with open(f"{meta_path}.tmp", "w", encoding="utf-8") as meta_file:
+    json.dump(page_meta, meta_file, indent=2)
+
+  os.replace(f"{meta_path}.tmp", meta_path)
+
+
+def DownloadPubChemPage(page_num: int):
+  """
+  Скачивает информацию о токсичности соединений одной страницы аннотаций PubChem.
+
+  Данные соединений дописываются в журнал страницы (он же - точка
+  восстановления при перезапуске), а по завершении страницы собираются
+  в файлы `{results_file_name}_100_page_{page_num}`. Границы частей
+  страницы (25/50/75/100%) только отмечаются в JSON-файле страницы.
+
+  Args:
+      page_num (int): номер страницы.
+  """
+
+  v_logger.info(f"Downloading page_{page_num}...")
+
+  # если страница уже полностью скачана (результаты прежних запусков -
+  # по наличию файла страницы хотя бы для одного типа единиц измерения).
+  if config["skip_downloaded"] and run_state.IsCompleted(
+    "PubChem_download_toxicity",
+    f"page_{page_num}",
+    lambda: any(
+      IsFileInFolder(
+        f"{toxicity_config['results_file_name']}_100_page_{page_num}."
+        f"{toxicity_config['storage_format']}",
+        f"{toxicity_config['results_folder_name']}/{unit_type}",
+      )
+      for unit_type in ("kg", "m3")
+    ),
+  ):
+    v_logger.info(f"page_{page_num} is already downloaded, skip.")
+    return
+
+  # путь к журналу и к JSON-файлу со сведениями о странице.
+  journals_folder: str = f"{toxicity_config['results_folder_name']}/journals"
+  journal_path: str = f"{journals_folder}/page_{page_num}.journal"
+  meta_path: str = f"{journals_folder}/page_{page_num}.json"
+
+  # без пропуска скачанного начинаем страницу заново.
+  if not config["skip_downloaded"] and os.path.exists(journal_path):
+    os.remove(journal_path)
+
+  # открываем журнал страницы (записанные ранее соединения будут пропущены).
+  journal = FrameJournal(journal_path)
+
+  if journal.frames:
+    v_logger.info(
+      f"Resuming page_{page_num} from journal: {len(journal.frames)} compounds.",
+      LogMode.VERBOSELY,
+    )
+
+  # формируем ссылку для скачивания данных о соединениях.
+  compound_link: str = (
+    "https://pubchem.ncbi.nlm.nih.gov/rest/pug_view/annotations/"
+    "heading/JSON"
+    "?heading=Acute+Effects"
+    f"&page={page_num}"
+  )
+
+  # получаем данные с веб-страницы.
+  response = GetResponse(compound_link, False)
+
+  # страница не будет отмечена скачанной (скачается при перезапуске).
+  if response is None:
+    v_logger.warning(f"Could not retrieve page_{page_num}, skip.")
+    return
+
+  data = response.json()["Annotations"]
+
+  # получаем количество аннотаций на странице.
+  annotation_len = len(data["Annotation"])
+  v_logger.info(f"Amount: {annotation_len}", LogMode.VERBOSELY)
+
+  # определяем границы частей страницы.
+  quarters: dict[int, int] = {
+    annotation_len - 1: 100,
+    int(0.75 * annotation_len): 75,
+    int(0.50 * annotation_len): 50,
+    int(0.25 * annotation_len): 25,
+  }
+
+  # получаем общее количество страниц.
+  total_pages = int(data["TotalPages"])
+
+  # проверяем, что номер текущей страницы не превышает общее количество.
+  if page_num > total_pages:
+    v_logger.LogException(
+      IndexError(
+        f"Invalid page index: '{page_num}'! Should be: 1 < 'page' < {total_pages}"
+      )
+    )
+    return
+
+  # номера соединений, после которых отмечаем часть страницы.
+  segment_ends: list[int] = sorted(i for i in quarters.keys() if 0 <= i < annotation_len)
+
+  segment_start: int = 0
+
+  # пул потоков для параллельной обработки соединений страницы
+  # (при compounds_workers <= 1 соединения обрабатываются последовательно).
+  executor: ThreadPoolExecutor | None = (
+    ThreadPoolExecutor(max_workers=toxicity_config["compounds_workers"])
+    if toxicity_config["compounds_workers"] > 1
+    else None
+  )
+
+  # итерируемся по частям страницы: все соединения части скачиваются
+  # (возможно, параллельно) и записываются в журнал.
+  for segment_end in segment_ends:
+    # скачиваем данные о токсичности соединений части.
+    DownloadPageCompoundsToxicity(
+      data["Annotation"][segment_start : segment_end + 1],
+      journal,
+      first_index=segment_start,
+      executor=executor,
+    )
+
+    segment_start = segment_end + 1
+
+    # отмечаем пройденную часть страницы.
+    quarter = quarters[segment_end]
+
+    SavePageMeta(
+      meta_path,
+      {
+        "page": page_num,
+        "quarter": quarter,
+        "annotations": annotation_len,
+        "journaled": len(journal.frames),
+      },
+    )
+
+    v_logger.info(
+      f"Quarter: {quarter}%, page_{page_num}: "
+      f"{len(journal.frames)}/{annotation_len} compounds in journal."
+    )
+
+  # завершаем потоки, обрабатывавшие соединения.
+  if executor is not None:
+    executor.shutdown()
+
+  # неудачные соединения не попали в журнал (в файлы страницы они не войдут).
+  if len(journal.frames) < annotation_len:
+    v_logger.warning(
+      f"page_{page_num}: {annotation_len - len(journal.frames)} compounds failed."
+    )
+
+  v_logger.info(f"Collecting page_{page_num} from journal...", LogMode.VERBOSELY)
+
+  page_file_names: list[str] = []
+
+  for unit_type in ("kg", "m3"):
+    os.makedirs(f"{toxicity_config['results_folder_name']}/{unit_type}", exist_ok=True)
+
+    page_file_name: str = (
+      f"{toxicity_config['results_folder_name']}/{unit_type}/"
+      f"{toxicity_config['results_file_name']}_100_page_{page_num}"
+    )
+
+    SavePageJournal(journal, unit_type, page_file_name)
+    page_file_names.append(f"{page_file_name}.{toxicity_config['storage_format']}")
+
+  # отмечаем страницу скачанной (только после полной записи файлов).
+  run_state.MarkCompleted(
+    "PubChem_download_toxicity", f"page_{page_num}", page_file_names
+  )
+
+  v_logger.success(f"Collecting page_{page_num} from journal!", LogMode.VERBOSELY)
+
+
+def InitPageWorker(limiter_state: SynchronizedArray):
+  """
+  Подготавливает процесс пула, скачивающий страницы: подключает общий для всех
+  процессов бюджет запросов к PubChem.
+
+  Args:
+      limiter_state (SynchronizedArray): разделяемое состояние `pubchem_limiter`.
+  """
+
+  pubchem_limiter.AttachState(limiter_state)
+
+  # соединения пула, унаследованные от родительского процесса, не используем.
+  http_session.close()
+
+  v_logger.UpdateFormat(toxicity_config["logger_label"], toxicity_config["logger_color"])
+
+
 @ReTry(attempts_amount=1)
 def DownloadPubChemCompoundsToxicity():
   """
@@ -31,6 +286,8 @@ def DownloadPubChemCompoundsToxicity():
   results_folder_kg: str = f"{toxicity_config['results_folder_name']}/kg"
   # путь к папке для результатов в единицах "m3".
   results_folder_m3: str = f"{toxicity_config['results_folder_name']}/m3"
+  # формат файлов с результатами ("csv" или "parquet").
+  storage_format: str = toxicity_config["storage_format"]
 
   # если установлен флаг тестирования, ограничиваем диапазон страниц.
   if config["testing_flag"]:
@@ -41,223 +298,73 @@ def DownloadPubChemCompoundsToxicity():
 
   v_logger.info(f"{'• ' * 10} PubChem downloading for DrugDesign.")
 
-  # если файлы не скачаны или их нет в папке.
-  if (
-    not config["skip_downloaded"]
-    or not IsFileInFolder(
-      f"{toxicity_config['combined_file_name']}_m3.csv",
-      toxicity_config["results_folder_name"],
-    )
-    or not IsFileInFolder(
-      f"{toxicity_config['combined_file_name']}_kg.csv",
-      toxicity_config["results_folder_name"],
-    )
-  ):
-    # итерируемся по страницам (включая последнюю).
-    for page_num in range(toxicity_config["start_page"], toxicity_config["end_page"] + 1):
-      v_logger.info(f"Downloading page_{page_num}...")
-
-      # формируем имя папки для текущей страницы.
-      page_folder_name = (
-        f"{toxicity_config['results_folder_name']}/{{unit_type}}/page_{{page_num}}"
-      )
-
-      # если существуют папки для следующих страниц, значит, эти полностью загружены.
-      if config["skip_downloaded"] and (
-        os.path.exists(page_folder_name.format(unit_type="kg", page_num=page_num + 1))
-        or os.path.exists(page_folder_name.format(unit_type="m3", page_num=page_num + 1))
-      ):
-        v_logger.info(f"Folder for page_{page_num} is already exists, skip.")
-        continue
-
-      # если существуют на 100% завершенные файлы страниц.
-      if config["skip_downloaded"]:
-        full_quarter_file_name: str = (
-          f"{toxicity_config['results_file_name']}_100_page_{page_num}"
-        )
-
-        full_quarter_path = (
-          f"{toxicity_config['results_folder_name']}/"
-          "{unit_type}/"
-          f"{full_quarter_file_name}.csv"
-        )
-
-        if os.path.exists(full_quarter_path.format(unit_type="kg")) or os.path.exists(
-          full_quarter_path.format(unit_type="m3")
-        ):
-          v_logger.info(f"100 quarter file for page_{page_num} is already exists, skip.")
-          continue
-
-      # создаем директории для единиц измерения "kg" и "m3".
-      os.makedirs(
-        page_folder_name.format(unit_type="kg", page_num=page_num), exist_ok=True
-      )
-      os.makedirs(
-        page_folder_name.format(unit_type="m3", page_num=page_num), exist_ok=True
-      )
-
-      # формируем ссылку для скачивания данных о соединениях.
-      compound_link: str = (
-        "https://pubchem.ncbi.nlm.nih.gov/rest/pug_view/annotations/"
-        "heading/JSON"
-        "?heading=Acute+Effects"
-        f"&page={page_num}"
+  # если не нужно пропускать скачанные или данные еще не объединены
+  # (результаты прежних запусков - по наличию объединенных файлов).
+  if not config["skip_downloaded"] or not run_state.IsCompleted(
+    "PubChem_download_toxicity",
+    "combined",
+    lambda: all(
+      IsFileInFolder(
+        f"{toxicity_config['combined_file_name']}_{unit_type}.{storage_format}",
+        toxicity_config["results_folder_name"],
       )
+      for unit_type in ("kg", "m3")
+    ),
+  ):
+    pages = range(toxicity_config["start_page"], toxicity_config["end_page"] + 1)
 
-      # получаем данные с веб-страницы.
-      data = GetResponse(compound_link, False, toxicity_config["sleep_time"]).json()[
-        "Annotations"
-      ]
-
-      # получаем количество аннотаций на странице.
-      annotation_len = len(data["Annotation"])
-      v_logger.info(f"Amount: {annotation_len}", LogMode.VERBOSELY)
-
-      # определяем границы для объединения файлов по частям.
-      quarters: dict[int, int] = {
-        annotation_len - 1: 100,
-        int(0.75 * annotation_len): 75,
-        int(0.50 * annotation_len): 50,
-        int(0.25 * annotation_len): 25,
-      }
-
-      # получаем общее количество страниц.
-      total_pages = int(data["TotalPages"])
-
-      # проверяем, что номер текущей страницы не превышает общее количество.
-      if page_num > total_pages:
-        v_logger.LogException(
-          IndexError(
-            f"Invalid page index: '{page_num}'! Should be: 1 < 'page' < {total_pages}"
-          )
-        )
-        continue
-
-      # итерируемся по данным о соединениях.
-      for i, compound_data in enumerate(data["Annotation"]):
-        # фиксируем время начала обработки.
-        start_time = time.time()
-
-        # скачиваем данные о токсичности соединения.
-        DownloadCompoundToxicity(
-          compound_data,
-          f"{toxicity_config['results_folder_name']}/{{unit_type}}/page_{page_num}",
-        )
-
-        # фиксируем время окончания обработки.
-        end_time = time.time()
-
-        # если включен флаг тестирования, выводим время обработки.
-        if config["testing_flag"]:
-          v_logger.info(
-            f"Prev compound: {i}, time: {(end_time - start_time):.3f} sec.",
-            LogMode.VERBOSELY,
-          )
-
-        # если достигнута граница для объединения файлов.
-        if i in quarters.keys() and toxicity_config["need_combining"]:
-          # получаем номер текущей границы.
-          quarter = quarters[i]
-
-          v_logger.info(
-            f"Quarter: {quarter}%, combining files in page_{page_num} folder..."
-          )
-
-          # объединяем CSV-файлы для единиц измерения "kg".
-          CombineCSVInFolder(
-            page_folder_name.format(unit_type="kg", page_num=page_num),
-            f"{toxicity_config['results_file_name']}_{quarters[i]}_page_{page_num}",
-          )
-
-          # объединяем CSV-файлы для единиц измерения "m3".
-          CombineCSVInFolder(
-            page_folder_name.format(unit_type="m3", page_num=page_num),
-            f"{toxicity_config['results_file_name']}_{quarters[i]}_page_{page_num}",
-          )
-
-          v_logger.success(
-            f"Quarter: {quarter}%, combining files in page_{page_num} folder!"
-          )
-
-          # перемещаем объединенные файлы.
-          v_logger.info(
-            f"Moving {toxicity_config['results_file_name']}_"
-            f"{quarters[i]}_page_{page_num}.csv to "
-            f"{toxicity_config['results_folder_name']}...",
-            LogMode.VERBOSELY,
-          )
-
-          # формируем имя файла для перемещения.
-          quarter_file_name = (
-            f"{toxicity_config['results_file_name']}_{quarters[i]}_page_{page_num}.csv"
-          )
-
-          # перемещаем файл для единиц измерения "kg".
-          MoveFileToFolder(
-            quarter_file_name,
-            page_folder_name.format(unit_type="kg", page_num=page_num),
-            results_folder_kg,
-          )
-
-          # перемещаем файл для единиц измерения "m3".
-          MoveFileToFolder(
-            quarter_file_name,
-            page_folder_name.format(unit_type="m3", page_num=page_num),
-            results_folder_m3,
-          )
-
-          v_logger.success(
-            f"Moving {quarter_file_name} to {toxicity_config['results_folder_name']}!",
-            LogMode.VERBOSELY,
-          )
-
-          # удаляем предыдущий объединенный файл.
-          prev_quarter = quarter - 25
-
-          # если предыдущая часть не равна нулю.
-          if prev_quarter != 0:
-            # формируем имя предыдущего файла.
-            old_quarter_file_name: str = (
-              f"{toxicity_config['results_file_name']}_{prev_quarter}_page_{page_num}"
-            )
-
-            v_logger.info("Deleting old quarter file...", LogMode.VERBOSELY)
-
-            # удаляем старый файл для единиц измерения "kg".
-            if os.path.exists(
-              os.path.join(results_folder_kg, f"{old_quarter_file_name}.csv")
-            ):
-              os.remove(os.path.join(results_folder_kg, f"{old_quarter_file_name}.csv"))
-
-            # удаляем старый файл для единиц измерения "m3".
-            if os.path.exists(
-              os.path.join(results_folder_m3, f"{old_quarter_file_name}.csv")
-            ):
-              os.remove(os.path.join(results_folder_m3, f"{old_quarter_file_name}.csv"))
-
-            v_logger.success("Deleting old quarter file!", LogMode.VERBOSELY)
+    # итерируемся по страницам (включая последнюю).
+    if toxicity_config["pages_workers"] <= 1:
+      for page_num in pages:
+        DownloadPubChemPage(page_num)
+
+    # страницы раздаются процессам по одной: освободившийся процесс забирает
+    # следующую страницу, поэтому разный размер страниц не простаивает процессы.
+    else:
+      with ProcessPoolExecutor(
+        max_workers=toxicity_config["pages_workers"],
+        initializer=InitPageWorker,
+        initargs=(pubchem_limiter.ShareState(),),
+      ) as page_executor:
+        # list - чтобы пробросить исключения из процессов.
+        list(page_executor.map(DownloadPubChemPage, pages))
 
     if toxicity_config["need_combining"]:
-      # объединяем все CSV-файлы в папке для единиц измерения "kg".
-      CombineCSVInFolder(results_folder_kg, f"{toxicity_config['combined_file_name']}_kg")
+      # объединяем все файлы в папке для единиц измерения "kg".
+      CombineCSVInFolder(
+        results_folder_kg, f"{toxicity_config['combined_file_name']}_kg", storage_format
+      )
 
       # перемещаем объединенный файл в основную папку.
       MoveFileToFolder(
-        f"{toxicity_config['combined_file_name']}_kg.csv",
+        f"{toxicity_config['combined_file_name']}_kg.{storage_format}",
         results_folder_kg,
         toxicity_config["results_folder_name"],
       )
 
-      # объединяем все CSV-файлы в папке для единиц измерения "m3".
-      CombineCSVInFolder(results_folder_m3, f"{toxicity_config['combined_file_name']}_m3")
+      # объединяем все файлы в папке для единиц измерения "m3".
+      CombineCSVInFolder(
+        results_folder_m3, f"{toxicity_config['combined_file_name']}_m3", storage_format
+      )
 
       # перемещаем объединенный файл в основную папку.
       MoveFileToFolder(
-        f"{toxicity_config['combined_file_name']}_m3.csv",
+        f"{toxicity_config['combined_file_name']}_m3.{storage_format}",
         results_folder_m3,
         toxicity_config["results_folder_name"],
       )
 
+      # отмечаем объединенные файлы записанными.
+      run_state.MarkCompleted(
+        "PubChem_download_toxicity",
+        "combined",
+        [
+          f"{toxicity_config['results_folder_name']}/"
+          f"{toxicity_config['combined_file_name']}_{unit_type}.{storage_format}"
+          for unit_type in ("kg", "m3")
+        ],
+      )
+
     # если включено удаление файлов после объединения и объединение включено.
     if toxicity_config["delete_after_combining"] and toxicity_config["need_combining"]:
       v_logger.info(
@@ -268,8 +375,8 @@ def DownloadPubChemCompoundsToxicity():
 
       # определяем файлы, которые не нужно удалять.
       except_items: list[str] = [
-        f"{toxicity_config['combined_file_name']}_kg.csv",
-        f"{toxicity_config['combined_file_name']}_m3.csv",
+        f"{toxicity_config['combined_file_name']}_kg.{storage_format}",
+        f"{toxicity_config['combined_file_name']}_m3.{storage_format}",
       ]
       # получаем имя папки с molfile.
       molfiles_folder_name: str = toxicity_config["molfiles_folder_name"]
@@ -299,18 +406,50 @@ def DownloadPubChemCompoundsToxicity():
       LogMode.VERBOSELY,
     )
 
+  if properties_cache is not None:
+    v_logger.info(
+      f"Properties cache: {properties_cache.hits} hits, "
+      f"{properties_cache.misses} misses.",
+      LogMode.VERBOSELY,
+    )
+
   if filtering_config["need_filtering_by_characteristics"]:
     v_logger.info("·", LogMode.VERBOSELY)
 
-    FilterDownloadedToxicityByCharacteristics(
-      "m3", "organism", "route", "time_period", "testtype"
-    )
+    # выборки "m3" и "kg" сохраняются в общем пуле процессов: пока процессы
+    # записывают выборки "m3", основной процесс уже готовит выборки "kg"
+    # (при characteristics_workers <= 1 - последовательно в основном процессе).
+    with (
+      ProcessPoolExecutor(
+        max_workers=filtering_config["characteristics_workers"],
+        initializer=InitCharacteristicsWorker,
+      )
+      if filtering_config["characteristics_workers"] > 1
+      else nullcontext()
+    ) as characteristics_executor:
+      characteristics_futures = FilterDownloadedToxicityByCharacteristics(
+        "m3",
+        "organism",
+        "route",
+        "time_period",
+        "testtype",
+        executor=characteristics_executor,
+      )
 
-    v_logger.info()
+      v_logger.info()
 
-    FilterDownloadedToxicityByCharacteristics(
-      "kg", "organism", "route", "time_period", "testtype"
-    )
+      characteristics_futures += FilterDownloadedToxicityByCharacteristics(
+        "kg",
+        "organism",
+        "route",
+        "time_period",
+        "testtype",
+        executor=characteristics_executor,
+      )
+
+      # result - чтобы пробросить исключения из процессов.
+      for future in characteristics_futures:
+        future.result()
 
   v_logger.success(f"{'• ' * 10} PubChem downloading for DrugDesign!")
   v_logger.info()
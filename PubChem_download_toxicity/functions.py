@@ -5,17 +5,27 @@ PubChem_download_toxicity/functions.py
 из PubChem, их фильтрации, преобразования и сохранения в CSV и SDF файлы.
 """
 
+import io
 import json
+import time
 import urllib.parse
-from io import StringIO
+import zlib
+from collections.abc import Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
 
 import numpy as np
 import requests
 
 from Configurations.config import Config, config
 from Utils.dataframe_funcs import DedupedList
-from Utils.decorators import ReTry, time
+from Utils.decorators import ReTry
 from Utils.files_funcs import SaveMolfilesToSDF, os, pd
+from Utils.frame_journal import FrameJournal
+from Utils.http_session import MountRateLimiter, http_session, session_config
+from Utils.molfile_store import molfile_store
+from Utils.rate_limiter import TokenBucket
+from Utils.sqlite_cache import SQLiteCache
 from Utils.verbose_logger import LogMode, v_logger
 
 
@@ -25,87 +35,511 @@ toxicity_config: Config = config["PubChem_download_toxicity"]
 # конфигурация конфигурацию для фильтрации токсичности.
 filtering_config: Config = toxicity_config["filtering"]
 
+# MEANS: общий ограничитель частоты запросов к PubChem (через все функции модуля).
+pubchem_limiter = TokenBucket.FromConfig(toxicity_config["rate_limit"])
+
+# все запросы к PubChem через общую сессию проходят через ограничитель.
+MountRateLimiter(http_session, "https://pubchem.ncbi.nlm.nih.gov/", pubchem_limiter)
+
+# конфигурация кэша ответов PubChem.
+http_cache_config: Config = toxicity_config["http_cache"]
+
+# MEANS: персистентный кэш ответов PubChem (тела ответов на GET/POST-запросы).
+http_cache: SQLiteCache | None = (
+  SQLiteCache.FromConfig(http_cache_config)
+  if http_cache_config["mode"] != "off"
+  else None
+)
+
+# свойства соединений, которые запрашиваются (и кэшируются) вместе.
+compound_properties: list[str] = ["MolecularWeight", "MolecularFormula", "InChIKey"]
+
+# MEANS: персистентный кэш свойств соединений (CID -> свойства).
+properties_cache: SQLiteCache | None = (
+  SQLiteCache.FromConfig(toxicity_config["properties_cache"])
+  if toxicity_config["properties_cache"]["enabled"]
+  else None
+)
+
+
+def AdjustRateByThrottling(response: requests.Response):
+  """
+  Подстраивает частоту запросов под состояние сервера PubChem.
+
+  PubChem сообщает о своей загрузке в заголовке `X-Throttling-Control`, например:
+  "Request Count status: Green (0%), Request Time status: Yellow (60%), ...".
+  При желтом/красном/черном статусе частота снижается, при зеленом - постепенно
+  восстанавливается. Ответ 503 (сервер перегружен) также снижает частоту.
+
+  Args:
+      response (requests.Response): объект ответа requests.
+  """
+
+  # во сколько раз снижать частоту для каждого статуса.
+  throttle_factors: dict[str, float] = {"Yellow": 0.75, "Red": 0.5, "Black": 0.25}
+
+  # сервер перегружен - замедляемся сильнее всего.
+  if response.status_code == 503:  # noqa: PLR2004
+    v_logger.warning("PubChem is busy (503), slowing down requests.", LogMode.VERBOSELY)
+    pubchem_limiter.Throttle(throttle_factors["Black"])
+    return
+
+  throttling_control: str | None = response.headers.get("X-Throttling-Control")
+
+  # заголовок есть не во всех ответах (например, его нет у SDQ).
+  if throttling_control is None:
+    return
+
+  # находим самый "тяжелый" из статусов в заголовке.
+  factor: float = min(
+    (
+      throttle_factors[status]
+      for status in throttle_factors
+      if f"status: {status}" in throttling_control
+    ),
+    default=1.0,
+  )
+
+  if factor < 1.0:
+    v_logger.warning(
+      f"PubChem throttling: {throttling_control}, slowing down requests.",
+      LogMode.VERBOSELY,
+    )
+    pubchem_limiter.Throttle(factor)
+
+  else:
+    pubchem_limiter.Recover()
+
+
+class CachingStream(io.RawIOBase):
+  """
+  Поток тела ответа, который по мере чтения сжимает прочитанные байты и,
+  дочитав тело до конца, передает их в `on_complete` (например, для сохранения
+  в кэш ответов). Так ответ можно разбирать потоком, не собирая его целиком
+  в памяти: в памяти копится только сжатое тело.
+  """
+
+  raw: io.IOBase
+  decode_content: bool
+  on_complete: Callable[[bytes], None]
+  compressor: "zlib._Compress | None"
+  compressed_parts: list[bytes]
+
+  def __init__(self, raw: io.IOBase, prefix: bytes, on_complete: Callable[[bytes], None]):
+    """
+    Инициализирует класс CachingStream.
+
+    Args:
+        raw (io.IOBase): исходный поток тела ответа.
+        prefix (bytes): байты, которые записываются перед телом ответа.
+        on_complete (Callable[[bytes], None]): функция, получающая сжатые zlib
+                                               `prefix` и тело ответа.
+    """
+
+    super().__init__()
+
+    self.raw = raw
+    self.decode_content = True
+    self.on_complete = on_complete
+    self.compressor = zlib.compressobj()
+    self.compressed_parts: list[bytes] = [self.compressor.compress(prefix)]
+
+  def readable(self) -> bool:
+    """Поток доступен для чтения."""
+
+    return True
+
+  def readinto(self, buffer: memoryview) -> int:
+    """
+    Читает очередную часть тела ответа в буфер.
+
+    Args:
+        buffer (memoryview): буфер для прочитанных байтов.
+
+    Returns:
+        int: количество прочитанных байтов (0 - тело прочитано до конца).
+    """
+
+    data: bytes = self.raw.read(len(buffer))
+
+    if data:
+      buffer[: len(data)] = data
+      self.compressed_parts.append(self.compressor.compress(data))
+
+    # тело дочитано до конца (сохраняем один раз).
+    elif self.compressor is not None:
+      self.compressed_parts.append(self.compressor.flush())
+      self.compressor = None
+
+      self.on_complete(b"".join(self.compressed_parts))
+      self.compressed_parts = []
+
+    return len(data)
+
 
 @ReTry()
-def GetResponse(
-  request_url: str, stream: bool, sleep_time: float | None = toxicity_config["sleep_time"]
+def DownloadResponse(
+  request_url: str, stream: bool, data: dict[str, str] | None = None
 ) -> requests.Response:
   """
-  Отправляет GET-запрос по указанному URL, повторяет попытку в случае ошибки.
+  Отправляет GET-запрос (или POST-запрос, если передано тело `data`)
+  по указанному URL, повторяет попытку в случае ошибки.
+
+  Запрос отправляется через общую сессию `http_session`, поэтому соединения
+  к PubChem переиспользуются между запросами (keep-alive), а частота запросов
+  ограничивается `pubchem_limiter` (ожидание - только при исчерпанном бюджете).
 
   Args:
       request_url (str): URL для запроса.
       stream (bool): если True, ответ будет получен потоком.
-      sleep_time (float | None, optional): время ожидания перед повторной попыткой
-      в секундах. Defaults to toxicity_config["sleep_time"].
+      data (dict[str, str] | None, optional): тело POST-запроса (form-encoded).
+                                              Defaults to None (GET-запрос).
 
   Returns:
       requests.Response: объект ответа requests.
   """
 
-  # ждем указанное время, если оно задано.
-  if sleep_time is not None:
-    time.sleep(sleep_time)
+  # отправляем запрос через пул соединений.
+  response = (
+    http_session.get(request_url, stream=stream, timeout=session_config["timeout"])
+    if data is None
+    else http_session.post(
+      request_url, data=data, stream=stream, timeout=session_config["timeout"]
+    )
+  )
+
+  # подстраиваем частоту запросов под загрузку PubChem.
+  AdjustRateByThrottling(response)
 
-  # отправляем GET-запрос.
-  response = requests.get(request_url, stream=stream)
   response.raise_for_status()
 
   return response
 
 
-def GetMolfileFromCID(
-  cid: str, sleep_time: float | None = toxicity_config["sleep_time"]
-) -> str:
+def GetResponse(
+  request_url: str, stream: bool, data: dict[str, str] | None = None
+) -> requests.Response | None:
+  """
+  Возвращает ответ на запрос к PubChem (см. DownloadResponse), используя
+  кэш ответов `http_cache` в соответствии с `http_cache_config["mode"]`:
+      - "off": кэш не используется.
+      - "read-write": ответ берется из кэша, а скачанный ответ сохраняется в него.
+      - "replay-only": ответ берется только из кэша (запросы не отправляются).
+      - "refresh": ответ всегда скачивается заново и сохраняется в кэш.
+
+  Ответ, полученный потоком (`stream=True`), не читается заранее целиком:
+  он сохраняется в кэш, когда вызывающая функция дочитает его до конца.
+
+  Args:
+      request_url (str): URL для запроса.
+      stream (bool): если True, ответ будет получен потоком.
+      data (dict[str, str] | None, optional): тело POST-запроса (form-encoded).
+                                              Defaults to None (GET-запрос).
+
+  Returns:
+      requests.Response | None: объект ответа requests
+                                (None, если получить ответ не удалось).
+  """
+
+  mode: str = http_cache_config["mode"]
+
+  if http_cache is None:
+    return DownloadResponse(request_url, stream, data)
+
+  # ключ кэша: метод, URL и тело запроса.
+  cache_key: str = (
+    f"GET {request_url}"
+    if data is None
+    else f"POST {request_url}\n{urllib.parse.urlencode(sorted(data.items()))}"
+  )
+
+  if mode in {"read-write", "replay-only"}:
+    cached_value: bytes | None = http_cache.Get(cache_key)
+
+    if cached_value is not None:
+      # ответ хранится как "{метаданные в JSON}\n{тело ответа}".
+      meta, content = cached_value.split(b"\n", 1)
+
+      cached_response = requests.Response()
+      cached_response.status_code = 200
+      cached_response.url = request_url
+      cached_response.encoding = json.loads(meta)["encoding"]
+      cached_response._content = content
+      cached_response._content_consumed = True  # type: ignore
+
+      return cached_response
+
+    if mode == "replay-only":
+      v_logger.warning(f"No cached response for {cache_key}, skip (replay-only).")
+      return None
+
+  response = DownloadResponse(request_url, stream, data)
+
+  if response is None:
+    return None
+
+  meta: bytes = json.dumps({"encoding": response.encoding}).encode() + b"\n"
+
+  # тело потокового ответа сохраняем в кэш по мере его чтения.
+  if stream:
+    response.raw.decode_content = True
+    response.raw = CachingStream(
+      response.raw,
+      meta,
+      lambda compressed_value: http_cache.Set(cache_key, compressed_value, True),
+    )
+
+  else:
+    http_cache.Set(cache_key, meta + response.content)
+
+  return response
+
+
+def NormalizedCID(cid: str | int | float) -> str:
+  """
+  Приводит CID к строке вида "2244" (CID из CSV могут прочитаться как 2244.0).
+
+  Args:
+      cid (str | int | float): CID соединения.
+
+  Returns:
+      str: CID соединения в виде строки.
+  """
+
+  try:
+    return str(int(float(cid)))
+
+  except (TypeError, ValueError):
+    return str(cid).strip()
+
+
+def GetPropertiesByCIDs(cids: list[str | int]) -> dict[str, dict[str, str]]:
+  """
+  Возвращает свойства соединений (`compound_properties`: молекулярный вес,
+  брутто-формула, InChIKey), запрашивая их у PubChem пачками.
+
+  Сначала свойства ищутся в персистентном кэше `properties_cache`, поэтому при
+  повторных запусках PubChem запрашиваются только новые CID. PUG-REST принимает
+  список CID в теле POST-запроса, поэтому на `molecular_weight_batch_size`
+  соединений приходится один запрос вместо одного запроса на каждое соединение.
+
+  Args:
+      cids (list[str | int]): список CID соединений.
+
+  Returns:
+      dict[str, dict[str, str]]: словарь CID -> {свойство: значение}.
+                                 CID, для которых свойства получить не удалось,
+                                 отсутствуют.
+  """
+
+  # CID - целые положительные числа (пропуски и прочие значения не запрашиваем).
+  # порядок фиксируем, чтобы тела запросов (и ключи кэша ответов) не зависели
+  # от порядка обхода множества.
+  unique_cids: list[str] = sorted(
+    DedupedList([NormalizedCID(cid) for cid in cids if NormalizedCID(cid).isdigit()]),
+    key=int,
+  )
+
+  properties: dict[str, dict[str, str]] = {}
+
+  # берем из кэша все, что уже было скачано ранее.
+  if properties_cache is not None:
+    for cid, value in properties_cache.GetMany(unique_cids).items():
+      properties[cid] = json.loads(value)
+
+  missing_cids: list[str] = [cid for cid in unique_cids if cid not in properties]
+  batch_size: int = toxicity_config["molecular_weight_batch_size"]
+
+  for i in range(0, len(missing_cids), batch_size):
+    cids_batch = missing_cids[i : i + batch_size]
+
+    response = GetResponse(
+      "https://pubchem.ncbi.nlm.nih.gov/rest/pug/compound/cid/"
+      f"property/{','.join(compound_properties)}/JSON",
+      False,
+      data={"cid": ",".join(cids_batch)},
+    )
+
+    # если запрос не удался, эти CID будут запрошены снова при следующем вызове.
+    if response is None:
+      v_logger.warning(f"Could not retrieve properties for {len(cids_batch)} cids.")
+      continue
+
+    downloaded: dict[str, dict[str, str]] = {
+      str(prop["CID"]): {
+        name: str(prop[name]) for name in compound_properties if name in prop
+      }
+      for prop in response.json()["PropertyTable"]["Properties"]
+    }
+
+    properties.update(downloaded)
+
+    if properties_cache is not None:
+      properties_cache.SetMany(
+        {cid: json.dumps(prop).encode() for cid, prop in downloaded.items()}
+      )
+
+  v_logger.info(
+    f"Found properties for {len(properties)}/{len(unique_cids)} cids "
+    f"({len(unique_cids) - len(missing_cids)} from cache).",
+    LogMode.VERBOSELY,
+  )
+
+  return properties
+
+
+def GetMolecularWeightsByCIDs(cids: list[str | int]) -> dict[str, str]:
+  """
+  Возвращает молекулярные веса соединений (см. GetPropertiesByCIDs).
+
+  Args:
+      cids (list[str | int]): список CID соединений.
+
+  Returns:
+      dict[str, str]: словарь CID -> молекулярный вес (в виде строки).
+                      CID, для которых вес получить не удалось, отсутствуют.
+  """
+
+  return {
+    cid: prop["MolecularWeight"]
+    for cid, prop in GetPropertiesByCIDs(cids).items()
+    if "MolecularWeight" in prop
+  }
+
+
+def GetMolfileFromCID(cid: str) -> str | None:
   """
-  Возвращает molfile-строку из GET-запроса для соединения с cid из базы PubChem.
+  Возвращает molfile-строку для соединения с cid: из хранилища `molfile_store`,
+  а если его там нет - из GET-запроса к базе PubChem (с сохранением в хранилище).
 
   Args:
       cid (str): CID соединения.
-      sleep_time (float | None, optional): время ожидания перед повторной попыткой
-      в секундах. Defaults to toxicity_config["sleep_time"].
 
   Returns:
-      str: molfile-строка.
+      str | None: molfile-строка (None, если получить ее не удалось).
   """
 
+  store_key: str = f"cid:{NormalizedCID(cid)}"
+
+  # если структура уже скачивалась, повторно не запрашиваем.
+  if molfile_store is not None:
+    stored_molfile: str | None = molfile_store.Get(store_key)
+
+    if stored_molfile is not None:
+      v_logger.info(f"Return stored molfile for cid: {cid}.", LogMode.VERBOSELY)
+      return stored_molfile
+
   # получаем molfile соединения из PubChem.
-  molfile: str = GetResponse(
+  response = GetResponse(
     "https://pubchem.ncbi.nlm.nih.gov/rest/pug/compound/CID/"
     f"{cid}/record/SDF?record_type=2d",
     True,
-    sleep_time,
-  ).text
+  )
+
+  if response is None:
+    v_logger.warning(f"Could not retrieve molfile for cid: {cid}.")
+    return None
+
+  molfile: str = response.text
 
   v_logger.info(
     f"Return molfile (len: {len(molfile)}) for cid: {cid}.", LogMode.VERBOSELY
   )
 
   # очищаем molfile от лишних символов.
-  return molfile[molfile.find("\n") :].replace("$$$$", "").rstrip()
+  molfile = molfile[molfile.find("\n") :].replace("$$$$", "").rstrip()
+
+  if molfile_store is not None:
+    molfile_store.Set(store_key, molfile)
+
+  return molfile
 
 
-def GetDataFrameFromUrl(request_url: str, sleep_time: float) -> pd.DataFrame:
+def GetDataFrameChunksFromUrl(
+  request_url: str, chunk_rows: int
+) -> Iterator[pd.DataFrame] | None:
   """
-  Скачивает данные из CSV-файла по URL и преобразует их в pandas.DataFrame.
+  Скачивает CSV-файл по URL и читает его частями по мере получения ответа:
+  байты ответа передаются парсеру напрямую, без предварительного
+  декодирования всего ответа в строку.
 
   Args:
       request_url (str): URL CSV-файла.
-      sleep_time (float): время ожидания перед повторной попыткой в секундах.
+      chunk_rows (int): количество строк в одной части.
 
   Returns:
-      pd.DataFrame: DataFrame, содержащий данные из CSV-файла.
+      Iterator[pd.DataFrame] | None: итератор по частям данных CSV-файла
+                                     (пустой, если ответ пустой; None, если
+                                     получить ответ не удалось).
   """
 
   # получаем ответ на запрос.
-  res = GetResponse(request_url, True, sleep_time)
+  res = GetResponse(request_url, True)
+
+  if res is None:
+    return None
 
   # определяем кодировку из заголовков ответа.
   if res.encoding is None:
     res.encoding = "utf-8"  # (UTF-8, если кодировка не указана)
 
-  # читаем CSV из ответа и преобразуем в DataFrame.
-  return pd.read_csv(StringIO(res.content.decode(res.encoding)))
+  # ответ из кэша уже прочитан целиком, иначе читаем его из потока
+  # (с распаковкой gzip/deflate, если сервер сжал ответ).
+  if res._content_consumed:
+    body = BytesIO(res.content)
+
+  else:
+    body = res.raw
+    body.decode_content = True
+
+  try:
+    # читатель закрывает поток, когда части заканчиваются.
+    return pd.read_csv(body, encoding=res.encoding, chunksize=chunk_rows)
+
+  # в ответе нет даже заголовка.
+  except pd.errors.EmptyDataError:
+    return iter(())
+
+
+def GetDataFrameFromUrl(
+  request_url: str,
+  chunk_filter: Callable[[pd.DataFrame], pd.DataFrame] | None = None,
+) -> pd.DataFrame | None:
+  """
+  Скачивает данные из CSV-файла по URL и преобразует их в pandas.DataFrame.
+
+  Файл читается частями (см. GetDataFrameChunksFromUrl), поэтому, если передан
+  chunk_filter, ненужные строки отбрасываются до того, как будет собран весь
+  DataFrame.
+
+  Args:
+      request_url (str): URL CSV-файла.
+      chunk_filter (Callable[[pd.DataFrame], pd.DataFrame] | None, optional):
+                   функция, отбирающая нужные строки каждой части.
+                   Defaults to None (все строки).
+
+  Returns:
+      pd.DataFrame | None: DataFrame, содержащий данные из CSV-файла (пустой,
+                           если данных нет; None, если получить ответ
+                           не удалось).
+  """
+
+  reader = GetDataFrameChunksFromUrl(request_url, toxicity_config["sdq_chunk_rows"])
+
+  if reader is None:
+    return None
+
+  chunks: list[pd.DataFrame] = [
+    chunk if chunk_filter is None else chunk_filter(chunk) for chunk in reader
+  ]
+
+  # ответ без единой части (пустой файл): pd.concat не принимает пустой список.
+  # если в ответе есть заголовок, парсер возвращает пустую часть с его
+  # колонками, так что колонки теряются, только когда их и не было.
+  if not chunks:
+    return pd.DataFrame()
+
+  return pd.concat(chunks, ignore_index=True)
 
 
 def GetLinkFromSid(sid: int, collection: str, limit: int) -> str:
@@ -158,17 +592,166 @@ def GetLinkFromSid(sid: int, collection: str, limit: int) -> str:
 # MARK: DownloadCompoundToxicity
 
 
+# коэффициенты перевода единиц измерения дозы к "mg/kg" и "mg/m3"
+# (ppm, ppb и pph зависят от молекулярной массы и вычисляются в ExtractDoseAndTime).
+dose_unit_conversions: dict[str, float] = {
+  "mg": 1,
+  "gm": 1000,
+  "g": 1000,
+  "ng": 0.000001,
+  "ug": 0.001,
+  "ml": 1000,
+  "nl": 0.001,  # 1000 * 0.000001
+  "ul": 1,  # 1000 * 0.001
+}
+
+
+def ExtractDoseAndTime(df: pd.DataFrame, valid_units: list[str]) -> pd.DataFrame:
+  """
+  Преобразует DataFrame с данными о дозировках, извлекая числовое
+  значение, единицу измерения и период времени.
+
+  Строка дозировки имеет вид "<количество> <единица>[/<период>]", например,
+  "2.5 mg/kg", "10 mg/kg/7D" или "300 ppm/2H". Разбор выполняется сразу для всего
+  столбца (регулярными выражениями и таблицей коэффициентов), а известные
+  единицы переводятся к "mg/kg" и "mg/m3".
+
+  Args:
+      df (pd.DataFrame): таблица с колонкой "dose", содержащей
+                          информацию о дозировках, и колонкой "mw".
+      valid_units (list[str]): список допустимых единиц измерения дозы.
+
+  Returns:
+      DataFrame с тремя новыми колонками: "numeric_dose", "dose_value",
+      "time_period".
+  """
+
+  df = df.copy()
+
+  # нестроковые значения (например, пропуски) не разбираются.
+  doses = df["dose"].astype(object).where(df["dose"].map(type).eq(str))
+
+  # строка дозировки должна состоять ровно из двух частей, разделенных пробелом.
+  parts = doses.str.extract(r"(?s)^(?P<amount>[^ ]*) (?P<dose_and_time>[^ ]*)\Z")
+
+  def ParsedAmount(amount_str: str) -> float | None:
+    """
+    Преобразует количество дозы в число (так же, как float()).
+
+    Args:
+        amount_str (str): количество дозы.
+
+    Returns:
+        float | None: число или None, если преобразовать не удалось.
+    """
+
+    try:
+      return float(amount_str)
+
+    except ValueError:
+      return None
+
+  # количество дозы преобразуем по уникальным значениям (их обычно немного).
+  parsed_amounts: dict[str, float | None] = {
+    amount_str: ParsedAmount(amount_str)
+    for amount_str in parts["amount"].dropna().unique()
+  }
+  is_number = (
+    parts["amount"]
+    .map({amount_str: value is not None for amount_str, value in parsed_amounts.items()})
+    .fillna(False)
+    .astype(bool)
+  )
+  numeric_dose = parts["amount"].map(parsed_amounts).where(is_number).astype(float)
+
+  for dose_str in doses[parts["amount"].notna() & ~is_number].unique():
+    v_logger.warning(f"Unsupported dose string: {dose_str}", LogMode.VERBOSELY)
+
+  dose_and_time = parts["dose_and_time"].where(is_number)
+
+  # определяем, есть ли период времени (по количеству "/"): при одном "/" период
+  # есть только у "pp*/time", при двух - всегда; остальное не поддерживается.
+  one_slash = dose_and_time.str.fullmatch(r"(?s)[^/]*/[^/]*").fillna(False).astype(bool)
+  with_time = (
+    dose_and_time.str.fullmatch(r"(?s)p[^/]*/[^/]*|[^/]*/[^/]*/[^/]*")
+    .fillna(False)
+    .astype(bool)
+  )
+  last_part = dose_and_time.str.extract(r"(?s)^(?P<head>.*)/(?P<tail>[^/]*)\Z")
+
+  dose_unit = dose_and_time.where(one_slash).where(~with_time, last_part["head"])
+  time_period = last_part["tail"].where(with_time)
+
+  # единица измерения должна быть допустимой.
+  is_valid_unit = dose_unit.isin(valid_units)
+  for unit in dose_unit[dose_unit.notna() & ~is_valid_unit].unique():
+    v_logger.warning(f"Unsupported dose_unit (non-valid): {unit}", LogMode.VERBOSELY)
+
+  dose_unit = dose_unit.where(is_valid_unit)
+
+  # разделяем единицу измерения на префикс и суффикс ("ppm" -> "ppm", "m3").
+  unit_parts = dose_unit.str.extract(r"(?s)^(?P<prefix>[^/]*)(?:/(?P<suffix>.*))?\Z")
+  unit_prefix = unit_parts["prefix"].str.lower()
+  unit_suffix = unit_parts["suffix"].fillna("m3").where(dose_unit.notna())
+
+  is_valid_suffix = unit_suffix.isin(["kg", "m3"])
+  for unit in dose_unit[dose_unit.notna() & ~is_valid_suffix].unique():
+    v_logger.warning(f"Unsupported dose_unit (suffix): {unit}", LogMode.VERBOSELY)
+
+  # коэффициенты перевода: постоянные - из таблицы, ppm/ppb/pph - по массе.
+  mw = df["mw"].to_numpy(dtype=float)
+  factors = unit_prefix.map(dose_unit_conversions).astype(float).to_numpy()
+  factors = np.where(unit_prefix.eq("ppm"), 24.45 / mw, factors)  # 1 ppm = 24.45/mw
+  factors = np.where(unit_prefix.eq("ppb"), 0.001 * 24.45 / mw, factors)
+  factors = np.where(unit_prefix.eq("pph"), 1 / 60 * 24.45 / mw, factors)
+
+  is_known_prefix = pd.Series(
+    unit_prefix.isin([*dose_unit_conversions, "ppm", "ppb", "pph"]).to_numpy(),
+    index=df.index,
+  )
+  for unit in dose_unit[is_valid_suffix & ~is_known_prefix].unique():
+    v_logger.warning(f"Unsupported dose_unit (prefix): {unit}", LogMode.VERBOSELY)
+
+  is_parsed = is_valid_suffix & is_known_prefix
+
+  df["numeric_dose"] = (numeric_dose * factors).where(is_parsed)
+  df["dose_units"] = ("mg/" + unit_suffix).where(is_parsed)
+  df["time_period"] = time_period.where(is_parsed)
+
+  # удаляем исходный столбец "dose" и переименовываем новый.
+  df = df.drop(columns=["dose"]).rename(columns={"numeric_dose": "dose"})
+
+  return df
+
+
 @ReTry(attempts_amount=1)
-def DownloadCompoundToxicity(compound_data: dict, page_folder_name: str):
+def DownloadCompoundToxicity(
+  compound_data: dict,
+  compound_frame: dict,
+  molecular_weights: dict[str, str] | None = None,
+) -> bool:
   """
   Скачиваем данные о токсичности соединения по информации из JSON PubChem
-  и сохраняем их в CSV-файл.
+  и записываем их в виде CSV-текста в кадр соединения для журнала страницы.
 
   Args:
       compound_data (dict): словарь с информацией о соединении из JSON PubChem.
-      page_folder_name (str): путь к директории, в которой будет сохранен файл.
+      compound_frame (dict): кадр соединения {"id": SID, "parts": {тип единиц
+                             измерения -> CSV-текст}}. Заполняется по ходу
+                             обработки, поэтому сохраняет уже полученные данные,
+                             даже если обработка соединения прервалась.
+      molecular_weights (dict[str, str] | None, optional): заранее полученные
+                         молекулярные веса (CID -> вес), например, для всей
+                         страницы сразу. Отсутствующие в нем CID запрашиваются
+                         отдельно. Defaults to None.
+
+  Returns:
+      bool: True, если соединение обработано полностью.
   """
 
+  if molecular_weights is None:
+    molecular_weights = {}
+
   cid: str = ""
 
   try:
@@ -182,7 +765,8 @@ def DownloadCompoundToxicity(compound_data: dict, page_folder_name: str):
     )
     v_logger.info("-", LogMode.VERBOSELY)
 
-    return
+    compound_frame["id"] = str(compound_data["LinkedRecords"]["SID"][0])
+    return True
     # не сохраняем те соединения, у которых нет cid,
     # так как невозможно вычислить молекулярные вес
 
@@ -206,7 +790,7 @@ def DownloadCompoundToxicity(compound_data: dict, page_folder_name: str):
 
   # проверяем тип запроса.
   if table_info["query_type"] != "sid":
-    v_logger.LogException(ValueError(f"Unknown query type at page {page_folder_name}"))
+    v_logger.LogException(ValueError(f"Unknown query type: {table_info['query_type']}"))
 
   # получаем SID из данных таблицы.
   sid = int(table_info["query"])
@@ -215,55 +799,102 @@ def DownloadCompoundToxicity(compound_data: dict, page_folder_name: str):
   if primary_sid != sid:
     v_logger.warning(f"Mismatch between 'primary_sid' ({primary_sid}) and 'sid' ({sid}).")
 
-  # формируем имя файла.
+  compound_frame["id"] = str(sid)
+
+  # формируем имя соединения.
   compound_name: str = f"compound_{sid}_toxicity"
 
-  # формируем пути к файлам для разных единиц измерения.
-  compound_file_kg = f"{page_folder_name.format(unit_type='kg')}/{compound_name}"
-  compound_file_m3 = f"{page_folder_name.format(unit_type='m3')}/{compound_name}"
+  v_logger.info(f"Downloading {compound_name}...", LogMode.VERBOSELY)
 
-  # если файл уже существует и скачивание пропущено, пропускаем.
-  if os.path.exists(f"{compound_file_kg}.csv") or (
-    os.path.exists(f"{compound_file_m3}.csv") and config["skip_downloaded"]
-  ):
-    v_logger.info(f"{compound_name} is already downloaded, skip.", LogMode.VERBOSELY)
-    v_logger.info("-", LogMode.VERBOSELY)
+  # уникальные CID всех строк ответа SDQ (в порядке появления).
+  response_cids: dict = {}
 
-    return
+  def RelevantToxicityRows(chunk: pd.DataFrame) -> pd.DataFrame:
+    """
+    Оставляет строки, которые проходят фильтрацию (`filtering_config`) хотя бы
+    для одного типа единиц измерения (остальные строки все равно были бы
+    отброшены в SaveToxicityUnitSpecification).
 
-  v_logger.info(f"Downloading {compound_name}...", LogMode.VERBOSELY)
+    Args:
+        chunk (pd.DataFrame): часть данных о токсичности.
+
+    Returns:
+        pd.DataFrame: отфильтрованная часть данных.
+    """
+
+    # запоминаем CID всех строк ответа (до отбора).
+    if "cid" in chunk.columns:
+      response_cids.update(dict.fromkeys(chunk["cid"].dropna()))
+
+    relevant_rows = pd.Series(False, index=chunk.index)
+
+    for unit_str in ("kg", "m3"):
+      unit_rows = pd.Series(True, index=chunk.index)
+
+      for key, values in filtering_config[unit_str].items():
+        if len(values) == 0:
+          continue
+
+        # без нужного столбца отфильтровать нельзя (оставляем часть как есть).
+        if key not in chunk.columns:
+          return chunk
+
+        unit_rows &= chunk[key].isin(values)
 
-  # получаем данные о токсичности из PubChem.
+      relevant_rows |= unit_rows
+
+    return chunk[relevant_rows]
+
+  # получаем данные о токсичности из PubChem (сразу отбрасывая ненужные строки).
   acute_effects = GetDataFrameFromUrl(
     GetLinkFromSid(
       sid=sid, collection=table_info["collection"], limit=toxicity_config["limit"]
     ),
-    toxicity_config["sleep_time"],
+    RelevantToxicityRows,
   )
 
-  @ReTry()
-  def GetMolecularWeightByCid(cid: str | int) -> str:
+  # ответ не получен: соединение не считается обработанным (в журнал
+  # не попадет и будет скачано заново при перезапуске).
+  if acute_effects is None:
+    v_logger.warning(f"Could not retrieve {compound_name}, skip.")
+    v_logger.info("-", LogMode.VERBOSELY)
+
+    return False
+
+  # если ни одна строка не прошла фильтрацию, сохранять нечего.
+  if acute_effects.empty:
+    v_logger.warning(
+      f"{compound_name} is empty, no need saving, skip.", LogMode.VERBOSELY
+    )
+    v_logger.info("-", LogMode.VERBOSELY)
+
+    return True
+
+  def GetMolecularWeightByCid(cid: str | int) -> str | None:
     """
-    Получает молекулярный вес соединения из PubChem REST API, используя его CID.
+    Получает молекулярный вес соединения по его CID.
+    Если вес уже известен (есть в `molecular_weights`), запрос не отправляется.
 
     Args:
         cid (str | int): PubChem Compound Identifier (CID) соединения.
 
     Returns:
-        str: молекулярный вес соединения в виде строки.
+        str | None: молекулярный вес соединения в виде строки
+                    (None, если получить его не удалось).
     """
 
-    # получаем молекулярный вес соединения из PubChem.
-    return GetResponse(
-      "https://pubchem.ncbi.nlm.nih.gov/rest/pug/compound/cid/"
-      f"{cid}/property/MolecularWeight/txt",
-      True,
-      None,
-    ).text.strip()
+    cid = NormalizedCID(cid)
+
+    # получаем молекулярный вес соединения из кэша или PubChem.
+    if cid not in molecular_weights:
+      molecular_weights.update(GetMolecularWeightsByCIDs([cid]))
+
+    return molecular_weights.get(cid)
 
   def CalcMolecularWeight(
     df: pd.DataFrame,
     id_column: str,
+    all_ids: list | None = None,
   ) -> pd.DataFrame:
     """
     Вычисляет и добавляет столбец 'mw' (молекулярный вес) в pd.DataFrame.
@@ -271,13 +902,21 @@ def DownloadCompoundToxicity(compound_data: dict, page_folder_name: str):
     Args:
         df (pd.DataFrame): исходный pd.DataFrame.
         id_column (str): название столбца, содержащего ID соединений.
+        all_ids (list | None, optional): уникальные ID соединений всех строк
+                                         ответа (до отбора строк); по ним
+                                         определяется, единственный ли ID.
+                                         Defaults to None (ID из df).
 
     Returns:
         pd.DataFrame: модифицированный DataFrame с добавленным столбцом 'mw'.
     """
 
     # получаем уникальные идентификаторы соединений.
-    unique_ids = df[id_column].dropna().unique()
+    unique_ids = (
+      df[id_column].dropna().unique()
+      if all_ids is None
+      else pd.unique(pd.Series(all_ids))
+    )
 
     # если найден только один уникальный идентификатор.
     if len(unique_ids) == 1:
@@ -305,6 +944,13 @@ def DownloadCompoundToxicity(compound_data: dict, page_folder_name: str):
     else:
       v_logger.warning(f"Non-unique 'mw' by {id_column} for {unique_ids[0]}.")
 
+      # запрашиваем недостающие веса одной пачкой, а не по запросу на строку.
+      molecular_weights.update(
+        GetMolecularWeightsByCIDs(
+          [cid for cid in unique_ids if NormalizedCID(cid) not in molecular_weights]
+        )
+      )
+
       # применяем функцию получения молекулярного веса к каждому id.
       df["mw"] = df[id_column].apply(GetMolecularWeightByCid)
 
@@ -314,146 +960,6 @@ def DownloadCompoundToxicity(compound_data: dict, page_folder_name: str):
 
     return df
 
-  def ExtractDoseAndTime(df: pd.DataFrame, valid_units: list[str]) -> pd.DataFrame:
-    """
-    Преобразует DataFrame с данными о дозировках, извлекая числовое
-    значение, единицу измерения и период времени.
-
-    Args:
-        df (pd.DataFrame): таблица с колонкой "dose", содержащей
-                            информацию о дозировках.
-        valid_units (list[str]): список допустимых единиц измерения дозы.
-
-    Returns:
-        DataFrame с тремя новыми колонками: "numeric_dose", "dose_value",
-        "time_period".
-    """
-
-    df = df.copy()
-
-    def ExtractDose(
-      dose_str: str, mw: float
-    ) -> tuple[float | None, str | None, str | None]:
-      """
-      Извлекает дозу, единицу измерения и период времени из строки
-      дозировки.
-
-      Args:
-          dose_str (str): строка, содержащая информацию о дозировке.
-          mw (float): молекулярная масса соединения.
-
-      Returns:
-          tuple[float | None, str | None, str | None]: кортеж, содержащий:
-              - числовую дозу (float или None, если извлечь не удалось).
-              - единицу измерения дозы (str или None, если извлечь не удалось).
-              - период времени (str или None, если извлечь не удалось).
-      """
-
-      # если в строке нет пробелов, возвращаем None.
-      if " " not in dose_str:
-        return None, None, None
-
-      num_dose: float | str | None = None
-      dose_unit: str | None = None
-      time_per: str | None = None
-
-      try:
-        # если строка дозировки содержит не два элемента, возвращаем None.
-        if len(dose_str.split(" ")) != len(
-          ["dose_amount_str", "dose_and_time"]
-        ):  # короче, != 2
-          return None, None, None
-
-        # разделяем строку на количество дозы и единицы измерения.
-        dose_amount_str, dose_and_time = dose_str.split(" ")
-        # преобразуем количество дозы в число.
-        num_dose = float(dose_amount_str)
-
-      # если не удалось преобразовать количество дозы в число.
-      except ValueError:
-        v_logger.warning(f"Unsupported dose string: {dose_str}", LogMode.VERBOSELY)
-        return None, None, None
-
-      # определяем, есть ли период времени.
-      match dose_str.count("/"):
-        case 1:  # нету time period или это pp*/time
-          # если строка начинается с "p", это "pp*/time".
-          if dose_and_time.startswith("p"):
-            dose_unit, time_per = dose_and_time.split("/")
-          else:
-            dose_unit = dose_and_time
-            time_per = None
-
-        case 2:  # есть time period
-          # извлекаем единицу измерения и период времени.
-          dose_unit = "/".join(dose_and_time.split("/")[:-1])
-          time_per = dose_and_time.split("/")[-1]
-
-        case _:
-          return None, None, None
-
-      # если единица измерения не поддерживается.
-      if dose_unit not in valid_units:
-        v_logger.warning(
-          f"Unsupported dose_unit (non-valid): {dose_unit}", LogMode.VERBOSELY
-        )
-        return None, None, None
-
-      unit_prefix: str = dose_unit
-      unit_suffix: str = "m3"
-
-      # если единица измерения содержит "/", разделяем ее.
-      if dose_unit.count("/") > 0:
-        unit_prefix, unit_suffix = dose_unit.split("/")
-
-        # если суффикс не поддерживается.
-        if unit_suffix not in ("kg", "m3"):
-          v_logger.warning(
-            f"Unsupported dose_unit (suffix): {dose_unit}", LogMode.VERBOSELY
-          )
-          return None, None, None
-
-      unit_prefix = unit_prefix.lower()
-
-      # словарь с коэффициентами перевода единиц измерения.
-      conversions: dict[str, float] = {
-        "mg": 1,
-        "gm": 1000,
-        "g": 1000,
-        "ng": 0.000001,
-        "ug": 0.001,
-        "ml": 1000,
-        "nl": 0.001,  # 1000 * 0.000001
-        "ul": 1,  # 1000 * 0.001
-        "ppm": 24.45 / mw,  # 1 ppm = 1 mg/m3 * 24.45/mw
-        "ppb": 0.001 * 24.45 / mw,  # 1 ppb = 0.001 ppm
-        "pph": 1 / 60 * 24.45 / mw,  # 1 pph = 1/60 ppm
-      }
-
-      # переводим известные единицы к "mg/kg" и "mg/m3".
-      if unit_prefix in conversions:
-        num_dose *= conversions[unit_prefix]
-        dose_unit = "mg/" + unit_suffix
-
-      # если префикс не поддерживается.
-      else:
-        v_logger.warning(
-          f"Unsupported dose_unit (prefix): {dose_unit}", LogMode.VERBOSELY
-        )
-        return None, None, None
-
-      return num_dose, dose_unit, time_per
-
-    # применяем функцию извлечения дозы к каждой строке DataFrame.
-    df[["numeric_dose", "dose_units", "time_period"]] = df.apply(
-      lambda row: pd.Series(ExtractDose(row["dose"], row["mw"])), axis=1
-    )
-
-    # удаляем исходный столбец "dose" и переименовываем новый.
-    df = df.drop(columns=["dose"]).rename(columns={"numeric_dose": "dose"})
-
-    return df
-
   def SaveMolfileWithToxicityToSDF(df: pd.DataFrame, unit_type: str):
     """
     Сохраняет molfile соединения с данными о токсичности в SDF-файл.
@@ -478,9 +984,14 @@ def DownloadCompoundToxicity(compound_data: dict, page_folder_name: str):
         # то записываем только его.
         listed_df.loc[0, column_name] = full_column_data[0]
 
+    molfile: str | None = GetMolfileFromCID(cid)
+
+    if molfile is None:
+      return
+
     # сохраняем molfile в SDF-файл.
     SaveMolfilesToSDF(
-      data=pd.DataFrame({"cid": [cid], "molfile": [GetMolfileFromCID(cid)]}),
+      data=pd.DataFrame({"cid": [cid], "molfile": [molfile]}),
       file_name=(
         f"{toxicity_config['molfiles_folder_name']}/{compound_name}_{unit_type}"
       ),
@@ -490,17 +1001,15 @@ def DownloadCompoundToxicity(compound_data: dict, page_folder_name: str):
     )
 
   def SaveToxicityUnitSpecification(
-    compound_file_unit: str,
     unit_str: str,
     valid_units: list[str],
     acute_effects: pd.DataFrame,
   ):
     """
-    Фильтрует, преобразует и сохраняет данные о токсичности для указанного
-    типа единиц измерения.
+    Фильтрует, преобразует и сохраняет в кадр соединения данные о токсичности
+    для указанного типа единиц измерения.
 
     Args:
-        compound_file_unit (str): имя файла для сохранения (без расширения).
         unit_str (str): тип единиц измерения ("kg" или "m3").
         valid_units (list[str]): список допустимых единиц измерения.
         acute_effects (pd.DataFrame): DataFrame с данными о токсичности.
@@ -601,8 +1110,8 @@ def DownloadCompoundToxicity(compound_data: dict, page_folder_name: str):
       )
       return
 
-    # сохраняем DataFrame в CSV-файл.
-    acute_effects_unit.to_csv(f"{compound_file_unit}.csv", sep=";", index=False, mode="w")
+    # записываем DataFrame в кадр соединения (он дописывается в журнал страницы).
+    compound_frame["parts"][unit_str] = acute_effects_unit.to_csv(sep=";", index=False)
 
     v_logger.success(f"Saving {compound_name}_{unit_str} to .csv!", LogMode.VERBOSELY)
 
@@ -621,7 +1130,7 @@ def DownloadCompoundToxicity(compound_data: dict, page_folder_name: str):
   v_logger.info("Adding 'mw'...", LogMode.VERBOSELY)
 
   # добавляем столбец с молекулярным весом.
-  acute_effects = CalcMolecularWeight(acute_effects, "cid")
+  acute_effects = CalcMolecularWeight(acute_effects, "cid", list(response_cids))
 
   try:
     # преобразуем значения столбца "mw" в числовой формат.
@@ -632,13 +1141,12 @@ def DownloadCompoundToxicity(compound_data: dict, page_folder_name: str):
   # если столбец "mw" не найден.
   except KeyError:
     v_logger.warning(f"No 'mw' for {compound_name}, skip.")
-    return
+    return True
 
   v_logger.info("~", LogMode.VERBOSELY)
 
   # сохраняем данные о токсичности для единиц измерения "kg".
   SaveToxicityUnitSpecification(
-    compound_file_unit=compound_file_kg,
     unit_str="kg",
     valid_units=["gm/kg", "g/kg", "mg/kg", "ug/kg", "ng/kg", "mL/kg", "uL/kg", "nL/kg"],
     acute_effects=acute_effects,
@@ -648,7 +1156,6 @@ def DownloadCompoundToxicity(compound_data: dict, page_folder_name: str):
 
   # сохраняем данные о токсичности для единиц измерения "m3".
   SaveToxicityUnitSpecification(
-    compound_file_unit=compound_file_m3,
     unit_str="m3",
     valid_units=[
       "gm/m3",
@@ -669,3 +1176,111 @@ def DownloadCompoundToxicity(compound_data: dict, page_folder_name: str):
   v_logger.info("·", LogMode.VERBOSELY)
   v_logger.success(f"Downloading {compound_name}!", LogMode.VERBOSELY)
   v_logger.info("-", LogMode.VERBOSELY)
+
+  return True
+
+
+def DownloadPageCompoundsToxicity(
+  compounds_data: list[dict],
+  journal: FrameJournal,
+  first_index: int = 0,
+  executor: ThreadPoolExecutor | None = None,
+):
+  """
+  Скачивает данные о токсичности для части соединений со страницы PubChem
+  и дописывает их в журнал страницы (по кадру на соединение).
+
+  Соединения, для которых в журнале уже есть кадр, пропускаются. Молекулярные
+  веса остальных соединений запрашиваются заранее, несколькими запросами на всю
+  часть страницы. Если передан executor, соединения обрабатываются параллельно
+  (одновременно в работе находится не больше соединений, чем потоков
+  в executor); общая частота запросов при этом по-прежнему ограничивается
+  `pubchem_limiter`. Кадры дописываются в журнал в порядке соединений на
+  странице, из основного потока.
+  Функция возвращается только после того, как обработаны все соединения.
+
+  Args:
+      compounds_data (list[dict]): список словарей с информацией о соединениях
+                                   из JSON PubChem.
+      journal (FrameJournal): журнал страницы.
+      first_index (int, optional): номер первого соединения на странице.
+                                   Defaults to 0.
+      executor (ThreadPoolExecutor | None, optional): пул потоков.
+                                                      Defaults to None (последовательно).
+  """
+
+  # пропускаем соединения, уже записанные в журнал.
+  indexed_compounds: list[tuple[int, dict]] = [
+    (i, compound_data)
+    for i, compound_data in enumerate(compounds_data, start=first_index)
+    if i not in journal.frames
+  ]
+
+  if len(indexed_compounds) < len(compounds_data):
+    v_logger.info(
+      f"{len(compounds_data) - len(indexed_compounds)} compounds are already in "
+      "the journal, skip.",
+      LogMode.VERBOSELY,
+    )
+
+  # молекулярные веса всех соединений части запрашиваются заранее, пачками.
+  molecular_weights: dict[str, str] = GetMolecularWeightsByCIDs(
+    [
+      cid
+      for _, compound_data in indexed_compounds
+      for cid in compound_data.get("LinkedRecords", {}).get("CID", [])
+    ]
+  )
+
+  def DownloadIndexedCompoundToxicity(i: int, compound_data: dict) -> dict | None:
+    """
+    Скачивает данные о токсичности одного соединения, замеряя время обработки.
+
+    Args:
+        i (int): номер соединения на странице.
+        compound_data (dict): словарь с информацией о соединении из JSON PubChem.
+
+    Returns:
+        dict | None: кадр соединения для журнала (None, если скачать ничего
+                     не удалось).
+    """
+
+    compound_frame: dict = {"parts": {}}
+
+    # фиксируем время начала обработки.
+    start_time = time.time()
+
+    # скачиваем данные о токсичности соединения.
+    completed = DownloadCompoundToxicity(compound_data, compound_frame, molecular_weights)
+
+    # фиксируем время окончания обработки.
+    end_time = time.time()
+
+    # если включен флаг тестирования, выводим время обработки.
+    if config["testing_flag"]:
+      v_logger.info(
+        f"Prev compound: {i}, time: {(end_time - start_time):.3f} sec.",
+        LogMode.VERBOSELY,
+      )
+
+    # соединения, прерванные до получения данных, в журнал не записываются:
+    # они будут скачаны заново при перезапуске.
+    if not completed and not compound_frame["parts"]:
+      return None
+
+    return compound_frame
+
+  indices: list[int] = [i for i, _ in indexed_compounds]
+  page_compounds: list[dict] = [compound_data for _, compound_data in indexed_compounds]
+
+  # последовательная или параллельная обработка (executor.map отдает результаты
+  # в порядке соединений и пробрасывает исключения из потоков).
+  if executor is None:
+    results = map(DownloadIndexedCompoundToxicity, indices, page_compounds)
+
+  else:
+    results = executor.map(DownloadIndexedCompoundToxicity, indices, page_compounds)
+
+  for i, compound_frame in zip(indices, results, strict=True):
+    if compound_frame is not None:
+      journal.Append(i, compound_frame["id"], compound_frame["parts"])
@@ -0,0 +1,99 @@
+"""
+Utils/chunk_size_controller.py
+
+Этот модуль реализует класс ChunkSizeController, который подбирает размер
+пачки для пакетных запросов по наблюдаемому времени ответа (AIMD).
+"""
+
+import threading
+
+from Configurations.config import Config
+
+
+class ChunkSizeController:
+  """
+  Подбирает размер пачки запроса: пока ответы приходят быстрее `target_seconds`,
+  размер растет на `min_size` (аддитивно), при медленном ответе или ошибке
+  (например, тайм-ауте) - уменьшается вдвое (мультипликативно).
+  """
+
+  __min_size: int
+  __max_size: int
+  __target_seconds: float
+
+  __size: int
+  __lock: threading.Lock
+
+  def __init__(
+    self, initial_size: int, min_size: int, max_size: int, target_seconds: float
+  ):
+    """
+    Инициализирует класс ChunkSizeController.
+
+    Args:
+        initial_size (int): начальный размер пачки.
+        min_size (int): минимальный размер пачки (и шаг увеличения).
+        max_size (int): максимальный размер пачки.
+        target_seconds (float): желаемое время ответа на одну пачку (в секундах).
+
+    Raises:
+        ValueError: должно выполняться 0 < min_size <= max_size.
+    """
+
+    if not 0 < min_size <= max_size:
+      raise ValueError("ChunkSizeController: should be 0 < min_size <= max_size")
+
+    self.__min_size = min_size
+    self.__max_size = max_size
+    self.__target_seconds = target_seconds
+
+    self.__size = min(max(initial_size, min_size), max_size)
+    self.__lock = threading.Lock()
+
+  @classmethod
+  def FromConfig(cls, controller_config: Config):
+    """
+    Создает экземпляр ChunkSizeController на основе конфигурации.
+
+    Args:
+        controller_config (Config): конфигурация размера пачки.
+
+    Returns:
+        ChunkSizeController: экземпляр класса.
+    """
+
+    return cls(
+      controller_config["initial_chunk_size"],
+      controller_config["min_chunk_size"],
+      controller_config["max_chunk_size"],
+      controller_config["target_seconds"],
+    )
+
+  @property
+  def size(self) -> int:
+    """Текущий размер пачки."""
+
+    return self.__size
+
+  def OnSuccess(self, elapsed_seconds: float):
+    """
+    Учитывает время успешного ответа на пачку.
+
+    Args:
+        elapsed_seconds (float): время ответа (в секундах).
+    """
+
+    with self.__lock:
+      if elapsed_seconds > self.__target_seconds:
+        self.__size = max(self.__min_size, self.__size // 2)
+
+      else:
+        self.__size = min(self.__max_size, self.__size + self.__min_size)
+
+  def OnFailure(self):
+    """
+    Учитывает неудачный запрос (тайм-аут, ошибку сервера): уменьшает пачку вдвое.
+    """
+
+    with self.__lock:
+      self.__size = max(self.__min_size, self.__size // 2)
@@ -7,6 +7,7 @@ Utils/dataframe_funcs.py
 удаление None, дубликатов и вычисление медиан.
 """
 
+import numpy as np
 import pandas as pd
 
 
@@ -49,85 +50,203 @@ def DedupedList(list_name: list) -> list:
     )
 
 
-def MedianDedupedDF(
-  df: pd.DataFrame, id_column_name: str, median_column_name: str
-) -> pd.DataFrame:
+def IsAllNan(list_name: list) -> bool:
   """
-  Удаляет дубликаты в колонке идентификаторов элементов DataFrame, заменяя их
-  медианой соответствующих значений в колонке median_column_name.
+  Проверяет, состоит ли список только из значений "nan".
 
-  Сохраняет значения из всех остальных столбцов в списки,
-  если они различны, иначе - одиночными элементами.
+  Args:
+      list_name (list): список, который нужно проверить.
+
+  Returns:
+      bool: True, если все элементы списка равны "nan".
+  """
+
+  return all(str(elem) == "nan" for elem in list_name)
+
+
+def CollapsedValue(list_name: list) -> object:
+  """
+  Сворачивает значения группы: убирает None и дубликаты, и если остался
+  1 элемент - возвращает его, если не осталось ни одного (или все они "nan") -
+  None, иначе - список.
 
   Args:
-      df (pd.DataFrame): исходный DataFrame.
-      id_column_name (str): имя колонки, содержащей идентификаторы.
-      median_column_name (str): имя колонки, в которой нужно посчитать
-                                медианы.
+      list_name (list): значения группы.
 
   Returns:
-      pd.DataFrame: DataFrame с удаленными дубликатами и списками в
-                    остальных столбцах.
+      object: одиночное значение, список значений или None.
   """
 
-  median_and_id_data: dict = {}
+  try:
+    # пытаемся создать список уникальных значений.
+    values = DedupedList(list_name)
 
-  # значения в столбце, где будут медианы - должно быть типа float.
-  df.loc[:, median_column_name] = df[median_column_name].astype(float)
+  # если возникла ошибка, создаем список без None.
+  except TypeError:
+    values = NonNoneList(list_name)
+
+  # если в списке 1 элемент, то список бесполезен.
+  if len(values) == 1:
+    return values[0]
+
+  # если в списке нет элементов, или они все == "nan", то это не список.
+  if len(values) == 0 or IsAllNan(values):
+    return None
+
+  return values
+
+
+def GroupStarts(codes: np.ndarray) -> np.ndarray:
+  """
+  Возвращает позиции, с которых начинаются группы в отсортированном массиве
+  номеров групп.
 
-  name_values_dict: dict[str, float | list]
+  Args:
+      codes (np.ndarray): отсортированные номера групп.
 
-  # итерируемся по уникальным значениям в колонке идентификаторов.
-  for name in df[id_column_name].unique():
-    # создаем подмножество DataFrame для текущего идентификатора.
-    name_subset_df: pd.DataFrame = df.loc[df[id_column_name] == name]
+  Returns:
+      np.ndarray: позиции первых элементов групп.
+  """
 
-    # создаем словарь для хранения данных по данному имени.
-    name_values_dict = {median_column_name: name_subset_df[median_column_name].median()}
+  return np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
 
-    # добавляем списки значений для остальных столбцов.
-    for col in name_subset_df.columns:
-      # исключаем колонку median_column_name.
-      if col not in (median_column_name, id_column_name):
-        try:
-          # пытаемся создать список уникальных значений.
-          name_values_dict[col] = DedupedList(name_subset_df[col].tolist())
 
-        # если возникла ошибка, создаем список без None.
-        except TypeError:
-          name_values_dict[col] = NonNoneList(name_subset_df[col].tolist())
+def CollapsedColumn(values: pd.Series, codes: np.ndarray, groups_amount: int) -> list:
+  """
+  Сворачивает значения колонки по группам (как CollapsedValue, но сразу для
+  всех групп): одиночные значения и пустые группы обрабатываются векторно,
+  списки строятся только для групп с несколькими различными значениями.
 
-        # если в списке 1 элемент, то список бесполезен.
-        if len(name_values_dict[col]) == 1:
-          name_values_dict[col] = name_values_dict[col][0]
+  Args:
+      values (pd.Series): значения колонки.
+      codes (np.ndarray): номера групп строк (от 0 до groups_amount - 1).
+      groups_amount (int): количество групп.
 
-        def IsAllNan(list_name: list) -> bool:
-          """
-          Проверяет, состоит ли список только из значений "nan".
+  Returns:
+      list: свернутые значения для каждой группы.
+  """
 
-          Args:
-              list_name (list): список, который нужно проверить.
+  objects: np.ndarray = values.to_numpy(dtype=object)
 
-          Returns:
-              bool: True, если все элементы списка равны "nan".
-          """
+  collapsed: np.ndarray = np.full(groups_amount, None, dtype=object)
 
-          return all(str(elem) == "nan" for elem in list_name)
+  try:
+    # убираем None и другие "ложные" значения (как NonNoneList).
+    keep: np.ndarray = objects.astype(bool)
 
-        # если в списке нет элементов, или они все == "nan",
-        # то это не список.
-        if isinstance(name_values_dict[col], list):
-          if len(name_values_dict[col]) == 0 or IsAllNan(name_values_dict[col]):
-            name_values_dict[col] = None
+    kept = pd.DataFrame({"code": codes[keep], "value": objects[keep]})
 
-    # сохраняем данные для данного имени.
-    median_and_id_data[name] = name_values_dict
+    # убираем дубликаты внутри групп (первые вхождения остаются на своих местах).
+    # значения nan из float-колонок - разные объекты, поэтому set() их не
+    # склеивает; повторяем это, чтобы результат совпадал с DedupedList.
+    duplicated: pd.Series = kept.duplicated()
+    if pd.api.types.is_float_dtype(values.dtype):
+      duplicated &= kept["value"].notna()
 
-  # новый pd.DataFrame с уникальными значениями id_column_name и
-  # соответствующими данными.
-  new_df = pd.DataFrame.from_dict(median_and_id_data, orient="index").reset_index()
+    kept = kept[~duplicated]
 
-  # переименовываем столбец с идентификаторами.
-  new_df = new_df.rename(columns={"index": id_column_name})
+  # значения, которые нельзя хешировать (например, словари), сворачиваем
+  # по группам так же, как и раньше.
+  except TypeError:
+    order: np.ndarray = np.argsort(codes, kind="stable")
+    starts: np.ndarray = GroupStarts(codes[order])
 
-  return new_df
+    for code, group_values in zip(
+      codes[order][starts], np.split(objects[order], starts[1:]), strict=True
+    ):
+      collapsed[code] = CollapsedValue(group_values.tolist())
+
+    return collapsed.tolist()
+
+  kept_codes: np.ndarray = kept["code"].to_numpy()
+  kept_values: np.ndarray = kept["value"].to_numpy()
+
+  sizes: np.ndarray = np.bincount(kept_codes, minlength=groups_amount)
+
+  # группы с единственным значением.
+  single: np.ndarray = sizes[kept_codes] == 1
+  collapsed[kept_codes[single]] = kept_values[single]
+
+  # группы с несколькими различными значениями.
+  multi_codes: np.ndarray = kept_codes[~single]
+  multi_values: np.ndarray = kept_values[~single]
+
+  order = np.argsort(multi_codes, kind="stable")
+  multi_codes, multi_values = multi_codes[order], multi_values[order]
+
+  if len(multi_codes) > 0:
+    starts = GroupStarts(multi_codes)
+
+    for code, group_values in zip(
+      multi_codes[starts], np.split(multi_values, starts[1:]), strict=True
+    ):
+      group_list: list = group_values.tolist()
+      collapsed[code] = None if IsAllNan(group_list) else group_list
+
+  return collapsed.tolist()
+
+
+def MedianDedupedDF(
+  df: pd.DataFrame,
+  id_column_name: str,
+  median_column_name: str,
+  aggregates: tuple[str, ...] = (),
+) -> pd.DataFrame:
+  """
+  Удаляет дубликаты в колонке идентификаторов элементов DataFrame, заменяя их
+  медианой соответствующих значений в колонке median_column_name.
+
+  Сохраняет значения из всех остальных столбцов в списки,
+  если они различны, иначе - одиночными элементами.
+
+  Все группы обрабатываются за один проход по каждой колонке (без фильтрации
+  всей таблицы для каждого идентификатора).
+
+  Args:
+      df (pd.DataFrame): исходный DataFrame.
+      id_column_name (str): имя колонки, содержащей идентификаторы.
+      median_column_name (str): имя колонки, в которой нужно посчитать
+                                медианы.
+      aggregates (tuple[str, ...], optional): дополнительные агрегаты колонки
+                                              median_column_name (например,
+                                              "count", "mean", "std"), которые
+                                              сохраняются в колонки
+                                              "<median_column_name>_<агрегат>".
+                                              Defaults to ().
+
+  Returns:
+      pd.DataFrame: DataFrame с удаленными дубликатами и списками в
+                    остальных столбцах.
+  """
+
+  # номера групп в порядке первого появления идентификаторов.
+  codes, ids = pd.factorize(df[id_column_name], use_na_sentinel=False)
+
+  # строки без идентификатора не попадают ни в одну группу (сравнение с nan
+  # ничего не находит), поэтому у пустого идентификатора пустые значения.
+  has_id: np.ndarray = df[id_column_name].notna().to_numpy()
+  df, codes = df[has_id], codes[has_id]
+
+  # значения в столбце, где будут медианы - должно быть типа float.
+  statistics: pd.DataFrame = (
+    df[median_column_name]
+    .astype(float)
+    .groupby(codes)
+    .agg(["median", *aggregates])
+    .reindex(range(len(ids)))
+  )
+
+  new_data: dict[str, list] = {
+    id_column_name: list(ids),
+    median_column_name: statistics["median"].tolist(),
+  }
+
+  for aggregate in aggregates:
+    new_data[f"{median_column_name}_{aggregate}"] = statistics[aggregate].tolist()
+
+  # добавляем свернутые значения остальных столбцов.
+  for col in df.columns:
+    if col not in (median_column_name, id_column_name):
+      new_data[col] = CollapsedColumn(df[col], codes, len(ids))
+
+  return pd.DataFrame(new_data)
@@ -6,8 +6,15 @@ Utils/files_funcs.py
 молекулярных структур в формате SDF.
 """
 
+import gzip
+import json
 import os
+import queue
+import re
 import shutil
+import threading
+from collections.abc import Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
 from io import TextIOWrapper
 
 import pandas as pd
@@ -16,6 +23,22 @@ from Configurations.config import Config, config
 from Utils.verbose_logger import Any, LogMode, v_logger
 
 
+# pyarrow нужен только для формата parquet.
+try:
+  import pyarrow as pa
+  import pyarrow.parquet as pq
+
+except ImportError:
+  pa = pq = None
+
+# zstandard нужен только для сжатия частей .sdf файлов алгоритмом zstd.
+try:
+  import zstandard
+
+except ImportError:
+  zstandard = None
+
+
 def DeleteFilesInFolder(
   folder_name: str, except_items: list[str] | None = None, delete_folders: bool = False
 ):
@@ -118,18 +141,338 @@ def MoveFileToFolder(file_name: str, curr_folder_name: str, folder_name: str):
     v_logger.warning(f"{full_file_name} does not exist!", LogMode.VERBOSELY)
 
 
-def CombineCSVInFolder(folder_name: str, combined_file_name: str):
+# форматы (они же расширения) файлов с таблицами.
+storage_formats: tuple[str, ...] = ("csv", "parquet")
+
+
+def TypedForParquetDF(
+  data: pd.DataFrame, string_columns: list[str] | None = None
+) -> pd.DataFrame:
   """
-  Склеивает все .csv файлы в папке в один.
+  Подготавливает DataFrame к записи в Parquet: числовые колонки сохраняются
+  со своими типами, а в колонках объектов все значения, кроме строк
+  и пропусков (например, списки и словари ChEMBL), приводятся к строкам
+  (как при записи в CSV), чтобы колонка имела один тип.
 
   Args:
-      folder_name (str): имя папки с .csv файлами.
-      combined_file_name (str): имя склеенного .csv файла.
+      data (pd.DataFrame): исходный DataFrame.
+      string_columns (list[str] | None, optional): колонки, которые нужно
+                                                   привести к строкам независимо
+                                                   от их типа. Defaults to None.
+
+  Returns:
+      pd.DataFrame: DataFrame с однотипными колонками.
+  """
+
+  data = data.copy()
+
+  for column in dict.fromkeys(
+    [*data.select_dtypes(include="object").columns, *(string_columns or [])]
+  ):
+    values: pd.Series = data[column].astype(object)
+
+    data[column] = values.where(values.isna() | values.map(type).eq(str), values.map(str))
+
+  return data
+
+
+def SaveDataFrame(
+  data: pd.DataFrame,
+  file_name: str,
+  storage_format: str = "csv",
+  csv_separator: str | None = None,
+) -> str:
+  """
+  Сохраняет DataFrame в файл заданного формата.
+
+  Args:
+      data (pd.DataFrame): DataFrame для сохранения.
+      file_name (str): имя файла (без расширения).
+      storage_format (str, optional): формат файла ("csv" или "parquet").
+                                      Defaults to "csv".
+      csv_separator (str | None, optional): разделитель полей CSV. Defaults to
+                                            None (`csv_separator` из конфигурации).
+
+  Returns:
+      str: имя сохраненного файла (с расширением).
+
+  Raises:
+      ValueError: если формат не поддерживается.
+  """
+
+  full_file_name: str = f"{file_name}.{storage_format}"
+
+  match storage_format:
+    case "csv":
+      data.to_csv(
+        full_file_name, sep=csv_separator or config["csv_separator"], index=False
+      )
+
+    case "parquet":
+      TypedForParquetDF(data).to_parquet(
+        full_file_name,
+        index=False,
+        compression=config["Utils"]["DataFrameStorage"]["parquet_compression"],
+      )
+
+    case _:
+      raise ValueError(
+        f"SaveDataFrame: unsupported storage_format '{storage_format}', "
+        f"should be one of {storage_formats}"
+      )
+
+  return full_file_name
+
+
+def ReadDataFrame(file_name: str, storage_format: str = "csv") -> pd.DataFrame:
+  """
+  Читает DataFrame из .csv или .parquet файла (формат определяется по расширению).
+
+  Если имя файла указано без расширения, читается файл формата storage_format,
+  а если такого нет - файл другого поддерживаемого формата (например, записанный
+  до смены storage_format).
+
+  Args:
+      file_name (str): имя файла (с расширением или без).
+      storage_format (str, optional): предпочтительный формат для имени без
+                                      расширения. Defaults to "csv".
+
+  Returns:
+      pd.DataFrame: прочитанный DataFrame.
+  """
+
+  if os.path.splitext(file_name)[1].removeprefix(".") not in storage_formats:
+    file_name = next(
+      (
+        f"{file_name}.{file_format}"
+        for file_format in (storage_format, *storage_formats)
+        if os.path.exists(f"{file_name}.{file_format}")
+      ),
+      f"{file_name}.{storage_format}",
+    )
+
+  if file_name.endswith(".parquet"):
+    return pd.read_parquet(file_name)
+
+  return pd.read_csv(file_name, sep=config["csv_separator"], low_memory=False)
+
+
+def ReadDataFrameColumns(file_name: str) -> list[str]:
+  """
+  Читает только имена колонок таблицы из .csv или .parquet файла.
+
+  Args:
+      file_name (str): имя файла (с расширением).
+
+  Returns:
+      list[str]: имена колонок (пустой список для пустого файла).
+  """
+
+  if file_name.endswith(".parquet"):
+    return pq.ParquetFile(file_name).schema_arrow.names
+
+  try:
+    return list(pd.read_csv(file_name, sep=config["csv_separator"], nrows=0).columns)
+
+  except pd.errors.EmptyDataError:
+    return []
+
+
+def ReadDataFrameChunks(
+  file_name: str, chunk_bytes: int, as_text: bool = False
+) -> Iterator[pd.DataFrame]:
+  """
+  Читает таблицу из .csv или .parquet файла частями, размер которых в памяти
+  примерно равен chunk_bytes (оценивается по первой части .csv файла
+  или по метаданным .parquet файла).
+
+  Args:
+      file_name (str): имя файла (с расширением).
+      chunk_bytes (int): желаемый размер части в памяти (в байтах).
+      as_text (bool, optional): читать значения .csv файла как есть, строками
+                                (без разбора чисел и пропусков). Defaults to False.
+
+  Yields:
+      Iterator[pd.DataFrame]: части таблицы.
+  """
+
+  if file_name.endswith(".parquet"):
+    parquet_file = pq.ParquetFile(file_name)
+    metadata = parquet_file.metadata
+
+    if metadata.num_rows == 0:
+      return
+
+    row_bytes: float = (
+      sum(metadata.row_group(i).total_byte_size for i in range(metadata.num_row_groups))
+      / metadata.num_rows
+    )
+
+    for batch in parquet_file.iter_batches(
+      batch_size=max(1, int(chunk_bytes / max(row_bytes, 1)))
+    ):
+      yield batch.to_pandas()
+
+    return
+
+  try:
+    reader = pd.read_csv(
+      file_name,
+      sep=config["csv_separator"],
+      iterator=True,
+      low_memory=False,
+      **({"dtype": str, "na_filter": False} if as_text else {}),
+    )
+
+  except pd.errors.EmptyDataError:
+    return
+
+  with reader:
+    # первую часть читаем небольшой, чтобы оценить размер строки в памяти.
+    chunk_rows: int = 1000
+
+    while True:
+      try:
+        chunk: pd.DataFrame = reader.get_chunk(chunk_rows)
+
+      except StopIteration:
+        return
+
+      if chunk.empty:
+        return
+
+      yield chunk
+
+      row_bytes = chunk.memory_usage(deep=True).sum() / len(chunk)
+      chunk_rows = max(1, int(chunk_bytes / max(row_bytes, 1)))
+
+
+def ParquetSchemaForFiles(
+  file_names: list[str],
+  columns: list[str],
+  chunk_bytes: int,
+  executor: ThreadPoolExecutor,
+) -> "pa.Schema":
+  """
+  Определяет общую схему Parquet для склейки таблиц из нескольких файлов:
+  типы колонок .parquet файлов берутся из их метаданных, а .csv файлы
+  читаются частями. Колонка, в которой встречаются и целые, и дробные числа,
+  становится дробной, а колонка с несовместимыми типами - строковой.
+
+  Args:
+      file_names (list[str]): имена файлов (с расширениями).
+      columns (list[str]): имена колонок склеенной таблицы.
+      chunk_bytes (int): размер части .csv файла в памяти (в байтах).
+      executor (ThreadPoolExecutor): пул потоков для чтения файлов.
+
+  Returns:
+      pa.Schema: схема склеенной таблицы.
+  """
+
+  def FileColumnKinds(file_name: str) -> dict[str, set[str]]:
+    """
+    Собирает типы ("int", "float", "bool" или "string") непустых колонок файла.
+
+    Args:
+        file_name (str): имя файла (с расширением).
+
+    Returns:
+        dict[str, set[str]]: колонка -> встреченные типы.
+    """
+
+    kinds: dict[str, set[str]] = {}
+
+    if file_name.endswith(".parquet"):
+      for field in pq.ParquetFile(file_name).schema_arrow:
+        if pa.types.is_null(field.type):
+          continue
+
+        kinds.setdefault(field.name, set()).add(
+          "int"
+          if pa.types.is_integer(field.type)
+          else "float"
+          if pa.types.is_floating(field.type)
+          else "bool"
+          if pa.types.is_boolean(field.type)
+          else "string"
+        )
+
+      return kinds
+
+    for chunk in ReadDataFrameChunks(file_name, chunk_bytes):
+      chunk = TypedForParquetDF(chunk)
+
+      for column in chunk.columns:
+        if not chunk[column].notna().any():
+          continue
+
+        kinds.setdefault(column, set()).add(
+          {"i": "int", "u": "int", "f": "float", "b": "bool"}.get(
+            chunk[column].dtype.kind, "string"
+          )
+        )
+
+    return kinds
+
+  column_kinds: dict[str, set[str]] = {column: set() for column in columns}
+
+  for file_kinds in executor.map(FileColumnKinds, file_names):
+    for column, kinds in file_kinds.items():
+      column_kinds[column] |= kinds
+
+  arrow_types: dict[str, pa.DataType] = {
+    "int": pa.int64(),
+    "float": pa.float64(),
+    "bool": pa.bool_(),
+    "string": pa.string(),
+  }
+
+  return pa.schema(
+    [
+      (
+        column,
+        arrow_types[next(iter(kinds))]
+        if len(kinds) == 1
+        else pa.float64()
+        if kinds == {"int", "float"}
+        else pa.string(),
+      )
+      for column, kinds in column_kinds.items()
+    ]
+  )
+
+
+def CombineCSVInFolder(
+  folder_name: str, combined_file_name: str, storage_format: str = "csv"
+):
+  """
+  Склеивает все файлы с таблицами (.csv и .parquet) в папке в один.
+
+  Сначала по заголовкам (метаданным) всех файлов составляется общий набор
+  колонок, затем файлы читаются частями в несколько потоков и части по порядку
+  дописываются в склеенный файл, поэтому в памяти одновременно находится
+  ограниченное (`max_memory_mb`) количество данных. Значения .csv файлов при
+  склейке в .csv переносятся как есть (без разбора и повторного форматирования).
+
+  Args:
+      folder_name (str): имя папки с файлами.
+      combined_file_name (str): имя склеенного файла (без расширения).
+      storage_format (str, optional): формат склеенного файла ("csv" или
+                                      "parquet"). Defaults to "csv".
+
+  Raises:
+      ValueError: если формат не поддерживается.
   """
 
   # получаем конфигурацию для объединения CSV-файлов.
   combine_config: Config = config["Utils"]["CombineCSVInFolder"]
 
+  if storage_format not in storage_formats:
+    raise ValueError(
+      f"CombineCSVInFolder: unsupported storage_format '{storage_format}', "
+      f"should be one of {storage_formats}"
+    )
+
   # получаем индекс формата логгера.
   restore_index: int = (
     v_logger.UpdateFormat(combine_config["logger_label"], combine_config["logger_color"])
@@ -141,10 +484,11 @@ def CombineCSVInFolder(folder_name: str, combined_file_name: str):
 
   # если файл уже существует и нужно пропускать скачанные, выходим.
   if (
-    IsFileInFolder(folder_name, f"{combined_file_name}.csv") and config["skip_downloaded"]
+    IsFileInFolder(folder_name, f"{combined_file_name}.{storage_format}")
+    and config["skip_downloaded"]
   ):
     v_logger.info(
-      f"File '{combined_file_name}.csv' is in folder, no need to combine.",
+      f"File '{combined_file_name}.{storage_format}' is in folder, no need to combine.",
       LogMode.VERBOSELY,
     )
 
@@ -152,9 +496,6 @@ def CombineCSVInFolder(folder_name: str, combined_file_name: str):
     v_logger.RestoreFormat(restore_index)
     return
 
-  # создаем пустой DataFrame для объединения.
-  combined_df = pd.DataFrame()
-
   # если папка пуста, выходим.
   if len(os.listdir(folder_name)) == 0:
     v_logger.info(f"{folder_name} is empty, no need to combine.")
@@ -163,45 +504,187 @@ def CombineCSVInFolder(folder_name: str, combined_file_name: str):
     v_logger.RestoreFormat(restore_index)
     return
 
-  # итерируемся по файлам в папке.
-  for file_name in os.listdir(folder_name):
-    # проверяем, является ли файл CSV-файлом и не является ли он
-    # результирующим.
-    if file_name.endswith(".csv") and file_name != f"{combined_file_name}.csv":
-      # формируем полный путь к файлу.
-      full_file_name: str = os.path.join(folder_name, file_name)
+  # файлы с таблицами, кроме результирующего (в отсортированном порядке, чтобы
+  # результат не зависел от порядка создания файлов, например, при параллельной
+  # закачке).
+  file_names: list[str] = [
+    os.path.join(folder_name, file_name)
+    for file_name in sorted(os.listdir(folder_name))
+    if os.path.splitext(file_name)[1].removeprefix(".") in storage_formats
+    and os.path.splitext(file_name)[0] != combined_file_name
+  ]
+
+  read_workers: int = max(1, combine_config["read_workers"])
+
+  # в памяти одновременно находятся: по 2 части на каждый читаемый файл
+  # (в очереди и читаемая) и записываемая часть.
+  chunk_bytes: int = combine_config["max_memory_mb"] * 2**20 // (2 * read_workers + 1)
+
+  combined_full_name: str = f"{folder_name}/{combined_file_name}.{storage_format}"
+
+  # пишем во временный файл, чтобы не оставить недописанный склеенный файл.
+  temp_file_name: str = f"{combined_full_name}.tmp"
+
+  # сигнал потокам чтения прекратить работу (при ошибке записи).
+  stop = threading.Event()
+
+  def PutUnlessStopped(chunks: queue.Queue, chunk: pd.DataFrame | None) -> bool:
+    """
+    Кладет часть в очередь, ожидая места, пока склейка не остановлена (после
+    остановки очередь никто не читает, и поток чтения завис бы навсегда).
+
+    Args:
+        chunks (queue.Queue): очередь частей файла.
+        chunk (pd.DataFrame | None): часть (None - конец файла).
+
+    Returns:
+        bool: True, если часть положена в очередь.
+    """
+
+    while not stop.is_set():
+      try:
+        chunks.put(chunk, timeout=0.1)
+        return True
+
+      except queue.Full:
+        continue
+
+    return False
 
-      v_logger.info(f"Collecting '{file_name}' to pandas.DataFrame...", LogMode.VERBOSELY)
+  def ReadChunksToQueue(file_name: str, chunks: queue.Queue):
+    """
+    Читает файл частями в очередь (None в конце означает конец файла).
 
-      # читаем CSV-файл в DataFrame.
-      df = pd.read_csv(full_file_name, sep=config["csv_separator"], low_memory=False)
+    Args:
+        file_name (str): имя файла.
+        chunks (queue.Queue): очередь частей файла.
+    """
 
-      v_logger.success(
-        f"Collecting '{file_name}' to pandas.DataFrame!", LogMode.VERBOSELY
+    try:
+      for chunk in ReadDataFrameChunks(
+        file_name, chunk_bytes, as_text=storage_format == "csv"
+      ):
+        if not PutUnlessStopped(chunks, chunk):
+          return
+
+    finally:
+      PutUnlessStopped(chunks, None)
+
+  with ThreadPoolExecutor(max_workers=read_workers) as executor:
+    v_logger.info(f"Collecting columns of {len(file_names)} files...", LogMode.VERBOSELY)
+
+    # общий набор колонок (в порядке появления, как при pd.concat).
+    columns: list[str] = list(
+      dict.fromkeys(
+        column
+        for file_columns in executor.map(ReadDataFrameColumns, file_names)
+        for column in file_columns
       )
-      v_logger.info(
-        f"Concatenating '{file_name}' to combined_data_frame...", LogMode.VERBOSELY
+    )
+
+    v_logger.success(
+      f"Collecting columns of {len(file_names)} files: {len(columns)}!",
+      LogMode.VERBOSELY,
+    )
+    v_logger.info(
+      f"Collecting to combined .{storage_format} file in '{folder_name}'...",
+      LogMode.VERBOSELY,
+    )
+
+    parquet_writer = None
+    combined_file: TextIOWrapper | None = None
+
+    if storage_format == "parquet":
+      schema = ParquetSchemaForFiles(file_names, columns, chunk_bytes, executor)
+      parquet_writer = pq.ParquetWriter(
+        temp_file_name,
+        schema,
+        compression=config["Utils"]["DataFrameStorage"]["parquet_compression"],
       )
 
-      # объединяем DataFrame с общим DataFrame.
-      combined_df = pd.concat([combined_df, df], ignore_index=True)
+      # колонки, которые в склеенной таблице строковые.
+      string_columns: list[str] = [
+        field.name for field in schema if pa.types.is_string(field.type)
+      ]
 
-      v_logger.success(
-        f"Concatenating '{file_name}' to combined_data_frame!", LogMode.VERBOSELY
+    else:
+      combined_file = open(temp_file_name, "w", encoding="utf-8", newline="")
+      pd.DataFrame(columns=columns).to_csv(
+        combined_file, sep=config["csv_separator"], index=False
       )
-      v_logger.info("-", LogMode.VERBOSELY)
 
-  v_logger.info(
-    f"Collecting to combined .csv file in '{folder_name}'...", LogMode.VERBOSELY
-  )
+    # очереди частей файлов; файл начинает читаться, когда до него остается
+    # не больше read_workers файлов.
+    queues: list[queue.Queue] = [queue.Queue(maxsize=1) for _ in file_names]
+    futures: list[Future] = []
 
-  # сохраняем объединенный DataFrame в CSV-файл.
-  combined_df.to_csv(
-    f"{folder_name}/{combined_file_name}.csv", sep=config["csv_separator"], index=False
-  )
+    def SubmitNextFile():
+      """
+      Начинает чтение следующего по порядку файла (если такой остался).
+      """
+
+      if len(futures) < len(file_names):
+        futures.append(
+          executor.submit(
+            ReadChunksToQueue, file_names[len(futures)], queues[len(futures)]
+          )
+        )
+
+    completed: bool = False
+
+    try:
+      for _ in range(read_workers):
+        SubmitNextFile()
+
+      for file_index, file_name in enumerate(file_names):
+        v_logger.info(f"Collecting '{os.path.basename(file_name)}'...", LogMode.VERBOSELY)
+
+        while (chunk := queues[file_index].get()) is not None:
+          chunk = chunk.reindex(columns=columns)
+
+          if parquet_writer is not None:
+            parquet_writer.write_table(
+              pa.Table.from_pandas(
+                TypedForParquetDF(chunk, string_columns),
+                schema=schema,
+                preserve_index=False,
+              )
+            )
+
+          else:
+            chunk.to_csv(
+              combined_file, sep=config["csv_separator"], index=False, header=False
+            )
+
+        # пробрасываем исключение, если файл не удалось прочитать.
+        futures[file_index].result()
+
+        SubmitNextFile()
+
+        v_logger.success(
+          f"Collecting '{os.path.basename(file_name)}'!", LogMode.VERBOSELY
+        )
+
+      completed = True
+
+    finally:
+      stop.set()
+
+      if parquet_writer is not None:
+        parquet_writer.close()
+
+      if combined_file is not None:
+        combined_file.close()
+
+      # недописанный файл (после ошибки) не оставляем.
+      if not completed:
+        os.remove(temp_file_name)
+
+  os.replace(temp_file_name, combined_full_name)
 
   v_logger.success(
-    f"Collecting to combined .csv file in '{folder_name}'!", LogMode.VERBOSELY
+    f"Collecting to combined .{storage_format} file in '{folder_name}'!",
+    LogMode.VERBOSELY,
   )
   v_logger.info("-", LogMode.VERBOSELY)
   v_logger.success("End combining downloads!")
@@ -210,137 +693,447 @@ def CombineCSVInFolder(folder_name: str, combined_file_name: str):
   v_logger.RestoreFormat(restore_index)
 
 
-def SaveMolfilesToSDF(
+def SDFPropertyBlock(value: Any, column: str, indexing_lists: bool = False) -> str:
+  """
+  Возвращает блок свойства для .sdf файла (заголовок "> <column>" и значения).
+
+  Args:
+      value (Any): значение свойства (одиночное значение, список, pd.Series
+                   или словарь).
+      column (str): имя свойства.
+      indexing_lists (bool, optional): нужно ли индексировать списки.
+                                       Defaults to False.
+
+  Returns:
+      str: блок свойства (пустые значения не записываются).
+  """
+
+  lines: list[str] = []
+
+  # если значение - список или pd.Series.
+  if isinstance(value, list | pd.Series):
+    lines.append(f"> <{column}>")
+
+    # словари внутри списков не записываются, но номер для них учитывается.
+    for i, elem in enumerate(value):
+      if isinstance(elem, dict):
+        continue
+
+      elem_str = str(elem)
+
+      # если элемент не пустой, записываем его.
+      if elem_str not in {"nan", "None", ""}:
+        lines.append(f"{i}: {elem_str}" if indexing_lists else elem_str)
+
+  # если значение - словарь.
+  elif isinstance(value, dict):
+    lines.append(f"> <{column}>")
+
+    for key, elem in value.items():
+      elem_str = str(elem)
+
+      # если элемент не пустой, записываем его.
+      if elem_str not in {"nan", "None", ""}:
+        lines.append(f"{key}: {elem_str}")
+
+  # если значение - не список и не словарь.
+  else:
+    value_str = str(value)
+
+    # если значение не пустое, записываем его.
+    if value_str not in {"nan", "None", ""}:
+      lines.extend([f"> <{column}>", value_str])
+
+  # пустая строка разделяет свойства.
+  return "".join(f"{line}\n" for line in lines) + "\n"
+
+
+# три и более переноса строки подряд (в .sdf файле заменяются на два).
+sdf_blank_lines: re.Pattern = re.compile(r"\n{3,}")
+
+
+def SDFRecordBatches(
   data: pd.DataFrame,
-  file_name: str,
   molecule_id_column_name: str,
   extra_data: pd.DataFrame = pd.DataFrame(),
   indexing_lists: bool = False,
-):
+  batch_size: int = 1024,
+) -> Iterator[list[tuple[Any, str]]]:
   """
-  Сохраняет molfiles из pd.DataFrame в .sdf файл.
+  Готовит записи .sdf файла пачками: extra_data индексируется один раз,
+  блоки свойств готовятся по колонкам для пачки молекул, а каждая запись
+  нормализуется (лишние пустые строки убираются), поэтому в памяти находится
+  только текущая пачка записей.
 
   Args:
       data (pd.DataFrame): DataFrame с колонками molfile и id.
-      file_name (str): имя файла (без ".sdf").
       molecule_id_column_name (str): имя колонки с id соединения.
       extra_data (pd.DataFrame, optional): дополнительная информация.
                                            Defaults to pd.DataFrame().
       indexing_lists (bool, optional): нужно ли индексировать списки.
                                        Defaults to False.
+      batch_size (int, optional): количество молекул в пачке. Defaults to 1024.
+
+  Yields:
+      Iterator[list[tuple[Any, str]]]: пачки пар (id молекулы, запись).
   """
 
-  def WriteColumnAndValueToSDF(file: TextIOWrapper, value: Any, column: str = ""):
+  columns: list[str] = []
+  column_values: list = []
+  extra_ids = pd.Index([])
+  rows_by_id: dict = {}
+
+  # индексируем дополнительную информацию один раз.
+  if not extra_data.empty:
+    columns = [
+      column for column in extra_data.columns if column != molecule_id_column_name
+    ]
+    column_values = [extra_data[column].to_numpy(dtype=object) for column in columns]
+
+    extra_ids = pd.Index(extra_data[molecule_id_column_name])
+
+    # если id повторяются, значения свойства молекулы записываются списком.
+    if not extra_ids.is_unique:
+      rows_by_id = extra_data.groupby(
+        molecule_id_column_name, sort=False, dropna=False
+      ).indices
+
+  def PropertyBlocks(molecule_ids: list) -> list[str]:
     """
-    Записывает столбец и значение в .sdf файл.
+    Готовит блоки свойств для пачки молекул (по колонкам extra_data).
 
     Args:
-        file (TextIOWrapper): открытый файл для записи.
-        value (Any): значение, которое нужно записать.
-        column (str, optional): имя столбца. Defaults to "".
+        molecule_ids (list): id молекул пачки.
+
+    Returns:
+        list[str]: свойства каждой молекулы одной строкой.
     """
 
-    # если столбец не задан, выходим.
-    if not column:
-      return
+    if not columns:
+      return [""] * len(molecule_ids)
+
+    if rows_by_id:
+      rows: list = [rows_by_id[molecule_id] for molecule_id in molecule_ids]
+
+      column_blocks = [
+        [
+          SDFPropertyBlock(
+            values[row[0]] if len(row) == 1 else list(values[row]),
+            column,
+            indexing_lists,
+          )
+          for row in rows
+        ]
+        for column, values in zip(columns, column_values, strict=True)
+      ]
 
-    # если значение - список или pd.Series.
-    if isinstance(value, list) or isinstance(value, pd.Series):
-      file.write(f"> <{column}>\n")
-
-      i: int = 0
-      # итерируемся по элементам списка.
-      for elem in value:
-        # если элемент - словарь.
-        if isinstance(elem, dict):
-          # рекурсивно вызываем функцию для записи словаря.
-          WriteColumnAndValueToSDF(file, elem)
-
-        # если элемент - не словарь.
-        else:
-          # преобразуем элемент в строку.
-          elem = str(elem)
-
-          # если элемент не пустой, записываем его.
-          if elem not in {"nan", "None", ""}:
-            # если нужно индексировать списки.
-            if indexing_lists:
-              file.write(f"{i}: {elem}\n")
-            # если не нужно индексировать списки.
-            else:
-              file.write(f"{elem}\n")
-        i += 1
-
-    # если значение - словарь.
-    elif isinstance(value, dict):
-      file.write(f"> <{column}>\n")
-
-      # итерируемся по элементам словаря.
-      for key, elem in value.items():
-        # преобразуем элемент в строку.
-        elem = str(elem)
-
-        # если элемент не пустой, записываем его.
-        if elem not in {"nan", "None", ""}:
-          file.write(f"{key}: {elem}\n")
-
-    # если значение - не список и не словарь.
     else:
-      # преобразуем значение в строку.
-      value = str(value)
+      positions = extra_ids.get_indexer(molecule_ids)
+
+      # как и df.loc, отсутствующий id - ошибка.
+      if (positions == -1).any():
+        raise KeyError(molecule_ids[list(positions).index(-1)])
+
+      column_blocks = [
+        [SDFPropertyBlock(value, column, indexing_lists) for value in values[positions]]
+        for column, values in zip(columns, column_values, strict=True)
+      ]
+
+    return ["".join(blocks) for blocks in zip(*column_blocks, strict=True)]
+
+  # предыдущая запись заканчивается разделителем, а пустые строки в начале
+  # следующей нормализуются вместе с ним.
+  record_prefix: str = ""
+
+  for start in range(0, len(data), batch_size):
+    batch: list = data.iloc[start : start + batch_size].to_numpy().tolist()
+
+    records: list[tuple[Any, str]] = []
+
+    for (molecule_id, molfile), properties in zip(
+      batch, PropertyBlocks([molecule_id for molecule_id, _ in batch]), strict=True
+    ):
+      record: str = f"{record_prefix}{molecule_id}{molfile}\n\n{properties}$$$$\n"
+
+      # переносы строк приводим к "\n", три и более переноса подряд
+      # заменяем на два, после окончания блока оставляем лишь 1 перенос.
+      record = record.replace("\r\n", "\n").replace("\r", "\n")
+      record = sdf_blank_lines.sub("\n\n", record).replace("$$$$\n\n", "$$$$\n")
+
+      records.append((molecule_id, record[len(record_prefix) :]))
+      record_prefix = "$$$$\n"
+
+    v_logger.info(
+      f"Writing {batch[0][0]}..{batch[-1][0]} ({len(batch)} molecules) data "
+      "to .sdf file...",
+      LogMode.VERBOSELY,
+    )
+
+    yield records
+
+
+# алгоритмы сжатия частей .sdf файла и расширения их файлов.
+sdf_compressions: dict[str, str] = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+
+
+def WriteSDFShard(
+  shard_file_name: str, text: str, compression: str, compression_level: int
+) -> int:
+  """
+  Сжимает и записывает часть .sdf файла (через временный файл, поэтому
+  недописанная часть не остается на диске под своим именем).
+
+  Args:
+      shard_file_name (str): имя файла части.
+      text (str): записи части.
+      compression (str): алгоритм сжатия ("none", "gzip" или "zstd").
+      compression_level (int): уровень сжатия.
+
+  Returns:
+      int: размер записанного файла в байтах.
+  """
+
+  content: bytes = text.encode()
+
+  match compression:
+    case "gzip":
+      content = gzip.compress(content, compresslevel=compression_level)
+
+    case "zstd":
+      content = zstandard.ZstdCompressor(level=compression_level).compress(content)
+
+  with open(f"{shard_file_name}.tmp", "wb") as shard_file:
+    shard_file.write(content)
+
+  os.replace(f"{shard_file_name}.tmp", shard_file_name)
+
+  return len(content)
+
+
+def SaveSDFShards(
+  record_batches: Iterator[list[tuple[Any, str]]],
+  file_name: str,
+  export_config: Config,
+) -> list[str]:
+  """
+  Записывает записи .sdf файла частями ограниченного размера
+  ("<file_name>_<номер>.sdf" с расширением алгоритма сжатия) и манифест
+  "<file_name>.manifest.json" со списком частей. Части сжимаются и
+  записываются в потоках (zlib и zstandard при сжатии отпускают GIL), пока
+  готовятся следующие записи.
+
+  Args:
+      record_batches (Iterator[list[tuple[Any, str]]]): пачки пар
+                                                        (id молекулы, запись).
+      file_name (str): имя файла (без ".sdf").
+      export_config (Config): конфигурация экспорта .sdf файлов.
+
+  Returns:
+      list[str]: имена файлов частей и манифеста.
+
+  Raises:
+      ValueError: если алгоритм сжатия не поддерживается.
+      ImportError: если для сжатия "zstd" не установлен пакет zstandard.
+  """
+
+  compression: str = export_config["compression"]
+
+  if compression not in sdf_compressions:
+    raise ValueError(
+      f"SaveSDFShards: unsupported compression '{compression}', "
+      f"should be one of {tuple(sdf_compressions)}"
+    )
+
+  if compression == "zstd" and zstandard is None:
+    raise ImportError("SaveSDFShards: 'zstd' compression requires zstandard package")
+
+  shard_max_chars: int = int(export_config["shard_max_mb"] * 2**20)
+  workers: int = max(1, export_config["workers"])
+
+  shards: list[dict] = []
+  shard_file_names: list[str] = []
+  futures: list[Future] = []
+
+  shard_records: list[str] = []
+  shard_ids: list[Any] = []
+  shard_chars: int = 0
+
+  with ThreadPoolExecutor(max_workers=workers) as executor:
+
+    def SubmitShard():
+      """
+      Отправляет накопленные записи на запись отдельной частью.
+      """
+
+      nonlocal shard_records, shard_ids, shard_chars
+
+      shard_file_name: str = (
+        f"{file_name}_{len(shards):05d}.sdf{sdf_compressions[compression]}"
+      )
+
+      # в памяти не больше одной части на поток (и одной накапливаемой).
+      if len(futures) >= workers:
+        futures[len(futures) - workers].result()
+
+      futures.append(
+        executor.submit(
+          WriteSDFShard,
+          shard_file_name,
+          "".join(shard_records),
+          compression,
+          export_config["compression_level"],
+        )
+      )
+
+      shards.append(
+        {
+          "file_name": os.path.basename(shard_file_name),
+          "records": len(shard_records),
+          "first_id": str(shard_ids[0]),
+          "last_id": str(shard_ids[-1]),
+        }
+      )
+      shard_file_names.append(shard_file_name)
+
+      shard_records, shard_ids, shard_chars = [], [], 0
+
+    for batch in record_batches:
+      for molecule_id, record in batch:
+        # часть заполнена - начинаем следующую (запись больше части пишется
+        # отдельной частью).
+        if shard_records and shard_chars + len(record) > shard_max_chars:
+          SubmitShard()
+
+        shard_records.append(record)
+        shard_ids.append(molecule_id)
+        shard_chars += len(record)
+
+    if shard_records:
+      SubmitShard()
+
+    for shard, future in zip(shards, futures, strict=True):
+      shard["bytes"] = future.result()
+
+  manifest_file_name: str = f"{file_name}.manifest.json"
+
+  with open(f"{manifest_file_name}.tmp", "w", encoding="utf-8") as manifest_file:
+    json.dump(
+      {
+        "compression": compression,
+        "records": sum(shard["records"] for shard in shards),
+        "shards": shards,
+      },
+      manifest_file,
+      indent=2,
+      ensure_ascii=False,
+    )
 
-      # если значение не пустое, записываем его.
-      if value not in {"nan", "None", ""}:
-        file.write(f"> <{column}>\n")
+  os.replace(f"{manifest_file_name}.tmp", manifest_file_name)
 
-        file.write(f"{value}\n")
+  return [*shard_file_names, manifest_file_name]
 
-    # записываем пустую строку для разделения значений.
-    file.write("\n")
 
-  # открываем файл для записи.
-  with open(f"{file_name}.sdf", "w", encoding="utf-8") as f:
-    # итерируемся по строкам DataFrame.
-    for value in data.to_numpy():
-      # получаем id молекулы и molfile.
-      molecule_id, molfile = value
+def CheckStorageConfig():
+  """
+  Проверяет параметры хранения результатов до начала загрузки: форматы таблиц
+  всех задач (`storage_format`) и алгоритм сжатия .sdf файлов, а также наличие
+  необязательных пакетов, которые для них нужны (extra "parquet" в
+  pyproject.toml). Иначе ошибка возникла бы только при записи первого файла,
+  уже после скачивания.
+
+  Raises:
+      ValueError: если формат или алгоритм сжатия не поддерживается.
+      ImportError: если нужный пакет не установлен.
+  """
+
+  for task, task_config in config.items():
+    if not isinstance(task_config, dict) or "storage_format" not in task_config:
+      continue
+
+    storage_format: str = task_config["storage_format"]
+
+    if storage_format not in storage_formats:
+      raise ValueError(
+        f"{task}: unsupported storage_format '{storage_format}', "
+        f"should be one of {storage_formats}"
+      )
+
+    if storage_format == "parquet" and pa is None:
+      raise ImportError(
+        f"{task}: 'parquet' storage_format requires pyarrow package "
+        "(uv pip install -r pyproject.toml --extra parquet)"
+      )
+
+  compression: str = config["Utils"]["SDFExport"]["compression"]
+
+  if compression not in sdf_compressions:
+    raise ValueError(
+      f"SDFExport: unsupported compression '{compression}', "
+      f"should be one of {tuple(sdf_compressions)}"
+    )
+
+  if compression == "zstd" and zstandard is None:
+    raise ImportError(
+      "SDFExport: 'zstd' compression requires zstandard package "
+      "(uv pip install -r pyproject.toml --extra parquet)"
+    )
+
+
+def SaveMolfilesToSDF(
+  data: pd.DataFrame,
+  file_name: str,
+  molecule_id_column_name: str,
+  extra_data: pd.DataFrame = pd.DataFrame(),
+  indexing_lists: bool = False,
+) -> list[str]:
+  """
+  Сохраняет molfiles из pd.DataFrame в .sdf файл (за один проход, см.
+  SDFRecordBatches) с индексом "<file_name>.sdf.idx" для чтения записей по id
+  (см. SDFReader) или, если в конфигурации задан размер части, в несколько
+  сжатых частей с манифестом (см. SaveSDFShards).
+
+  Args:
+      data (pd.DataFrame): DataFrame с колонками molfile и id.
+      file_name (str): имя файла (без ".sdf").
+      molecule_id_column_name (str): имя колонки с id соединения.
+      extra_data (pd.DataFrame, optional): дополнительная информация.
+                                           Defaults to pd.DataFrame().
+      indexing_lists (bool, optional): нужно ли индексировать списки.
+                                       Defaults to False.
 
-      # записываем id молекулы и molfile в файл.
-      f.write(f"{molecule_id}{molfile}\n\n")
+  Returns:
+      list[str]: имена записанных файлов.
+  """
+
+  # конфигурация экспорта .sdf файлов.
+  export_config: Config = config["Utils"]["SDFExport"]
 
-      # если есть дополнительная информация.
-      if not extra_data.empty:
-        # устанавливаем id молекулы в качестве индекса.
-        df = extra_data.set_index(f"{molecule_id_column_name}")
+  record_batches = SDFRecordBatches(
+    data, molecule_id_column_name, extra_data, indexing_lists
+  )
 
-        # итерируемся по столбцам DataFrame.
-        for column in df.columns:
-          # записываем столбец и значение в файл.
-          WriteColumnAndValueToSDF(f, df.loc[molecule_id, column], column)
+  if export_config["shard_max_mb"] > 0:
+    return SaveSDFShards(record_batches, file_name, export_config)
 
-      # записываем разделитель между молекулами.
-      f.write("$$$$\n")
+  # смещение следующей записи в файле (в байтах).
+  offset: int = 0
 
-      v_logger.info(f"Writing {molecule_id} data to .sdf file...", LogMode.VERBOSELY)
+  # рядом с файлом записываем индекс "id<TAB>смещение<TAB>длина" (см. SDFReader).
+  with (
+    open(f"{file_name}.sdf", "wb") as f,
+    open(f"{file_name}.sdf.idx", "w", encoding="utf-8") as index_file,
+  ):
+    for batch in record_batches:
+      encoded_records: list[bytes] = [record.encode() for _, record in batch]
 
-  # переоткрываем файл, чтобы исправить избыточные переносы строк
-  # (да, заново открыть его - это самый простой способ)
-  with open(f"{file_name}.sdf", encoding="utf-8") as f:
-    sdf_content = f.read()
+      f.write(b"".join(encoded_records))
 
-  # максимальное кол-во переносов строк
-  max_n_amounts = 0
-  while "\n" * max_n_amounts in sdf_content:
-    max_n_amounts += 1
+      index_lines: list[str] = []
 
-  # заменяем все идущие подряд переносы
-  # (вплоть до "\n\n" невключительно)
-  for amount in range(max_n_amounts, 2, -1):
-    sdf_content = sdf_content.replace("\n" * amount, "\n\n")
+      for (molecule_id, _), encoded_record in zip(batch, encoded_records, strict=True):
+        index_lines.append(f"{molecule_id}\t{offset}\t{len(encoded_record)}\n")
+        offset += len(encoded_record)
 
-  # после окончания блока должен быть лишь 1 перенос
-  sdf_content = sdf_content.replace("$$$$\n\n", "$$$$\n")
+      index_file.write("".join(index_lines))
 
-  # перезаписываем файл
-  with open(f"{file_name}.sdf", "w", encoding="utf-8") as f:
-    f.write(sdf_content)
+  return [f"{file_name}.sdf", f"{file_name}.sdf.idx"]
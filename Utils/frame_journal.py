@@ -0,0 +1,162 @@
+"""
+Utils/frame_journal.py
+
+Этот модуль реализует класс FrameJournal - журнал, в который записи (кадры)
+только дописываются, причем каждый кадр защищен контрольной суммой и
+сбрасывается на диск (fsync), поэтому журнал служит точкой восстановления.
+"""
+
+import os
+import threading
+import zlib
+
+
+class FrameJournal:
+  """
+  Журнал кадров в одном файле. Кадр - это строка-заголовок
+
+      #frame index=<номер> id=<id> crc32=<сумма> parts=<имя>:<байт>,...
+
+  за которой следуют части кадра (тексты в UTF-8) длиной, указанной в заголовке.
+
+  При открытии журнала читаются все целые кадры; оборванный или поврежденный
+  "хвост" (например, после аварийного завершения во время записи) отрезается.
+  Для каждого номера (index) учитывается первый записанный кадр.
+  """
+
+  __path: str
+  __frames: dict[int, dict]
+  __lock: threading.Lock
+
+  def __init__(self, path: str):
+    """
+    Инициализирует класс FrameJournal: открывает (или создает) журнал и
+    восстанавливает из него все целые кадры.
+
+    Args:
+        path (str): путь к файлу журнала.
+    """
+
+    self.__path = path
+    self.__frames = {}
+    self.__lock = threading.Lock()
+
+    if os.path.dirname(path):
+      os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    self.__Recover()
+
+  @property
+  def frames(self) -> dict[int, dict]:
+    """
+    Записанные кадры: номер -> {"id": str, "parts": dict[str, str]}.
+    """
+
+    return self.__frames
+
+  def Append(self, index: int, frame_id: str, parts: dict[str, str]):
+    """
+    Дописывает кадр в конец журнала и дожидается его записи на диск.
+
+    Args:
+        index (int): номер кадра.
+        frame_id (str): идентификатор кадра (без пробелов).
+        parts (dict[str, str]): части кадра (имя -> текст), имена без ":" и ",".
+    """
+
+    encoded_parts: dict[str, bytes] = {
+      name: text.encode() for name, text in parts.items()
+    }
+    payload: bytes = b"".join(encoded_parts.values())
+
+    header: str = (
+      f"#frame index={index} id={frame_id} crc32={zlib.crc32(payload):08x} "
+      f"parts={','.join(f'{name}:{len(part)}' for name, part in encoded_parts.items())}\n"
+    )
+
+    with self.__lock:
+      with open(self.__path, "ab") as journal:
+        journal.write(header.encode() + payload)
+        journal.flush()
+        os.fsync(journal.fileno())
+
+      self.__frames.setdefault(index, {"id": frame_id, "parts": dict(parts)})
+
+  def __Recover(self):
+    """
+    Читает целые кадры журнала и отрезает оборванный "хвост", если он есть.
+    """
+
+    if not os.path.exists(self.__path):
+      return
+
+    with open(self.__path, "rb") as journal:
+      content: bytes = journal.read()
+
+    position: int = 0
+
+    while position < len(content):
+      frame = self.__ParseFrame(content, position)
+
+      if frame is None:
+        break
+
+      index, frame_id, parts, position = frame
+      self.__frames.setdefault(index, {"id": frame_id, "parts": parts})
+
+    # отрезаем все, что идет после последнего целого кадра.
+    if position < len(content):
+      with open(self.__path, "r+b") as journal:
+        journal.truncate(position)
+
+  @staticmethod
+  def __ParseFrame(
+    content: bytes, position: int
+  ) -> tuple[int, str, dict[str, str], int] | None:
+    """
+    Разбирает кадр, начинающийся с позиции position.
+
+    Args:
+        content (bytes): содержимое журнала.
+        position (int): позиция начала кадра.
+
+    Returns:
+        tuple[int, str, dict[str, str], int] | None: номер, идентификатор, части
+        кадра и позиция следующего кадра (None, если кадр оборван или поврежден).
+    """
+
+    header_end: int = content.find(b"\n", position)
+
+    if header_end == -1:
+      return None
+
+    try:
+      fields: dict[str, str] = dict(
+        field.split("=", 1) for field in content[position:header_end].decode().split()[1:]
+      )
+
+      index = int(fields["index"])
+      crc32 = int(fields["crc32"], 16)
+      sizes: list[tuple[str, int]] = [
+        (name, int(size))
+        for name, size in (part.split(":") for part in fields["parts"].split(",") if part)
+      ]
+
+    except (KeyError, ValueError, UnicodeDecodeError):
+      return None
+
+    payload_start: int = header_end + 1
+    payload_end: int = payload_start + sum(size for _, size in sizes)
+    payload: bytes = content[payload_start:payload_end]
+
+    if len(payload) != payload_end - payload_start or zlib.crc32(payload) != crc32:
+      return None
+
+    parts: dict[str, str] = {}
+    part_start: int = 0
+
+    for name, size in sizes:
+      parts[name] = payload[part_start : part_start + size].decode()
+      part_start += size
+
+    return index, fields["id"], parts, payload_end
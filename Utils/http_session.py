@@ -0,0 +1,109 @@
+"""
+Utils/http_session.py
+
+Этот модуль содержит общий HTTP-транспорт (requests.Session) с пулом
+keep-alive соединений, которые переиспользуются между запросами, а также
+адаптер, ограничивающий частоту запросов к отдельному хосту.
+"""
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from Configurations.config import Config, config
+from Utils.rate_limiter import TokenBucket
+
+
+# конфигурация для HTTP-сессии.
+session_config: Config = config["Utils"]["HTTPSession"]
+
+
+def CreateSession(session_config: Config = session_config) -> requests.Session:
+  """
+  Создает requests.Session с пулом соединений заданного размера.
+
+  Соединения к одному и тому же хосту переиспользуются (keep-alive), поэтому
+  TCP- и TLS-рукопожатие выполняется один раз на соединение, а не на каждый запрос.
+
+  Args:
+      session_config (Config, optional): конфигурация сессии.
+                                         Defaults to config["Utils"]["HTTPSession"].
+
+  Returns:
+      requests.Session: сессия с пулом соединений.
+  """
+
+  session = requests.Session()
+
+  # адаптер с пулом соединений: pool_connections - сколько хостов держать
+  # в кэше пулов, pool_maxsize - сколько соединений держать на один хост.
+  adapter = HTTPAdapter(
+    pool_connections=session_config["pool_connections"],
+    pool_maxsize=session_config["pool_maxsize"],
+    pool_block=session_config["pool_block"],
+  )
+
+  session.mount("https://", adapter)
+  session.mount("http://", adapter)
+
+  # явно просим сервер не закрывать соединение после ответа.
+  session.headers.update({"Connection": "keep-alive"})
+
+  return session
+
+
+class RateLimitedHTTPAdapter(HTTPAdapter):
+  """
+  HTTPAdapter, который перед отправкой каждого запроса забирает токен
+  из ограничителя частоты (TokenBucket).
+  """
+
+  def __init__(self, limiter: TokenBucket, **kwargs):
+    """
+    Инициализирует класс RateLimitedHTTPAdapter.
+
+    Args:
+        limiter (TokenBucket): ограничитель частоты запросов.
+        **kwargs: параметры HTTPAdapter (размеры пула и т.д.).
+    """
+
+    self.limiter = limiter
+
+    super().__init__(**kwargs)
+
+  def send(self, request, **kwargs):  # type: ignore
+    # ждем, только если бюджет запросов исчерпан.
+    self.limiter.Acquire()
+
+    return super().send(request, **kwargs)
+
+
+def MountRateLimiter(
+  session: requests.Session,
+  url_prefix: str,
+  limiter: TokenBucket,
+  session_config: Config = session_config,
+):
+  """
+  Ограничивает частоту запросов сессии к URL с заданным префиксом.
+
+  Args:
+      session (requests.Session): сессия.
+      url_prefix (str): префикс URL (например, "https://pubchem.ncbi.nlm.nih.gov/").
+      limiter (TokenBucket): ограничитель частоты запросов.
+      session_config (Config, optional): конфигурация сессии.
+                                         Defaults to config["Utils"]["HTTPSession"].
+  """
+
+  session.mount(
+    url_prefix,
+    RateLimitedHTTPAdapter(
+      limiter,
+      pool_connections=session_config["pool_connections"],
+      pool_maxsize=session_config["pool_maxsize"],
+      pool_block=session_config["pool_block"],
+    ),
+  )
+
+
+# MARK: http_session
+http_session = CreateSession()
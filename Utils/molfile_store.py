@@ -0,0 +1,183 @@
+"""
+Utils/molfile_store.py
+
+Этот модуль реализует класс MolfileStore - общее для всех модулей персистентное
+хранилище molfile-строк (ключ -> molfile) с LRU-кэшем в памяти.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+from Configurations.config import Config, config
+from Utils.sqlite_cache import SQLiteCache
+
+
+class MolfileStore:
+  """
+  Хранилище molfile-строк с адресацией по содержимому.
+
+  Ключ (например, "cid:2244" или "chembl:CHEMBL25") указывает на хэш (sha256)
+  molfile, а сам molfile хранится (сжатым) один раз на хэш, поэтому одинаковые
+  структуры под разными ключами занимают место один раз. Перед обращением к
+  диску проверяется LRU-кэш в памяти на `memory_entries` записей.
+  """
+
+  __keys: SQLiteCache
+  __blobs: SQLiteCache
+
+  __memory: OrderedDict[str, str]
+  __memory_entries: int
+  __lock: threading.Lock
+
+  def __init__(self, path: str, max_entries: int | None = None, memory_entries: int = 0):
+    """
+    Инициализирует класс MolfileStore.
+
+    Args:
+        path (str): путь к файлу базы данных.
+        max_entries (int | None, optional): максимальное количество записей на диске.
+                                            Defaults to None (без ограничения).
+        memory_entries (int, optional): размер LRU-кэша в памяти. Defaults to 0.
+    """
+
+    self.__keys = SQLiteCache(path, max_entries=max_entries, table="molfile_keys")
+    self.__blobs = SQLiteCache(path, max_entries=max_entries, table="molfile_blobs")
+
+    self.__memory = OrderedDict()
+    self.__memory_entries = memory_entries
+    self.__lock = threading.Lock()
+
+  @classmethod
+  def FromConfig(cls, store_config: Config):
+    """
+    Создает экземпляр MolfileStore на основе конфигурации.
+
+    Args:
+        store_config (Config): конфигурация хранилища.
+
+    Returns:
+        MolfileStore: экземпляр класса.
+    """
+
+    return cls(
+      store_config["path"],
+      store_config["max_entries"],
+      store_config["memory_entries"],
+    )
+
+  def Get(self, key: str) -> str | None:
+    """
+    Возвращает molfile по ключу.
+
+    Args:
+        key (str): ключ (например, "cid:2244").
+
+    Returns:
+        str | None: molfile или None, если его нет в хранилище.
+    """
+
+    return self.GetMany([key]).get(key)
+
+  def GetMany(self, keys: list[str]) -> dict[str, str]:
+    """
+    Возвращает molfile для списка ключей.
+
+    Args:
+        keys (list[str]): список ключей.
+
+    Returns:
+        dict[str, str]: словарь ключ -> molfile (только найденные записи).
+    """
+
+    found: dict[str, str] = {}
+
+    # сначала ищем в памяти.
+    with self.__lock:
+      for key in keys:
+        if key in self.__memory:
+          self.__memory.move_to_end(key)
+          found[key] = self.__memory[key]
+
+    missing_keys: list[str] = [key for key in dict.fromkeys(keys) if key not in found]
+
+    if not missing_keys:
+      return found
+
+    # затем на диске: ключ -> хэш -> molfile.
+    digests: dict[str, str] = {
+      key: digest.decode() for key, digest in self.__keys.GetMany(missing_keys).items()
+    }
+    blobs: dict[str, bytes] = self.__blobs.GetMany(list(set(digests.values())))
+
+    for key, digest in digests.items():
+      if digest in blobs:
+        found[key] = blobs[digest].decode()
+        self.__Remember(key, found[key])
+
+    return found
+
+  def Set(self, key: str, molfile: str):
+    """
+    Сохраняет molfile по ключу.
+
+    Args:
+        key (str): ключ (например, "cid:2244").
+        molfile (str): molfile-строка.
+    """
+
+    self.SetMany({key: molfile})
+
+  def SetMany(self, molfiles: dict[str, str]):
+    """
+    Сохраняет несколько molfile.
+
+    Args:
+        molfiles (dict[str, str]): словарь ключ -> molfile.
+    """
+
+    if not molfiles:
+      return
+
+    digests: dict[str, str] = {
+      key: hashlib.sha256(molfile.encode()).hexdigest()
+      for key, molfile in molfiles.items()
+    }
+
+    self.__blobs.SetMany(
+      {digests[key]: molfile.encode() for key, molfile in molfiles.items()}
+    )
+    self.__keys.SetMany({key: digest.encode() for key, digest in digests.items()})
+
+    for key, molfile in molfiles.items():
+      self.__Remember(key, molfile)
+
+  def __Remember(self, key: str, molfile: str):
+    """
+    Добавляет molfile в LRU-кэш в памяти, вытесняя давно не использованные.
+
+    Args:
+        key (str): ключ.
+        molfile (str): molfile-строка.
+    """
+
+    if self.__memory_entries <= 0:
+      return
+
+    with self.__lock:
+      self.__memory[key] = molfile
+      self.__memory.move_to_end(key)
+
+      while len(self.__memory) > self.__memory_entries:
+        self.__memory.popitem(last=False)
+
+
+# конфигурация для хранилища molfile.
+molfile_store_config: Config = config["Utils"]["MolfileStore"]
+
+# MARK: molfile_store
+molfile_store: MolfileStore | None = (
+  MolfileStore.FromConfig(molfile_store_config)
+  if molfile_store_config["enabled"]
+  else None
+)
@@ -0,0 +1,177 @@
+"""
+Utils/rate_limiter.py
+
+Этот модуль реализует класс TokenBucket - ограничитель частоты запросов
+по алгоритму "token bucket" с автоматическим замедлением и восстановлением.
+"""
+
+import multiprocessing
+import threading
+import time
+from contextlib import AbstractContextManager
+from multiprocessing.sharedctypes import SynchronizedArray
+
+from Configurations.config import Config
+
+
+class TokenBucket:
+  """
+  Ограничивает частоту запросов: в "ведре" копятся токены со скоростью `rate`
+  в секунду (но не больше `burst`), каждый запрос забирает один токен.
+
+  Ждать приходится только тогда, когда токены закончились, поэтому время,
+  потраченное на сам запрос, засчитывается в интервал между запросами.
+
+  Состояние ведра (частота, токены, время пополнения) можно перенести в
+  разделяемую память (ShareState) и подключить в других процессах
+  (AttachState) - тогда все процессы расходуют один общий бюджет запросов.
+  """
+
+  __max_rate: float
+  __min_rate: float
+  __recovery_factor: float
+  __burst: float
+
+  # [частота, токены, время последнего пополнения].
+  __state: list[float] | SynchronizedArray
+
+  __lock: AbstractContextManager
+
+  def __init__(
+    self,
+    rate: float,
+    burst: float,
+    min_rate: float | None = None,
+    recovery_factor: float = 1.0,
+  ):
+    """
+    Инициализирует класс TokenBucket.
+
+    Args:
+        rate (float): максимальная частота запросов (в запросах в секунду).
+        burst (float): максимальное количество накопленных токенов.
+        min_rate (float | None, optional): нижняя граница частоты при замедлении.
+                                           Defaults to None (равна rate).
+        recovery_factor (float, optional): во сколько раз увеличивается частота
+                                           при каждом вызове Recover. Defaults to 1.0.
+
+    Raises:
+        ValueError: частота и размер ведра должны быть больше нуля.
+    """
+
+    if rate <= 0 or burst <= 0:
+      raise ValueError("TokenBucket: rate and burst should be greater zero")
+
+    self.__max_rate = rate
+    self.__min_rate = min(min_rate, rate) if min_rate is not None else rate
+    self.__recovery_factor = recovery_factor
+    self.__burst = burst
+
+    self.__state = [rate, burst, time.monotonic()]
+    self.__lock = threading.Lock()
+
+  @classmethod
+  def FromConfig(cls, limiter_config: Config):
+    """
+    Создает экземпляр TokenBucket на основе конфигурации.
+
+    Args:
+        limiter_config (Config): конфигурация ограничителя.
+
+    Returns:
+        TokenBucket: экземпляр класса.
+    """
+
+    return cls(
+      limiter_config["requests_per_second"],
+      limiter_config["burst"],
+      limiter_config["min_requests_per_second"],
+      limiter_config["recovery_factor"],
+    )
+
+  @property
+  def rate(self) -> float:
+    """Текущая частота запросов (в запросах в секунду)."""
+
+    return self.__state[0]
+
+  def ShareState(self) -> SynchronizedArray:
+    """
+    Переносит состояние ведра в разделяемую память, чтобы его можно было
+    подключить в других процессах (например, в initializer пула процессов).
+
+    Returns:
+        SynchronizedArray: разделяемое состояние ведра.
+    """
+
+    with self.__lock:
+      state = multiprocessing.Array("d", list(self.__state))
+
+    self.AttachState(state)
+
+    return state
+
+  def AttachState(self, state: SynchronizedArray):
+    """
+    Подключает разделяемое состояние ведра, созданное ShareState.
+
+    Args:
+        state (SynchronizedArray): разделяемое состояние ведра.
+    """
+
+    self.__state = state
+    # блокировка разделяемой памяти работает и между процессами, и между потоками.
+    self.__lock = state.get_lock()
+
+  def Acquire(self):
+    """
+    Забирает один токен, при необходимости ожидая его появления.
+    """
+
+    with self.__lock:
+      self.__Refill()
+
+      # резервируем токен (баланс может уйти в минус - это очередь ожидающих).
+      self.__state[1] -= 1
+      wait_time = -self.__state[1] / self.__state[0] if self.__state[1] < 0 else 0.0
+
+    # ждем вне блокировки, чтобы не задерживать другие потоки.
+    if wait_time > 0:
+      time.sleep(wait_time)
+
+  def Throttle(self, factor: float):
+    """
+    Замедляет частоту запросов (но не ниже минимальной).
+
+    Args:
+        factor (float): множитель частоты (0 < factor < 1).
+    """
+
+    with self.__lock:
+      self.__Refill()
+      self.__state[0] = max(self.__min_rate, self.__state[0] * factor)
+
+      # накопленные токены не должны позволять обойти замедление.
+      self.__state[1] = min(self.__state[1], 1.0)
+
+  def Recover(self):
+    """
+    Постепенно возвращает частоту запросов к максимальной.
+    """
+
+    with self.__lock:
+      self.__Refill()
+      self.__state[0] = min(self.__max_rate, self.__state[0] * self.__recovery_factor)
+
+  def __Refill(self):
+    """
+    Пополняет ведро токенами за время, прошедшее с прошлого пополнения.
+    """
+
+    # time.monotonic - общие для всех процессов системные часы.
+    now = time.monotonic()
+
+    rate, tokens, last_time = self.__state[0], self.__state[1], self.__state[2]
+
+    self.__state[1] = min(self.__burst, tokens + (now - last_time) * rate)
+    self.__state[2] = now
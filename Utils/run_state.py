@@ -0,0 +1,292 @@
+"""
+Utils/run_state.py
+
+Этот модуль реализует класс RunState - общее для всех задач хранилище
+завершенных единиц работы (страниц, мишеней, диапазонов молекулярной массы и
+т.д.) в файле SQLite, по которому принимаются решения о пропуске уже скачанного.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections.abc import Callable
+
+from Configurations.config import Config, config
+from Utils.verbose_logger import LogMode, v_logger
+
+
+class RunState:
+  """
+  Хранилище завершенных единиц работы: для каждой задачи (task) - множество
+  завершенных единиц (unit) с контрольной суммой их выходных файлов.
+
+  Все записи загружаются в память при первом обращении. Единица отмечается
+  завершенной только после того, как ее выходные файлы полностью записаны, так
+  что частично записанные файлы не считаются скачанными. Перед пропуском
+  IsCompleted проверяет, что выходные файлы на месте: удаленный или обрезанный
+  файл снимает отметку, а у файла с другим временем изменения заново
+  сверяется контрольная сумма. Хранилище можно использовать из нескольких
+  потоков и процессов (журнал WAL, у каждого процесса свое соединение).
+  """
+
+  __path: str
+
+  # задача -> {единица работы -> (контрольная сумма, {файл -> [размер, mtime]})}.
+  __units: dict[str, dict[str, tuple[str, dict[str, list[int]]]]] | None
+  __connection: sqlite3.Connection | None
+  __connection_pid: int | None
+  __lock: threading.Lock
+
+  def __init__(self, path: str):
+    """
+    Инициализирует класс RunState.
+
+    Args:
+        path (str): путь к файлу базы данных.
+    """
+
+    self.__path = path
+
+    self.__units = None
+    self.__connection = None
+    self.__connection_pid = None
+    self.__lock = threading.Lock()
+
+  @classmethod
+  def FromConfig(cls, run_state_config: Config):
+    """
+    Создает экземпляр RunState на основе конфигурации.
+
+    Args:
+        run_state_config (Config): конфигурация хранилища.
+
+    Returns:
+        RunState: экземпляр класса.
+    """
+
+    return cls(run_state_config["path"])
+
+  def IsCompleted(
+    self, task: str, unit: str, fallback: Callable[[], bool] | None = None
+  ) -> bool:
+    """
+    Проверяет, завершена ли единица работы и целы ли ее выходные файлы.
+
+    Args:
+        task (str): имя задачи.
+        unit (str): идентификатор единицы работы.
+        fallback (Callable[[], bool] | None, optional): проверка для результатов,
+                 записанных до появления хранилища (например, существование
+                 файлов); вызывается, только если записи о единице нет.
+                 Defaults to None.
+
+    Returns:
+        bool: True, если единица работы завершена.
+    """
+
+    with self.__lock:
+      record = self.__Units().get(task, {}).get(unit)
+
+    if record is None:
+      return fallback is not None and fallback()
+
+    checksum, files = record
+
+    # изменилось ли время изменения какого-либо файла (при том же размере).
+    changed: bool = False
+
+    for file_name, (size, mtime_ns) in files.items():
+      try:
+        file_stat = os.stat(file_name)
+
+      except FileNotFoundError:
+        v_logger.warning(f"{task}: '{file_name}' of {unit} is missing, redo.")
+        return False
+
+      if file_stat.st_size != size:
+        v_logger.warning(f"{task}: '{file_name}' of {unit} has changed, redo.")
+        return False
+
+      changed |= file_stat.st_mtime_ns != mtime_ns
+
+    if not changed:
+      return True
+
+    # время изменения другое - сверяем содержимое.
+    new_checksum, new_files = self.__FilesChecksum(list(files))
+
+    if new_checksum != checksum:
+      v_logger.warning(f"{task}: outputs of {unit} have changed, redo.")
+      return False
+
+    v_logger.info(f"{task}: outputs of {unit} are intact.", LogMode.VERBOSELY)
+
+    self.__Save(task, unit, new_checksum, new_files)
+
+    return True
+
+  def MarkCompleted(self, task: str, unit: str, file_names: list[str] | None = None):
+    """
+    Отмечает единицу работы завершенной.
+
+    Args:
+        task (str): имя задачи.
+        unit (str): идентификатор единицы работы.
+        file_names (list[str] | None, optional): выходные файлы единицы работы
+                                                 (отсутствующие пропускаются),
+                                                 по ним считается контрольная
+                                                 сумма. Defaults to None.
+    """
+
+    self.__Save(task, unit, *self.__FilesChecksum(file_names or []))
+
+  def Reset(self, task: str, unit: str | None = None):
+    """
+    Снимает отметку о завершении с единицы работы (или со всех единиц задачи).
+
+    Args:
+        task (str): имя задачи.
+        unit (str | None, optional): идентификатор единицы работы.
+                                     Defaults to None (все единицы задачи).
+    """
+
+    with self.__lock:
+      connection = self.__Connection()
+
+      if unit is None:
+        connection.execute("DELETE FROM work_units WHERE task = ?", (task,))
+        self.__Units().pop(task, None)
+
+      else:
+        connection.execute(
+          "DELETE FROM work_units WHERE task = ? AND unit = ?", (task, unit)
+        )
+        self.__Units().get(task, {}).pop(unit, None)
+
+      connection.commit()
+
+  @staticmethod
+  def __FilesChecksum(file_names: list[str]) -> tuple[str, dict[str, list[int]]]:
+    """
+    Считает контрольную сумму файлов (отсутствующие пропускаются).
+
+    Args:
+        file_names (list[str]): список файлов.
+
+    Returns:
+        tuple[str, dict[str, list[int]]]: контрольная сумма (SHA-256) и
+                                          {файл -> [размер, mtime в нс]}.
+    """
+
+    checksum = hashlib.sha256()
+    files: dict[str, list[int]] = {}
+
+    for file_name in file_names:
+      if not os.path.exists(file_name):
+        continue
+
+      checksum.update(os.path.basename(file_name).encode())
+
+      with open(file_name, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+          checksum.update(block)
+
+        file_stat = os.fstat(file.fileno())
+
+      files[file_name] = [file_stat.st_size, file_stat.st_mtime_ns]
+
+    return checksum.hexdigest(), files
+
+  def __Save(self, task: str, unit: str, checksum: str, files: dict[str, list[int]]):
+    """
+    Записывает единицу работы завершенной (в базу и в память).
+
+    Args:
+        task (str): имя задачи.
+        unit (str): идентификатор единицы работы.
+        checksum (str): контрольная сумма выходных файлов.
+        files (dict[str, list[int]]): {файл -> [размер, mtime в нс]}.
+    """
+
+    with self.__lock:
+      connection = self.__Connection()
+
+      connection.execute(
+        "INSERT OR REPLACE INTO work_units (task, unit, checksum, completed_at, files) "
+        "VALUES (?, ?, ?, ?, ?)",
+        (task, unit, checksum, time.time(), json.dumps(files)),
+      )
+      connection.commit()
+
+      self.__Units().setdefault(task, {})[unit] = (checksum, files)
+
+  def __Units(self) -> dict[str, dict[str, tuple[str, dict[str, list[int]]]]]:
+    """
+    Возвращает завершенные единицы работы (загружает их из базы при первом
+    обращении).
+
+    Returns:
+        dict[str, dict[str, tuple[str, dict[str, list[int]]]]]: задача ->
+            {единица работы -> (контрольная сумма, {файл -> [размер, mtime]})}.
+    """
+
+    if self.__units is None:
+      self.__units = {}
+
+      for task, unit, checksum, files in self.__Connection().execute(
+        "SELECT task, unit, checksum, files FROM work_units"
+      ):
+        self.__units.setdefault(task, {})[unit] = (checksum, json.loads(files))
+
+    return self.__units
+
+  def __Connection(self) -> sqlite3.Connection:
+    """
+    Возвращает соединение с базой данных (открывает его при первом обращении
+    и заново - в дочернем процессе, так как соединения нельзя разделять между
+    процессами).
+
+    Returns:
+        sqlite3.Connection: соединение с базой данных.
+    """
+
+    if self.__connection is not None and self.__connection_pid == os.getpid():
+      return self.__connection
+
+    if os.path.dirname(self.__path):
+      os.makedirs(os.path.dirname(self.__path), exist_ok=True)
+
+    connection = sqlite3.connect(self.__path, timeout=60, check_same_thread=False)
+
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.execute(
+      "CREATE TABLE IF NOT EXISTS work_units ("
+      "task TEXT NOT NULL, unit TEXT NOT NULL, checksum TEXT NOT NULL, "
+      "completed_at REAL NOT NULL, files TEXT NOT NULL DEFAULT '{}', "
+      "PRIMARY KEY (task, unit))"
+    )
+
+    # в базах, созданных до появления столбца files, добавляем его.
+    columns: list[str] = [
+      column[1] for column in connection.execute("PRAGMA table_info(work_units)")
+    ]
+
+    if "files" not in columns:
+      connection.execute(
+        "ALTER TABLE work_units ADD COLUMN files TEXT NOT NULL DEFAULT '{}'"
+      )
+
+    connection.commit()
+
+    self.__connection = connection
+    self.__connection_pid = os.getpid()
+
+    return connection
+
+
+# MARK: run_state
+run_state: RunState = RunState.FromConfig(config["Utils"]["RunState"])
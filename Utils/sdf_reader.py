@@ -0,0 +1,174 @@
+"""
+Utils/sdf_reader.py
+
+Этот модуль реализует класс SDFReader - чтение отдельных записей .sdf файла,
+записанного SaveMolfilesToSDF, по id молекулы или по номерам записей без
+разбора остального файла.
+"""
+
+import mmap
+import os
+from typing import BinaryIO
+
+
+class SDFReader:
+  """
+  Читатель записей .sdf файла. Файл отображается в память (mmap), а положение
+  записей берется из индекса "<файл>.idx", который SaveMolfilesToSDF
+  записывает рядом с файлом: по строке "id<TAB>смещение<TAB>длина" (в байтах)
+  на запись, в порядке записей в файле.
+
+  id молекул сравниваются как строки, в том виде, в котором они записаны в
+  файл (например, CID из таблиц PubChem - "2244.0"). Если одна молекула
+  записана несколько раз, по id возвращается первая запись.
+  """
+
+  __path: str
+
+  __ids: list[str]
+  __spans: list[tuple[int, int]]
+  __positions: dict[str, int]
+
+  __file: BinaryIO | None
+  __mmap: mmap.mmap | None
+
+  def __init__(self, path: str):
+    """
+    Инициализирует класс SDFReader: читает индекс и отображает файл в память.
+
+    Args:
+        path (str): путь к .sdf файлу.
+
+    Raises:
+        FileNotFoundError: если нет файла или его индекса.
+    """
+
+    self.__path = path
+
+    self.__ids = []
+    self.__spans = []
+    self.__positions = {}
+
+    with open(f"{path}.idx", encoding="utf-8") as index_file:
+      for line in index_file:
+        # id может содержать табуляцию, поэтому делим строку справа.
+        molecule_id, offset, length = line.rstrip("\n").rsplit("\t", 2)
+
+        self.__positions.setdefault(molecule_id, len(self.__ids))
+        self.__ids.append(molecule_id)
+        self.__spans.append((int(offset), int(length)))
+
+    self.__file = open(path, "rb")
+
+    # пустой файл отобразить в память нельзя (и читать из него нечего).
+    self.__mmap = (
+      mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ)
+      if os.path.getsize(path) > 0
+      else None
+    )
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *_):
+    self.Close()
+
+  def __len__(self) -> int:
+    return len(self.__ids)
+
+  def __contains__(self, molecule_id: object) -> bool:
+    return str(molecule_id) in self.__positions
+
+  @property
+  def ids(self) -> list[str]:
+    """
+    id молекул в порядке записей в файле.
+    """
+
+    return self.__ids
+
+  def Get(self, molecule_id: object) -> str | None:
+    """
+    Возвращает запись молекулы по ее id.
+
+    Args:
+        molecule_id (object): id молекулы.
+
+    Returns:
+        str | None: запись (вместе с разделителем "$$$$") или None, если
+                    молекулы нет в файле.
+    """
+
+    position: int | None = self.__positions.get(str(molecule_id))
+
+    if position is None:
+      return None
+
+    return self.__Record(position)
+
+  def GetMany(self, molecule_ids: list) -> dict[str, str]:
+    """
+    Возвращает записи нескольких молекул (в порядке записей в файле, чтобы
+    читать файл последовательно).
+
+    Args:
+        molecule_ids (list): id молекул.
+
+    Returns:
+        dict[str, str]: id -> запись (молекул, которых нет в файле, в нем нет).
+    """
+
+    positions: list[int] = sorted(
+      {
+        self.__positions[str(molecule_id)]
+        for molecule_id in molecule_ids
+        if str(molecule_id) in self.__positions
+      }
+    )
+
+    return {self.__ids[position]: self.__Record(position) for position in positions}
+
+  def Range(self, start: int, stop: int) -> list[str]:
+    """
+    Возвращает записи с номерами от start до stop (не включительно).
+
+    Args:
+        start (int): номер первой записи.
+        stop (int): номер записи после последней.
+
+    Returns:
+        list[str]: записи.
+    """
+
+    return [self.__Record(position) for position in range(len(self.__ids))[start:stop]]
+
+  def Close(self):
+    """
+    Закрывает файл.
+    """
+
+    if self.__mmap is not None:
+      self.__mmap.close()
+      self.__mmap = None
+
+    if self.__file is not None:
+      self.__file.close()
+      self.__file = None
+
+  def __Record(self, position: int) -> str:
+    """
+    Возвращает запись по ее номеру.
+
+    Args:
+        position (int): номер записи.
+
+    Returns:
+        str: запись.
+    """
+
+    offset, length = self.__spans[position]
+
+    if self.__mmap is None:
+      raise ValueError(f"SDFReader: {self.__path} is closed or empty")
+
+    return self.__mmap[offset : offset + length].decode()
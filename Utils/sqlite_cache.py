@@ -0,0 +1,318 @@
+"""
+Utils/sqlite_cache.py
+
+Этот модуль реализует класс SQLiteCache - персистентный кэш "ключ -> значение"
+в файле SQLite со сроком жизни записей, ограничением размера и счетчиками
+попаданий/промахов.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+from Configurations.config import Config
+
+
+class SQLiteCache:
+  """
+  Персистентный кэш в файле SQLite.
+
+  Значения (bytes) хранятся сжатыми (zlib). Записи старше `expire_days` считаются
+  отсутствующими; если записей больше `max_entries`, удаляются давно не
+  использованные (LRU). Кэш можно использовать из нескольких потоков, а также
+  из нескольких процессов (журнал WAL, у каждого процесса свое соединение).
+
+  Чтобы не занимать блокировку записи на каждое чтение и не сканировать таблицу
+  на каждую запись, время использования обновляется не чаще раза в
+  `touch_interval` секунд, а вытеснение запускается, только когда оценка
+  количества записей превышает `max_entries` (и освобождает сразу
+  `evict_fraction` от лимита).
+  """
+
+  # MEANS: как часто (в секундах) можно обновлять время использования записи.
+  touch_interval: float = 60 * 60
+  # MEANS: какая доля `max_entries` освобождается за одно вытеснение.
+  evict_fraction: float = 0.1
+
+  __path: str
+  __table: str
+  __expire_seconds: float | None
+  __max_entries: int | None
+
+  __connection: sqlite3.Connection | None
+  __connection_pid: int | None
+  __lock: threading.Lock
+
+  __entries_estimate: int
+
+  __hits: int
+  __misses: int
+
+  def __init__(
+    self,
+    path: str,
+    expire_days: float | None = None,
+    max_entries: int | None = None,
+    table: str = "entries",
+  ):
+    """
+    Инициализирует класс SQLiteCache.
+
+    Args:
+        path (str): путь к файлу базы данных.
+        expire_days (float | None, optional): срок жизни записи (в днях).
+                                              Defaults to None (бессрочно).
+        max_entries (int | None, optional): максимальное количество записей.
+                                            Defaults to None (без ограничения).
+        table (str, optional): имя таблицы (несколько кэшей могут храниться
+                               в одном файле). Defaults to "entries".
+    """
+
+    self.__path = path
+    self.__table = table
+    self.__expire_seconds = expire_days * 24 * 60 * 60 if expire_days else None
+    self.__max_entries = max_entries
+
+    self.__connection = None
+    self.__connection_pid = None
+    self.__lock = threading.Lock()
+
+    self.__entries_estimate = 0
+
+    self.__hits = 0
+    self.__misses = 0
+
+  @classmethod
+  def FromConfig(cls, cache_config: Config):
+    """
+    Создает экземпляр SQLiteCache на основе конфигурации.
+
+    Args:
+        cache_config (Config): конфигурация кэша.
+
+    Returns:
+        SQLiteCache: экземпляр класса.
+    """
+
+    return cls(
+      cache_config["path"],
+      cache_config["expire_days"],
+      cache_config["max_entries"],
+    )
+
+  @property
+  def hits(self) -> int:
+    """Количество найденных в кэше записей."""
+
+    return self.__hits
+
+  @property
+  def misses(self) -> int:
+    """Количество не найденных в кэше записей."""
+
+    return self.__misses
+
+  def Get(self, key: str) -> bytes | None:
+    """
+    Возвращает значение по ключу.
+
+    Args:
+        key (str): ключ.
+
+    Returns:
+        bytes | None: значение или None, если записи нет (или она устарела).
+    """
+
+    return self.GetMany([key]).get(key)
+
+  def GetMany(self, keys: list[str]) -> dict[str, bytes]:
+    """
+    Возвращает значения для списка ключей.
+
+    Args:
+        keys (list[str]): список ключей.
+
+    Returns:
+        dict[str, bytes]: словарь ключ -> значение (только найденные записи).
+    """
+
+    found: dict[str, bytes] = {}
+    stale_keys: list[str] = []
+
+    if not keys:
+      return found
+
+    now = time.time()
+
+    with self.__lock:
+      connection = self.__Connection()
+
+      # sqlite ограничивает количество параметров в одном запросе.
+      for i in range(0, len(keys), 500):
+        keys_batch = keys[i : i + 500]
+
+        rows = connection.execute(
+          f"SELECT key, value, created_at, accessed_at FROM {self.__table} "
+          f"WHERE key IN ({','.join('?' * len(keys_batch))})",
+          keys_batch,
+        ).fetchall()
+
+        for key, value, created_at, accessed_at in rows:
+          if self.__expire_seconds and now - created_at > self.__expire_seconds:
+            continue
+
+          found[key] = zlib.decompress(value)
+
+          if now - accessed_at > self.touch_interval:
+            stale_keys.append(key)
+
+      # отмечаем использование найденных записей (для вытеснения LRU), но только
+      # тех, что давно не отмечались: иначе каждое чтение ждало бы блокировку записи.
+      if stale_keys:
+        connection.executemany(
+          f"UPDATE {self.__table} SET accessed_at = ? WHERE key = ?",
+          [(now, key) for key in stale_keys],
+        )
+        connection.commit()
+
+      self.__hits += len(found)
+      self.__misses += len(set(keys)) - len(found)
+
+    return found
+
+  def Set(self, key: str, value: bytes, compressed: bool = False):
+    """
+    Сохраняет значение по ключу.
+
+    Args:
+        key (str): ключ.
+        value (bytes): значение.
+        compressed (bool, optional): значение уже сжато zlib (например, сжималось
+                                     по частям). Defaults to False.
+    """
+
+    self.SetMany({key: value}, compressed)
+
+  def SetMany(self, items: dict[str, bytes], compressed: bool = False):
+    """
+    Сохраняет несколько значений, после чего при необходимости вытесняет лишние
+    записи.
+
+    Args:
+        items (dict[str, bytes]): словарь ключ -> значение.
+        compressed (bool, optional): значения уже сжаты zlib. Defaults to False.
+    """
+
+    if not items:
+      return
+
+    now = time.time()
+
+    with self.__lock:
+      connection = self.__Connection()
+
+      connection.executemany(
+        f"INSERT OR REPLACE INTO {self.__table} (key, value, created_at, accessed_at) "
+        "VALUES (?, ?, ?, ?)",
+        [
+          (key, value if compressed else zlib.compress(value), now, now)
+          for key, value in items.items()
+        ],
+      )
+
+      connection.commit()
+
+      # оценка сверху: замененные записи тоже учитываются как новые.
+      self.__entries_estimate += len(items)
+
+      if self.__max_entries and self.__entries_estimate > self.__max_entries:
+        self.__Evict(connection, now)
+
+  def Close(self):
+    """
+    Закрывает соединение с базой данных.
+    """
+
+    with self.__lock:
+      if self.__connection is not None and self.__connection_pid == os.getpid():
+        self.__connection.close()
+
+      self.__connection = None
+      self.__connection_pid = None
+
+  def __Connection(self) -> sqlite3.Connection:
+    """
+    Возвращает соединение с базой данных (открывает его при первом обращении
+    и заново - в дочернем процессе, так как соединения нельзя разделять между
+    процессами).
+
+    Returns:
+        sqlite3.Connection: соединение с базой данных.
+    """
+
+    if self.__connection is not None and self.__connection_pid == os.getpid():
+      return self.__connection
+
+    if os.path.dirname(self.__path):
+      os.makedirs(os.path.dirname(self.__path), exist_ok=True)
+
+    connection = sqlite3.connect(self.__path, timeout=60, check_same_thread=False)
+
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.execute(
+      f"CREATE TABLE IF NOT EXISTS {self.__table} ("
+      "key TEXT PRIMARY KEY, value BLOB NOT NULL, "
+      "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+    )
+    connection.execute(
+      f"CREATE INDEX IF NOT EXISTS {self.__table}_accessed_at "
+      f"ON {self.__table} (accessed_at)"
+    )
+    connection.commit()
+
+    self.__connection = connection
+    self.__connection_pid = os.getpid()
+
+    self.__Evict(connection, time.time())
+
+    return connection
+
+  def __Evict(self, connection: sqlite3.Connection, now: float):
+    """
+    Удаляет устаревшие записи и, если записей больше лимита, давно не
+    использованные записи так, чтобы осталось `(1 - evict_fraction) * max_entries`.
+    Пересчитывает оценку количества записей.
+
+    Args:
+        connection (sqlite3.Connection): соединение с базой данных.
+        now (float): текущее время.
+    """
+
+    if self.__expire_seconds:
+      connection.execute(
+        f"DELETE FROM {self.__table} WHERE created_at < ?",
+        (now - self.__expire_seconds,),
+      )
+
+    # точное количество (записи могли добавить и другие процессы).
+    entries_amount: int = connection.execute(
+      f"SELECT COUNT(*) FROM {self.__table}"
+    ).fetchone()[0]
+
+    if self.__max_entries and entries_amount > self.__max_entries:
+      keep_amount = int(self.__max_entries * (1 - self.evict_fraction))
+
+      connection.execute(
+        f"DELETE FROM {self.__table} WHERE key IN ("
+        f"SELECT key FROM {self.__table} ORDER BY accessed_at LIMIT ?)",
+        (entries_amount - keep_amount,),
+      )
+
+      entries_amount = keep_amount
+
+    connection.commit()
+
+    self.__entries_estimate = entries_amount
@@ -9,6 +9,7 @@ from ChEMBL_download_compounds.download import DownloadChEMBLCompounds
 from ChEMBL_download_targets.download import DownloadChEMBLTargets
 from Configurations.config import config
 from PubChem_download_toxicity.download import DownloadPubChemCompoundsToxicity
+from Utils.files_funcs import CheckStorageConfig
 
 
 download_tasks = {
@@ -19,6 +20,9 @@ download_tasks = {
 }
 
 if __name__ == "__main__":
+  # неверный формат или отсутствующий пакет обнаруживаем до начала загрузки.
+  CheckStorageConfig()
+
   try:
     for task, DownloadFunction in download_tasks.items():
       if config[task]["download"]:
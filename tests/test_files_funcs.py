@@ -0,0 +1,111 @@
+"""
+tests/test_files_funcs.py
+
+Тесты функций модуля Utils/files_funcs.py (запуск из корня проекта:
+python -m unittest discover tests).
+"""
+
+import os
+import tempfile
+import threading
+import unittest
+
+import pandas as pd
+
+from Configurations.config import config
+from Utils.files_funcs import CombineCSVInFolder
+
+
+class CombineCSVInFolderTest(unittest.TestCase):
+  """
+  Тесты склейки файлов с таблицами в папке.
+  """
+
+  def setUp(self):
+    self.folder = tempfile.TemporaryDirectory()
+    self.addCleanup(self.folder.cleanup)
+
+    # небольшие части, чтобы файлы читались в несколько частей и очереди
+    # потоков чтения заполнялись.
+    combine_config = config["Utils"]["CombineCSVInFolder"]
+    previous_config = dict(combine_config)
+    self.addCleanup(combine_config.update, previous_config)
+    combine_config.update(max_memory_mb=1, read_workers=2)
+
+    # склеенный файл каждый раз собирается заново.
+    previous_skip_downloaded = config["skip_downloaded"]
+    self.addCleanup(config.__setitem__, "skip_downloaded", previous_skip_downloaded)
+    config["skip_downloaded"] = False
+
+  def WriteGoodFile(self, file_name: str, rows: int):
+    """
+    Записывает корректный .csv файл.
+
+    Args:
+        file_name (str): имя файла в папке.
+        rows (int): количество строк.
+    """
+
+    pd.DataFrame({"id": range(rows), "value": [f"v{i}" for i in range(rows)]}).to_csv(
+      os.path.join(self.folder.name, file_name), sep=config["csv_separator"], index=False
+    )
+
+  def Combine(self, timeout: float = 60) -> BaseException | None:
+    """
+    Склеивает файлы папки в отдельном потоке.
+
+    Args:
+        timeout (float, optional): сколько секунд ждать. Defaults to 60.
+
+    Returns:
+        BaseException | None: исключение склейки (None, если его не было).
+    """
+
+    errors: list[BaseException] = []
+
+    def Run():
+      try:
+        CombineCSVInFolder(self.folder.name, "combined")
+
+      except BaseException as exception:
+        errors.append(exception)
+
+    thread = threading.Thread(target=Run, daemon=True)
+    thread.start()
+    thread.join(timeout)
+
+    self.assertFalse(thread.is_alive(), "CombineCSVInFolder hangs")
+
+    return errors[0] if errors else None
+
+  def testCombinesFiles(self):
+    self.WriteGoodFile("a.csv", 3)
+    self.WriteGoodFile("b.csv", 2)
+
+    self.assertIsNone(self.Combine())
+
+    combined = pd.read_csv(
+      os.path.join(self.folder.name, "combined.csv"), sep=config["csv_separator"]
+    )
+
+    self.assertEqual(combined["id"].tolist(), [0, 1, 2, 0, 1])
+
+  def testMalformedFileRaisesInsteadOfHanging(self):
+    # незакрытая кавычка в конце файла: ошибка возникает уже при чтении
+    # частей, пока соседние файлы читаются в других потоках и ждут места
+    # в своих очередях.
+    self.WriteGoodFile("a.csv", 100_000)
+
+    with open(os.path.join(self.folder.name, "a.csv"), "a", encoding="utf-8") as file:
+      file.write(f'100000{config["csv_separator"]}"broken\n')
+
+    self.WriteGoodFile("b.csv", 100_000)
+    self.WriteGoodFile("c.csv", 100_000)
+
+    self.assertIsInstance(self.Combine(), pd.errors.ParserError)
+    self.assertFalse(os.path.exists(os.path.join(self.folder.name, "combined.csv")))
+    self.assertFalse(os.path.exists(os.path.join(self.folder.name, "combined.csv.tmp")))
+
+
+if __name__ == "__main__":
+  unittest.main()